@@ -6,10 +6,10 @@ from groq import AsyncGroq
 import asyncio
 import os
 from ..utils.config import config
+from ..services.embedding_service import get_embedding_service
 
 
 # Configuration
-embedding_model_name = config.EMBEDDING_MODEL
 max_chunk_size = config.MAX_CHUNK_SIZE
 
 
@@ -18,24 +18,17 @@ class AIChatbot:
         # Initialize Groq client
         self.groq_client = AsyncGroq(api_key=config.GROQ_API_KEY)
         
-        # Load the embedding model for semantic chunking
-        self.embedding_tokenizer = AutoTokenizer.from_pretrained(embedding_model_name)
-        self.embedding_model = AutoModel.from_pretrained(embedding_model_name)
+        # Embedding backend (hosted, local or hashing) selected by EMBEDDING_BACKEND
+        self.embedding_service = get_embedding_service()
 
     def encode_text(self, text):
-        """Encode text into embeddings using a pre-trained model."""
-        inputs = self.embedding_tokenizer(text, return_tensors='pt', truncation=True, padding=True)
-        with torch.no_grad():
-            outputs = self.embedding_model(**inputs)
-        embeddings = outputs.last_hidden_state.mean(dim=1).numpy()
-        return embeddings
+        """Encode text into embeddings using the configured embedding backend."""
+        return self.embedding_service.encode_single(text).reshape(1, -1)
     
     def chunk_text(self, text):
-        """Chunk the text into smaller pieces."""
-        tokens = self.embedding_tokenizer.tokenize(text)
-        token_chunks = [tokens[i:i + max_chunk_size] for i in range(0, len(tokens), max_chunk_size)]
-        text_chunks = [self.embedding_tokenizer.convert_tokens_to_string(chunk) for chunk in token_chunks]
-        return text_chunks
+        """Chunk the text into smaller pieces of at most max_chunk_size words."""
+        words = text.split()
+        return [' '.join(words[i:i + max_chunk_size]) for i in range(0, len(words), max_chunk_size)]
     
     def determine_optimal_clusters(self, embeddings, max_clusters=10):
         """Determine the optimal number of clusters."""
@@ -61,7 +54,7 @@ class AIChatbot:
     def semantic_chunking(self, text):
         """Perform semantic chunking on the text using dynamic clustering."""
         chunks = self.chunk_text(text)
-        embeddings = np.vstack([self.encode_text(chunk) for chunk in chunks])
+        embeddings = self.embedding_service.encode_documents(chunks)
         
         optimal_clusters = self.determine_optimal_clusters(embeddings)
         kmeans = KMeans(n_clusters=optimal_clusters, n_init=10, random_state=0)
@@ -74,9 +67,9 @@ class AIChatbot:
 
         return chunked_texts, embeddings, chunks
     
-    def retrieve_chunks(self, query, top_n=5):
+    async def retrieve_chunks(self, query, top_n=5):
         """Retrieve the most similar chunks based on a query."""
-        query_embedding = self.encode_text(query)
+        query_embedding = (await self.embedding_service.aencode_single(query)).reshape(1, -1)
         similarities = cosine_similarity(query_embedding, self.embeddings).flatten()
         top_indices = np.argsort(similarities)[-top_n:][::-1]
         retrieved_chunks = " ".join(self.chunks[index] for index in top_indices)
@@ -91,7 +84,7 @@ class AIChatbot:
     
     async def generate_response(self, question):
         """Generate a response to a given question using Groq."""
-        context = self.retrieve_chunks(question)
+        context = await self.retrieve_chunks(question)
         
         messages = [
             {
@@ -5,7 +5,7 @@ from sklearn.cluster import KMeans
 from sklearn.metrics.pairwise import cosine_similarity   
 from sklearn.metrics import silhouette_score
 from pydantic import BaseModel
-from typing import List
+from typing import Dict, List, Optional, Union
 
 # Configuration
 embedding_model_name = "sentence-transformers/all-MiniLM-L6-v2"
@@ -28,6 +28,7 @@ VALID_PARAMS = {
 
 class SearchRequest_NER(BaseModel):
     query: str
+    filters: Optional[Dict[str, Union[str, List[str]]]] = None  # e.g. {"judge": "Sanjiv Khanna"}
 
 class SearchResult_NER(BaseModel):
     uuid: str
@@ -35,7 +35,7 @@ def extract_pdf_text(pdf_path):
         return " ".join(page.extract_text() for page in reader.pages)
 
 # Text Chunking and Encoding using HuggingFace API
-def chunk_and_encode_text(text, chunk_size=None):
+async def chunk_and_encode_text(text, chunk_size=None):
     """Chunk the text and encode each chunk into embeddings using HuggingFace API."""
     if chunk_size is None:
         chunk_size = config.MAX_CHUNK_SIZE
@@ -62,22 +62,19 @@ def chunk_and_encode_text(text, chunk_size=None):
     if current_chunk:
         chunks.append(' '.join(current_chunk))
 
-    # Encode all chunks using HuggingFace API
-    embeddings = []
-    for chunk_text in chunks:
-        embedding = embedding_service.encode(chunk_text)
-        embeddings.append(embedding)
+    # Encode all chunks, reusing stored embeddings for chunks seen before
+    embeddings = list(await embedding_service.aencode_documents(chunks))
 
     return chunks, embeddings
 
 
-def retrieve_context(question, chunks, embeddings, top_n=None):
+async def retrieve_context(question, chunks, embeddings, top_n=None):
     """Retrieve the most relevant chunks for the given question using HuggingFace API."""
     if top_n is None:
         top_n = config.TOP_N_CHUNKS
     
     # Encode the question using HuggingFace API
-    question_embedding = embedding_service.encode(question)
+    question_embedding = await embedding_service.aencode(question)
     
     # Ensure question_embedding is 2D
     if question_embedding.ndim == 1:
@@ -155,7 +152,7 @@ async def prepare_document(document_id: str):
 
         # Extract text and prepare for chat
         pdf_text = extract_pdf_text(pdf_path)
-        chunks, embeddings = chunk_and_encode_text(pdf_text)
+        chunks, embeddings = await chunk_and_encode_text(pdf_text)
         
         # Store prepared data globally for this document
         prepared_documents[document_id] = {
@@ -197,8 +194,8 @@ async def ask_question(request: Request):
 
                 # Extract text and retrieve context
                 pdf_text = extract_pdf_text(pdf_path)
-                chunks, embeddings = chunk_and_encode_text(pdf_text)
-                context = retrieve_context(question, chunks, embeddings)
+                chunks, embeddings = await chunk_and_encode_text(pdf_text)
+                context = await retrieve_context(question, chunks, embeddings)
             except Exception as e:
                  logger.error(f"Error in ask_question fallback: {e}")
                  return {"error": f"Error: {e}"}
@@ -208,7 +205,7 @@ async def ask_question(request: Request):
         # Use the first prepared document (could be improved to handle multiple)
         # TODO: Handle multi-user concurrency better than a global dict
         doc_data = list(prepared_documents.values())[0]
-        context = retrieve_context(question, doc_data["chunks"], doc_data["embeddings"])
+        context = await retrieve_context(question, doc_data["chunks"], doc_data["embeddings"])
 
     # Stream response using Groq
     async def generate_stream():
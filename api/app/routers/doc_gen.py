@@ -128,7 +128,7 @@ class AIChatbot:
         if not chunks:
             return {}, np.array([]), []
             
-        embeddings_list = [self.encode_text(chunk) for chunk in chunks]
+        embeddings_list = list(self.embedding_service.encode_documents(chunks))
         if not embeddings_list:
              return {}, np.array([]), []
              
@@ -150,12 +150,12 @@ class AIChatbot:
 
         return chunked_texts, embeddings, chunks
     
-    def retrieve_chunks(self, query, top_n=5):
+    async def retrieve_chunks(self, query, top_n=5):
         """Retrieve and return the most similar chunks based on a query."""
         if len(self.chunks) == 0:
             return ""
             
-        query_embedding = self.encode_text(query)
+        query_embedding = await self.embedding_service.aencode_single(query)
         
         # Compute cosine similarities
         # Reshape query if needed (1, D)
@@ -186,7 +186,7 @@ class AIChatbot:
     async def generate_response(self, question):
         """Generate a response to a given question using Groq."""
         # Retrieve and print chunks related to the query
-        context = self.retrieve_chunks(question)
+        context = await self.retrieve_chunks(question)
 
         messages = [
             {
@@ -0,0 +1,102 @@
+"""
+Embedding backends that run in-process
+A local CPU model (sentence-transformers, optionally on ONNX Runtime) and a deterministic hashing stand-in
+"""
+import hashlib
+import re
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import logging
+
+from .embedding_base import EmbeddingService
+from .embedding_cache import EmbeddingCache, SqliteEmbeddingStore
+from ..utils.config import config
+
+logger = logging.getLogger(__name__)
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # Optional dependency, only needed for EMBEDDING_BACKEND=local
+    SentenceTransformer = None
+
+
+class LocalEmbeddingService(EmbeddingService):
+    """
+    Runs the embedding model on the local CPU
+
+    Batches go through the model in one forward pass; async callers are served from
+    a small thread pool (the model releases the GIL during inference), so requests
+    never leave the process.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        cache: Optional[EmbeddingCache] = None,
+        store: Optional[SqliteEmbeddingStore] = None,
+        runtime: str = "torch",
+        threads: int = 2
+    ):
+        if SentenceTransformer is None:
+            raise ImportError(
+                "sentence-transformers is required for the local embedding backend "
+                "(pip install sentence-transformers, plus optimum[onnxruntime] for the onnx runtime)"
+            )
+        super().__init__(model_name, cache=cache, store=store)
+        kwargs = {'backend': 'onnx'} if runtime == 'onnx' else {}
+        self.model = SentenceTransformer(model_name, device='cpu', trust_remote_code=True, **kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='embedding')
+        logger.info(f"Initialized local embedding backend with model: {model_name} (runtime: {runtime})")
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(
+            self.model.encode(
+                texts,
+                batch_size=config.EMBEDDING_BATCH_SIZE,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            ),
+            dtype='float32'
+        ).reshape(len(texts), -1)
+
+    async def aclose(self):
+        self._executor.shutdown(wait=False)
+
+
+class HashingEmbeddingService(EmbeddingService):
+    """
+    Deterministic feature-hashing embeddings for tests, benchmarks and offline runs
+
+    Word unigrams and bigrams are hashed (blake2b, stable across processes) into
+    signed buckets and L2-normalized. Texts sharing words get similar vectors, which
+    is enough to exercise the whole search stack without a model or network.
+    """
+
+    coalesce_requests = False
+
+    def __init__(
+        self,
+        dimension: int = 384,
+        cache: Optional[EmbeddingCache] = None,
+        store: Optional[SqliteEmbeddingStore] = None
+    ):
+        super().__init__(f"hashing-{dimension}", cache=cache, store=store)
+        self.dimension = dimension
+
+    def _embed_text(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype='float32')
+        words = re.findall(r"\w+", text.casefold())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for feature in features:
+            digest = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+            vector[digest % self.dimension] += 1.0 if digest >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        return np.vstack([self._embed_text(text) for text in texts]) if texts else np.zeros((0, self.dimension), dtype='float32')
+
+    async def _aembed(self, texts: List[str]) -> np.ndarray:
+        # Cheaper than a thread hop
+        return self._embed(texts)
@@ -0,0 +1,409 @@
+"""
+Backend-independent embedding service
+Caching, content-addressed storage, batching and async plumbing shared by every embedding backend
+"""
+import asyncio
+import numpy as np
+from concurrent.futures import Executor
+from typing import Dict, List, Optional, Tuple, Union
+import logging
+
+from .embedding_cache import EmbeddingCache, SqliteEmbeddingStore, cache_key
+from .embedding_coalescer import EmbeddingCoalescer
+from .rate_limiter import CircuitOpenError
+from ..utils.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingService:
+    """
+    Base class for embedding backends
+
+    A backend only implements _embed (texts -> (n, d) float32 array) and, if it has
+    a native non-blocking path, _aembed. Everything callers use (encode, the
+    async aencode family, document encoding through the persistent store) is
+    built on those two.
+    """
+
+    # Whether concurrent single-text async requests are worth coalescing into one batch
+    coalesce_requests = True
+
+    def __init__(
+        self,
+        model_name: str,
+        cache: Optional[EmbeddingCache] = None,
+        store: Optional[SqliteEmbeddingStore] = None
+    ):
+        self.model_name = model_name
+        self.cache = cache
+        self.store = store
+        # Executor for _aembed on blocking backends (None uses the loop's default)
+        self._executor: Optional[Executor] = None
+        self._coalescer: Optional[EmbeddingCoalescer] = None
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts without caching; returns (len(texts), dimension) float32"""
+        raise NotImplementedError
+
+    async def _aembed(self, texts: List[str]) -> np.ndarray:
+        """Non-blocking _embed; by default runs the blocking backend in the executor"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._embed, texts)
+
+    async def aclose(self):
+        """Release connections or worker threads held by the backend"""
+
+    def encode_single(self, text: str) -> np.ndarray:
+        """
+        Encode a single text string into embeddings, serving repeats from the cache
+
+        Args:
+            text: Input text string
+
+        Returns:
+            numpy array of embeddings
+        """
+        if self.cache is not None:
+            cached = self.cache.get(self.model_name, text)
+            if cached is not None:
+                return cached
+
+        result = self._embed([text])[0]
+        if self.cache is not None:
+            self.cache.put(self.model_name, text, result)
+        return result
+
+    def encode(self, texts: Union[str, List[str]], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Encode text(s) into embeddings
+
+        Lists are served from the query cache where possible; the remaining texts are
+        encoded in batches rather than one at a time.
+
+        Args:
+            texts: Single text string or list of text strings
+            batch_size: Texts per batch (defaults to EMBEDDING_BATCH_SIZE)
+
+        Returns:
+            numpy array of embeddings (2D for multiple texts, 1D for single text)
+        """
+        if isinstance(texts, str):
+            return self.encode_single(texts)
+
+        elif isinstance(texts, list):
+            if not texts:
+                return np.zeros((0, 0), dtype='float32')
+
+            embeddings, missing = self._cache_lookup(texts)
+            if missing:
+                self._cache_fill(embeddings, missing, self._encode_batches(list(missing), batch_size=batch_size))
+            return np.vstack(embeddings).astype('float32')
+
+        else:
+            raise ValueError("texts must be a string or list of strings")
+
+    def batch_encode(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Encode texts one batch at a time
+
+        Args:
+            texts: List of text strings
+            batch_size: Number of texts per batch (defaults to EMBEDDING_BATCH_SIZE)
+
+        Returns:
+            numpy array of all embeddings, shape (n, dimension)
+        """
+        return self.encode(list(texts), batch_size=batch_size)
+
+    def encode_documents(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode corpus texts (documents, chunks), reusing embeddings from the persistent store
+
+        Only texts whose sha256(model_name + text) is not in the store are encoded,
+        so re-ingesting an unchanged corpus costs nothing. Document texts bypass
+        the query cache so they do not evict popular queries.
+
+        Args:
+            texts: List of text strings
+
+        Returns:
+            numpy array of embeddings, one row per text
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype='float32')
+        if self.store is None:
+            return self._encode_batches(list(texts))
+
+        keys, found, missing = self._store_lookup(texts)
+        if missing:
+            self._store_save(found, missing, self._encode_batches(list(missing.values())), len(texts))
+        return np.vstack([found[key] for key in keys]).astype('float32')
+
+    def encode_document(self, text: str) -> np.ndarray:
+        """Encode one corpus text through the persistent store (1D array)"""
+        return self.encode_documents([text])[0]
+
+    def _store_lookup(self, texts: List[str]) -> Tuple[List[str], Dict[str, np.ndarray], Dict[str, str]]:
+        """Content keys per text, the stored embeddings found, and the unique texts still to encode"""
+        keys = [cache_key(self.model_name, text) for text in texts]
+        try:
+            found = self.store.get_many(list(dict.fromkeys(keys)))
+        except Exception as e:
+            logger.warning(f"Embedding store read failed, encoding all texts: {str(e)}")
+            found = {}
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        return keys, found, missing
+
+    def _store_save(self, found: Dict[str, np.ndarray], missing: Dict[str, str], encoded: np.ndarray, total: int):
+        """Record freshly encoded texts in the store and in the lookup result"""
+        new_items = []
+        for key, embedding in zip(missing, encoded):
+            found[key] = embedding
+            new_items.append((key, self.model_name, embedding))
+        try:
+            self.store.put_many(new_items)
+        except Exception as e:
+            logger.warning(f"Embedding store write failed: {str(e)}")
+        logger.info(f"Encoded {len(missing)} new texts, reused {total - len(missing)} from the store")
+
+    def _cache_lookup(self, texts: List[str]) -> Tuple[List[Optional[np.ndarray]], Dict[str, List[int]]]:
+        """Cached embedding per position, plus the positions of each unique uncached text"""
+        embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        for position, text in enumerate(texts):
+            cached = self.cache.get(self.model_name, text) if self.cache is not None else None
+            if cached is not None:
+                embeddings[position] = cached
+            else:
+                missing.setdefault(text, []).append(position)
+        return embeddings, missing
+
+    def _cache_fill(self, embeddings: List[Optional[np.ndarray]], missing: Dict[str, List[int]], encoded: np.ndarray):
+        """Place freshly encoded texts at their positions and remember them in the cache"""
+        for text, embedding in zip(missing, encoded):
+            if self.cache is not None:
+                self.cache.put(self.model_name, text, embedding)
+            for position in missing[text]:
+                embeddings[position] = embedding
+
+    def _iter_batches(self, texts: List[str], batch_size: int, max_bytes: int):
+        """Group texts into batches bounded by item count and UTF-8 size"""
+        batch, batch_bytes = [], 0
+        for text in texts:
+            size = len(text.encode('utf-8'))
+            if batch and (len(batch) >= batch_size or batch_bytes + size > max_bytes):
+                yield batch
+                batch, batch_bytes = [], 0
+            batch.append(text)
+            batch_bytes += size
+        if batch:
+            yield batch
+
+    def _encode_batch_with_split(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode one batch, splitting it in half and retrying each half if it fails
+
+        A single oversized or malformed text then only fails itself instead of the
+        whole batch.
+        """
+        try:
+            return self._embed(texts)
+        except CircuitOpenError:
+            # The endpoint is down, not the batch; splitting would only fail faster
+            raise
+        except Exception as e:
+            if len(texts) == 1:
+                raise
+            middle = len(texts) // 2
+            logger.warning(f"Batch of {len(texts)} texts failed ({str(e)}), retrying as {middle} + {len(texts) - middle}")
+            return np.vstack([
+                self._encode_batch_with_split(texts[:middle]),
+                self._encode_batch_with_split(texts[middle:])
+            ])
+
+    def _encode_batches(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None,
+        max_bytes: Optional[int] = None
+    ) -> np.ndarray:
+        """Encode texts batch by batch, bypassing the cache (returns (n, d) float32)"""
+        batch_size = batch_size or config.EMBEDDING_BATCH_SIZE
+        max_bytes = max_bytes or config.EMBEDDING_BATCH_MAX_BYTES
+        return np.vstack([
+            self._encode_batch_with_split(batch)
+            for batch in self._iter_batches(texts, batch_size, max_bytes)
+        ]).astype('float32')
+
+    # Async API: same behaviour as above for use inside FastAPI handlers, so a slow
+    # backend suspends only the awaiting request instead of the event loop
+
+    def _get_coalescer(self) -> Optional[EmbeddingCoalescer]:
+        if not self.coalesce_requests or config.EMBEDDING_COALESCE_WINDOW_MS <= 0:
+            return None
+        if self._coalescer is None:
+            self._coalescer = EmbeddingCoalescer(
+                self._aembed,
+                max_wait=config.EMBEDDING_COALESCE_WINDOW_MS / 1000.0,
+                max_batch=config.EMBEDDING_COALESCE_MAX_BATCH
+            )
+        return self._coalescer
+
+    async def _aencode_batch_with_split(self, texts: List[str]) -> np.ndarray:
+        """Async counterpart of _encode_batch_with_split"""
+        try:
+            return await self._aembed(texts)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            if len(texts) == 1:
+                raise
+            middle = len(texts) // 2
+            logger.warning(f"Batch of {len(texts)} texts failed ({str(e)}), retrying as {middle} + {len(texts) - middle}")
+            return np.vstack([
+                await self._aencode_batch_with_split(texts[:middle]),
+                await self._aencode_batch_with_split(texts[middle:])
+            ])
+
+    async def _aencode_batches(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        batch_size = batch_size or config.EMBEDDING_BATCH_SIZE
+        return np.vstack([
+            await self._aencode_batch_with_split(batch)
+            for batch in self._iter_batches(texts, batch_size, config.EMBEDDING_BATCH_MAX_BYTES)
+        ]).astype('float32')
+
+    async def aencode_single(self, text: str) -> np.ndarray:
+        """
+        Async encode_single: cached, otherwise coalesced with concurrent callers
+
+        Texts requested by other handlers within EMBEDDING_COALESCE_WINDOW_MS go out
+        in the same batch.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(self.model_name, text)
+            if cached is not None:
+                return cached
+
+        coalescer = self._get_coalescer()
+        if coalescer is not None:
+            result = await coalescer.encode(text)
+        else:
+            result = (await self._aembed([text]))[0]
+        if self.cache is not None:
+            self.cache.put(self.model_name, text, result)
+        return result
+
+    async def aencode(self, texts: Union[str, List[str]], batch_size: Optional[int] = None) -> np.ndarray:
+        """Async encode: 1D for a single text, (n, d) for a list"""
+        if isinstance(texts, str):
+            return await self.aencode_single(texts)
+        elif isinstance(texts, list):
+            if not texts:
+                return np.zeros((0, 0), dtype='float32')
+            embeddings, missing = self._cache_lookup(texts)
+            if missing:
+                self._cache_fill(embeddings, missing, await self._aencode_batches(list(missing), batch_size=batch_size))
+            return np.vstack(embeddings).astype('float32')
+        else:
+            raise ValueError("texts must be a string or list of strings")
+
+    async def aencode_documents(self, texts: List[str]) -> np.ndarray:
+        """Async encode_documents: store hits are reused, only misses are encoded"""
+        if not texts:
+            return np.zeros((0, 0), dtype='float32')
+        if self.store is None:
+            return await self._aencode_batches(list(texts))
+
+        keys, found, missing = self._store_lookup(texts)
+        if missing:
+            self._store_save(found, missing, await self._aencode_batches(list(missing.values())), len(texts))
+        return np.vstack([found[key] for key in keys]).astype('float32')
+
+    async def aencode_document(self, text: str) -> np.ndarray:
+        return (await self.aencode_documents([text]))[0]
+
+    def cache_stats(self) -> Optional[Dict[str, float]]:
+        """Hit/miss counters of the embedding cache, or None if caching is disabled"""
+        return self.cache.stats() if self.cache is not None else None
+
+    def coalescer_stats(self) -> Optional[Dict[str, float]]:
+        """Batching counters of the request coalescer, or None if it is disabled or unused"""
+        return self._coalescer.stats() if self._coalescer is not None else None
+
+    def limiter_stats(self) -> Optional[Dict[str, float]]:
+        """Client-side rate limiter state, or None for backends that are not rate limited"""
+        return None
+
+    def breaker_stats(self) -> Optional[Dict[str, float]]:
+        """Circuit breaker state, or None for backends without one"""
+        return None
+
+    def compute_similarity(self, text1: str, text2: str) -> float:
+        """
+        Cosine similarity between the embeddings of two texts
+
+        Args:
+            text1: First text
+            text2: Second text
+
+        Returns:
+            Cosine similarity score
+        """
+        emb1 = self.encode(text1).flatten()
+        emb2 = self.encode(text2).flatten()
+        norm = np.linalg.norm(emb1) * np.linalg.norm(emb2)
+        return float(np.dot(emb1, emb2) / norm) if norm else 0.0
+
+    def test_connection(self) -> bool:
+        """
+        Check that the backend produces embeddings
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            result = self._embed(["Hello world"])
+            logger.info(f"Embedding backend test successful. Embedding shape: {result.shape}")
+            return True
+        except Exception as e:
+            logger.error(f"Embedding backend test failed: {str(e)}")
+            return False
+
+    def encode_with_fallback(self, texts: Union[str, List[str]], max_retries: int = 3) -> np.ndarray:
+        """
+        Encode texts; backends with a fallback override this
+
+        Args:
+            texts: Single text string or list of text strings
+            max_retries: Unused, kept for compatibility
+
+        Returns:
+            numpy array of embeddings
+        """
+        try:
+            return self.encode(texts)
+        except Exception as e:
+            logger.error(f"Embedding backend failed: {str(e)}")
+            raise Exception(f"Embedding service unavailable: {str(e)}")
+
+    def safe_encode_single(self, text: str, default_dim: int = 384) -> np.ndarray:
+        """
+        Safely encode a single text with fallback to zero vector if all else fails
+
+        Args:
+            text: Input text string
+            default_dim: Default embedding dimension for fallback
+
+        Returns:
+            numpy array of embeddings or zero vector
+        """
+        try:
+            return self.encode_single(text)
+        except Exception as e:
+            logger.error(f"Failed to encode text '{text[:50]}...': {str(e)}")
+            logger.warning(f"Returning zero vector of dimension {default_dim}")
+            return np.zeros(default_dim, dtype='float32')
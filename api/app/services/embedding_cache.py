@@ -0,0 +1,200 @@
+"""
+Cache and persistent store for computed embeddings
+Bounded in-process LRU with TTL for queries, plus a content-addressed SQLite store for corpus texts
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace; case is kept since cased models embed it differently"""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def cache_key(model_name: str, text: str) -> str:
+    """Content address of an embedding: sha256 over the model name and normalized text"""
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class SqliteEmbeddingStore:
+    """
+    Embeddings keyed by content hash in a local SQLite file
+
+    Vectors are stored as raw little-endian float32 bytes. A connection per thread
+    is used since the embedding service is called from request threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS embeddings ('
+                'key TEXT PRIMARY KEY, model_name TEXT NOT NULL, dimension INTEGER NOT NULL, '
+                'vector BLOB NOT NULL, created_at REAL NOT NULL)'
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, float]]:
+        """Returns (vector, created_at) or None"""
+        row = self._connection().execute(
+            'SELECT vector, created_at FROM embeddings WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype='<f4').astype('float32'), row[1]
+
+    def put(self, key: str, model_name: str, vector: np.ndarray, created_at: Optional[float] = None):
+        vector = np.asarray(vector, dtype='<f4').flatten()
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO embeddings (key, model_name, dimension, vector, created_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, model_name, int(vector.shape[0]), vector.tobytes(), created_at or time.time())
+            )
+
+    def get_many(self, keys: Sequence[str], chunk_size: int = 500) -> Dict[str, np.ndarray]:
+        """Vectors for whichever of the keys are stored"""
+        found = {}
+        conn = self._connection()
+        for start in range(0, len(keys), chunk_size):
+            chunk = list(keys[start:start + chunk_size])
+            placeholders = ','.join('?' * len(chunk))
+            for key, blob in conn.execute(
+                f'SELECT key, vector FROM embeddings WHERE key IN ({placeholders})', chunk
+            ):
+                found[key] = np.frombuffer(blob, dtype='<f4').astype('float32')
+        return found
+
+    def put_many(self, items: List[Tuple[str, str, np.ndarray]]):
+        """Store (key, model_name, vector) triples in one transaction"""
+        now = time.time()
+        rows = []
+        for key, model_name, vector in items:
+            vector = np.asarray(vector, dtype='<f4').flatten()
+            rows.append((key, model_name, int(vector.shape[0]), vector.tobytes(), now))
+        with self._connection() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (key, model_name, dimension, vector, created_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+
+    def delete(self, key: str):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM embeddings WHERE key = ?', (key,))
+
+    def count(self) -> int:
+        return int(self._connection().execute('SELECT COUNT(*) FROM embeddings').fetchone()[0])
+
+
+class EmbeddingCache:
+    """
+    LRU cache of embeddings keyed by (model_name, normalized text)
+
+    Entries expire ttl_seconds after they were computed (0 disables expiry). When a
+    disk store is given it is consulted on a memory miss and written through on put.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 4096,
+        ttl_seconds: float = 86400.0,
+        disk_store: Optional[SqliteEmbeddingStore] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_store = disk_store
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, created_at: float, vector: np.ndarray):
+        """Insert under the lock, evicting least recently used entries"""
+        self._entries[key] = (created_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def get(self, model_name: str, text: str) -> Optional[np.ndarray]:
+        """Cached embedding for the text, or None (a copy, so callers may modify it)"""
+        key = cache_key(model_name, text)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._entries.move_to_end(key)
+                    self._counters['hits'] += 1
+                    return entry[1].copy()
+                del self._entries[key]
+                self._counters['expired'] += 1
+
+        if self.disk_store is not None:
+            try:
+                stored = self.disk_store.get(key)
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding disk cache read failed: {str(e)}")
+                stored = None
+            if stored is not None and not self._expired(stored[1], now):
+                with self._lock:
+                    self._remember(key, stored[1], stored[0])
+                    self._counters['disk_hits'] += 1
+                return stored[0].copy()
+
+        with self._lock:
+            self._counters['misses'] += 1
+        return None
+
+    def put(self, model_name: str, text: str, vector: np.ndarray):
+        key = cache_key(model_name, text)
+        vector = np.array(vector, dtype='float32')
+        now = time.time()
+        with self._lock:
+            if self.max_entries > 0:
+                self._remember(key, now, vector)
+        if self.disk_store is not None:
+            try:
+                self.disk_store.put(key, model_name, vector, now)
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding disk cache write failed: {str(e)}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
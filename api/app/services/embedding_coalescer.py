@@ -0,0 +1,99 @@
+"""
+Micro-batching of concurrent embedding requests
+Collects texts arriving within a short window and sends them to the API as one batch
+"""
+import asyncio
+import numpy as np
+from typing import Awaitable, Callable, Dict, List, Optional
+import logging
+
+from .rate_limiter import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCoalescer:
+    """
+    Coalesces single-text encode calls from concurrent handlers
+
+    The first text to arrive opens a window of max_wait seconds; the batch is sent
+    when the window closes or max_batch distinct texts are waiting, whichever comes
+    first. Identical texts within a window share one row. If a batch fails it is
+    split in half and retried, so only the callers whose text actually fails see
+    the error.
+
+    Must be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        encode_batch: Callable[[List[str]], Awaitable[np.ndarray]],
+        max_wait: float = 0.005,
+        max_batch: int = 32
+    ):
+        self.encode_batch = encode_batch
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self._counters = {'requests': 0, 'deduplicated': 0, 'batches': 0, 'texts_sent': 0}
+
+    async def encode(self, text: str) -> np.ndarray:
+        """Embedding for one text, sent together with whatever else arrives in the window"""
+        self._counters['requests'] += 1
+        future = self._pending.get(text)
+        if future is not None:
+            self._counters['deduplicated'] += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[text] = future
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        # Shield so one cancelled caller does not cancel the row other callers share
+        result = await asyncio.shield(future)
+        return result.copy()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        task = asyncio.get_running_loop().create_task(self._send(list(batch), batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, texts: List[str], futures: Dict[str, asyncio.Future]):
+        self._counters['batches'] += 1
+        self._counters['texts_sent'] += len(texts)
+        try:
+            embeddings = await self.encode_batch(texts)
+        except Exception as e:
+            if len(texts) == 1 or isinstance(e, CircuitOpenError):
+                for text in texts:
+                    self._resolve(futures[text], exception=e)
+                return
+            middle = len(texts) // 2
+            logger.warning(f"Coalesced batch of {len(texts)} failed ({str(e)}), retrying as {middle} + {len(texts) - middle}")
+            await asyncio.gather(self._send(texts[:middle], futures), self._send(texts[middle:], futures))
+            return
+        for text, embedding in zip(texts, embeddings):
+            self._resolve(futures[text], result=embedding)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result=None, exception: Optional[Exception] = None):
+        if future.done():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, float]:
+        stats = dict(self._counters)
+        stats['mean_batch_size'] = stats['texts_sent'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
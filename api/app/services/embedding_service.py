@@ -4,25 +4,66 @@ Embedding service using Hugging Face's hosted API instead of local models
 import os
 import requests
 import numpy as np
-from typing import List, Union
+from typing import Dict, List, Optional, Union
 from dotenv import load_dotenv
 import logging
 import time
+import asyncio
+import httpx
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from .embedding_base import EmbeddingService
+from .embedding_backends import HashingEmbeddingService, LocalEmbeddingService
+from .embedding_cache import EmbeddingCache, SqliteEmbeddingStore
+from .rate_limiter import AdaptiveRateLimiter, CircuitBreaker, CircuitOpenError, parse_retry_after
+from ..utils.config import config
 
 # Load environment variables
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-class HuggingFaceEmbeddingService:
+# Client errors that will fail the same way on retry (bad input, payload too large)
+NON_RETRYABLE_STATUS = {400, 413, 422}
+
+
+class EmbeddingRequestError(Exception):
+    """HF API rejected a request in a way that retrying the same payload cannot fix"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"HuggingFace API error: {status_code} - {message}")
+        self.status_code = status_code
+
+
+class HuggingFaceEmbeddingService(EmbeddingService):
     """
     Service for generating embeddings using Hugging Face's hosted API
     """
     
-    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
-        self.model_name = model_name
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        cache: Optional[EmbeddingCache] = None,
+        store: Optional[SqliteEmbeddingStore] = None,
+        fallback: Optional[EmbeddingService] = None
+    ):
+        super().__init__(model_name, cache=cache, store=store)
+        # Same model run elsewhere (e.g. locally), used while the API circuit is open
+        self.fallback = fallback
+        self._fallback_requests = 0
+        # Shared by the sync and async paths, so bulk ingest and user queries draw on one budget
+        self.limiter = AdaptiveRateLimiter(
+            rate=config.EMBEDDING_RATE_LIMIT_PER_SECOND,
+            burst=config.EMBEDDING_RATE_LIMIT_BURST,
+            min_rate=config.EMBEDDING_RATE_LIMIT_MIN,
+            max_rate=config.EMBEDDING_RATE_LIMIT_MAX,
+            interactive_reserve=config.EMBEDDING_INTERACTIVE_RESERVE
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold=config.EMBEDDING_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=config.EMBEDDING_BREAKER_RESET_SECONDS
+        )
+        # Created on first use inside the running event loop
+        self._async_client: Optional[httpx.AsyncClient] = None
         # Use the HuggingFace router endpoint for feature extraction
         self.api_url = f"https://router.huggingface.co/hf-inference/models/{model_name}/pipeline/feature-extraction"
         self.similarity_url = f"https://router.huggingface.co/hf-inference/models/{model_name}/pipeline/sentence-similarity"
@@ -30,15 +71,14 @@ class HuggingFaceEmbeddingService:
             "Authorization": f"Bearer {os.environ.get('HF_TOKEN')}",
         }
         
-        # Setup session with retry strategy
+        # Pooled session; retries happen in _post_inputs only, where the rate limiter
+        # and circuit breaker see every attempt
         self.session = requests.Session()
-        retry_strategy = Retry(
-            total=3,  # Total number of retries
-            backoff_factor=1,  # Wait time between retries (exponential backoff)
-            status_forcelist=[429, 500, 502, 503, 504],  # HTTP status codes to retry on
-            allowed_methods=["POST"]  # Only retry on POST requests
+        adapter = HTTPAdapter(
+            pool_connections=config.EMBEDDING_MAX_CONNECTIONS,
+            pool_maxsize=config.EMBEDDING_MAX_CONNECTIONS,
+            max_retries=0
         )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
         self.session.mount("http://", adapter)
         self.session.mount("https://", adapter)
         
@@ -48,9 +88,33 @@ class HuggingFaceEmbeddingService:
         
         logger.info(f"Initialized HuggingFace Embedding Service with model: {model_name}")
     
-    def encode_single(self, text: str, max_retries: int = 3, timeout: int = 60) -> np.ndarray:
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """One API request for the texts, (n, d); served by the fallback while the circuit is open"""
+        try:
+            if len(texts) == 1:
+                return self._request_embedding(texts[0]).reshape(1, -1)
+            return self._request_batch(texts)
+        except CircuitOpenError:
+            if self.fallback is None:
+                raise
+            self._fallback_requests += 1
+            return self.fallback._embed(texts)
+    
+    async def _aembed(self, texts: List[str]) -> np.ndarray:
+        """One non-blocking API request for the texts, (n, d)"""
+        try:
+            if len(texts) == 1:
+                return (await self._arequest_embedding(texts[0])).reshape(1, -1)
+            return await self._arequest_batch(texts)
+        except CircuitOpenError:
+            if self.fallback is None:
+                raise
+            self._fallback_requests += 1
+            return await self.fallback._aembed(texts)
+    
+    def _request_embedding(self, text: str, max_retries: Optional[int] = None, timeout: int = 60) -> np.ndarray:
         """
-        Encode a single text string into embeddings with retry logic
+        Encode a single text string into embeddings with one API request
         
         Args:
             text: Input text string
@@ -60,119 +124,189 @@ class HuggingFaceEmbeddingService:
         Returns:
             numpy array of embeddings
         """
+        result = self._post_inputs(text, max_retries=max_retries, timeout=timeout)
+        # Ensure we have the right shape (flatten if necessary)
+        if result.ndim > 1 and result.shape[0] == 1:
+            result = result.flatten()
+        return result
+    
+    def _request_batch(self, texts: List[str], max_retries: Optional[int] = None, timeout: int = 60) -> np.ndarray:
+        """
+        Encode several texts with one API request
+        
+        Returns:
+            numpy array of shape (len(texts), dimension)
+        """
+        result = self._post_inputs(texts, max_retries=max_retries, timeout=timeout)
+        if result.ndim != 2 or result.shape[0] != len(texts):
+            raise ValueError(
+                f"Expected {len(texts)} pooled embeddings from the API, got shape {result.shape}"
+            )
+        return result
+    
+    def _parse_embeddings(self, embeddings) -> np.ndarray:
+        """Convert a feature-extraction response body to a float32 array"""
+        # Handle different response formats from HF API
+        if isinstance(embeddings, dict) and 'embeddings' in embeddings:
+            # Wrapped in embeddings key
+            return np.array(embeddings['embeddings'], dtype='float32')
+        # Direct list of embeddings (or whatever we got)
+        return np.array(embeddings, dtype='float32')
+    
+    def _record_failure(self):
+        """Count a failed attempt; stop retrying at once if it opened the circuit"""
+        self.breaker.record_failure()
+        if self.breaker.state == CircuitBreaker.OPEN:
+            raise CircuitOpenError("Embedding API circuit opened, giving up on retries")
+    
+    def _check_response(self, status_code: int, text: str, retry_after: Optional[str], attempt: int, max_retries: int) -> Optional[float]:
+        """
+        Feed one API response to the limiter and breaker and decide what happens next
+        
+        Returns:
+            None on success, otherwise seconds to wait before retrying
+            
+        Raises:
+            EmbeddingRequestError for inputs the API rejects, Exception once retries are exhausted
+        """
+        if status_code == 200:
+            self.limiter.on_success()
+            self.breaker.record_success()
+            return None
+        
+        logger.error(f"HF API Error: {status_code} - {text}")
+        if status_code == 429:
+            # Throttled, not unhealthy: slow every caller down and let the limiter pace the retry
+            self.limiter.on_throttled(parse_retry_after(retry_after))
+            self.breaker.record_success()
+            wait_time = 0.0
+        elif status_code in NON_RETRYABLE_STATUS:
+            self.breaker.record_success()
+            raise EmbeddingRequestError(status_code, text)
+        elif status_code >= 500:
+            # 503 while the model loads, or a server fault
+            self._record_failure()
+            wait_time = parse_retry_after(retry_after) or 2 ** attempt
+        else:
+            self.breaker.record_success()
+            raise Exception(f"HuggingFace API error: {status_code} - {text}")
+        
+        if attempt == max_retries:
+            raise Exception(f"HuggingFace API error: {status_code} - {text}")
+        if wait_time:
+            logger.warning(f"Retrying after {wait_time} seconds... (attempt {attempt + 1}/{max_retries})")
+        return wait_time
+    
+    def _post_inputs(self, inputs: Union[str, List[str]], max_retries: Optional[int] = None, timeout: int = 60) -> np.ndarray:
+        """
+        POST a feature-extraction payload, paced by the rate limiter
+        
+        Fails fast with CircuitOpenError while the circuit breaker is open, including
+        between retries, so callers never sleep through retries that cannot succeed.
+        
+        Args:
+            inputs: A text string or a list of text strings
+            max_retries: Maximum number of retries on failure (defaults to EMBEDDING_MAX_RETRIES)
+            timeout: Request timeout in seconds
+            
+        Returns:
+            numpy array as returned by the API
+        """
+        if max_retries is None:
+            max_retries = config.EMBEDDING_MAX_RETRIES
         for attempt in range(max_retries + 1):
+            self.breaker.check()
+            self.limiter.acquire()
             try:
-                # Use the correct payload format for HuggingFace feature extraction
-                payload = {"inputs": text}
-                
-                # Use session with retry strategy
                 response = self.session.post(
                     self.api_url, 
                     headers=self.headers, 
-                    json=payload, 
+                    json={"inputs": inputs}, 
                     timeout=timeout
                 )
-                
-                if response.status_code == 200:
-                    embeddings = response.json()
-                    # Handle different response formats from HF API
-                    if isinstance(embeddings, list):
-                        # Direct list of embeddings
-                        result = np.array(embeddings, dtype='float32')
-                    elif isinstance(embeddings, dict) and 'embeddings' in embeddings:
-                        # Wrapped in embeddings key
-                        result = np.array(embeddings['embeddings'], dtype='float32')
-                    else:
-                        # Try to convert whatever we got
-                        result = np.array(embeddings, dtype='float32')
-                    
-                    # Ensure we have the right shape (flatten if necessary)
-                    if result.ndim > 1 and result.shape[0] == 1:
-                        result = result.flatten()
-                    
-                    return result
-                
-                elif response.status_code == 503:
-                    # Model is loading, wait and retry with longer delay
-                    wait_time = 20 * (attempt + 1)  # Increase wait time with each attempt
-                    logger.warning(f"Model is loading (attempt {attempt + 1}), waiting {wait_time} seconds...")
-                    time.sleep(wait_time)
-                    continue
-                
-                else:
-                    logger.error(f"HF API Error: {response.status_code} - {response.text}")
-                    # Try to get more details from the response
-                    try:
-                        error_details = response.json()
-                        logger.error(f"Error details: {error_details}")
-                    except:
-                        pass
-                    
-                    if attempt == max_retries:
-                        raise Exception(f"HuggingFace API error: {response.status_code} - {response.text}")
-                    else:
-                        # Wait before retrying
-                        wait_time = 2 ** attempt  # Exponential backoff
-                        logger.warning(f"Retrying after {wait_time} seconds... (attempt {attempt + 1}/{max_retries})")
-                        time.sleep(wait_time)
-                        continue
-                        
-            except requests.exceptions.Timeout as e:
-                logger.warning(f"Request timeout on attempt {attempt + 1}: {str(e)}")
-                if attempt == max_retries:
-                    logger.error(f"Request timed out after {max_retries} attempts")
-                    raise Exception(f"Network timeout calling HuggingFace API after {max_retries} attempts: {str(e)}")
-                else:
-                    # Wait before retrying with exponential backoff
-                    wait_time = 2 ** attempt
-                    logger.warning(f"Retrying after {wait_time} seconds... (attempt {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                    
             except requests.exceptions.RequestException as e:
+                self._record_failure()
                 logger.warning(f"Request error on attempt {attempt + 1}: {str(e)}")
                 if attempt == max_retries:
-                    logger.error(f"Request failed after {max_retries} attempts")
-                    raise Exception(f"Network error calling HuggingFace API after {max_retries} attempts: {str(e)}")
-                else:
-                    # Wait before retrying
-                    wait_time = 2 ** attempt
-                    logger.warning(f"Retrying after {wait_time} seconds... (attempt {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                    
-            except Exception as e:
-                logger.error(f"Unexpected error on attempt {attempt + 1}: {str(e)}")
-                if attempt == max_retries:
-                    raise
-                else:
-                    wait_time = 2 ** attempt
-                    logger.warning(f"Retrying after {wait_time} seconds... (attempt {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
+                    raise Exception(f"Network error calling HuggingFace API after {max_retries} retries: {str(e)}")
+                time.sleep(2 ** attempt)
+                continue
+            
+            wait_time = self._check_response(
+                response.status_code, response.text, response.headers.get('Retry-After'), attempt, max_retries
+            )
+            if wait_time is None:
+                return self._parse_embeddings(response.json())
+            if wait_time:
+                time.sleep(wait_time)
+    
+    def _get_async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(config.EMBEDDING_REQUEST_TIMEOUT_SECONDS, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=config.EMBEDDING_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.EMBEDDING_MAX_CONNECTIONS,
+                    keepalive_expiry=60.0
+                )
+            )
+        return self._async_client
+    
+    async def aclose(self):
+        """Close the pooled async connections"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
     
-    def encode(self, texts: Union[str, List[str]]) -> np.ndarray:
+    async def _apost_inputs(self, inputs: Union[str, List[str]], max_retries: Optional[int] = None) -> np.ndarray:
         """
-        Encode text(s) into embeddings
+        POST a feature-extraction payload without blocking the event loop
         
         Args:
-            texts: Single text string or list of text strings
+            inputs: A text string or a list of text strings
+            max_retries: Maximum number of retries on failure (defaults to EMBEDDING_MAX_RETRIES)
             
         Returns:
-            numpy array of embeddings (2D for multiple texts, 1D for single text)
+            numpy array as returned by the API
         """
-        if isinstance(texts, str):
-            return self.encode_single(texts)
-        
-        elif isinstance(texts, list):
-            embeddings = []
-            for text in texts:
-                embedding = self.encode_single(text)
-                embeddings.append(embedding)
-            return np.array(embeddings, dtype='float32')
-        
-        else:
-            raise ValueError("texts must be a string or list of strings")
+        if max_retries is None:
+            max_retries = config.EMBEDDING_MAX_RETRIES
+        client = self._get_async_client()
+        for attempt in range(max_retries + 1):
+            self.breaker.check()
+            await self.limiter.aacquire()
+            try:
+                response = await client.post(self.api_url, json={"inputs": inputs})
+            except httpx.HTTPError as e:
+                self._record_failure()
+                logger.warning(f"Request error on attempt {attempt + 1}: {str(e)}")
+                if attempt == max_retries:
+                    raise Exception(f"Network error calling HuggingFace API after {max_retries} retries: {str(e)}")
+                await asyncio.sleep(2 ** attempt)
+                continue
+            
+            wait_time = self._check_response(
+                response.status_code, response.text, response.headers.get('Retry-After'), attempt, max_retries
+            )
+            if wait_time is None:
+                return self._parse_embeddings(response.json())
+            if wait_time:
+                await asyncio.sleep(wait_time)
+    
+    async def _arequest_embedding(self, text: str) -> np.ndarray:
+        result = await self._apost_inputs(text)
+        if result.ndim > 1 and result.shape[0] == 1:
+            result = result.flatten()
+        return result
+    
+    async def _arequest_batch(self, texts: List[str]) -> np.ndarray:
+        result = await self._apost_inputs(texts)
+        if result.ndim != 2 or result.shape[0] != len(texts):
+            raise ValueError(
+                f"Expected {len(texts)} pooled embeddings from the API, got shape {result.shape}"
+            )
+        return result
     
     def compute_similarity(self, text1: str, text2: str, max_retries: int = 3, timeout: int = 60) -> float:
         """
@@ -196,6 +330,7 @@ class HuggingFaceEmbeddingService:
                 }
             }
             
+            self.limiter.acquire()
             response = self.session.post(
                 self.similarity_url, 
                 headers=self.headers, 
@@ -230,31 +365,6 @@ class HuggingFaceEmbeddingService:
             logger.error(f"Error computing similarity: {str(e)}")
             raise
     
-    def batch_encode(self, texts: List[str], batch_size: int = 10) -> np.ndarray:
-        """
-        Encode texts in batches to avoid API rate limits
-        
-        Args:
-            texts: List of text strings
-            batch_size: Number of texts to process per batch
-            
-        Returns:
-            numpy array of all embeddings
-        """
-        all_embeddings = []
-        
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            batch_embeddings = self.encode(batch)
-            
-            if batch_embeddings.ndim == 1:
-                # Single embedding, reshape to 2D
-                batch_embeddings = batch_embeddings.reshape(1, -1)
-            
-            all_embeddings.append(batch_embeddings)
-        
-        return np.vstack(all_embeddings)
-    
     def test_connection(self) -> bool:
         """
         Test the connection to HuggingFace API
@@ -264,7 +374,7 @@ class HuggingFaceEmbeddingService:
         """
         try:
             test_text = "Hello world"
-            result = self.encode_single(test_text, max_retries=1, timeout=30)
+            result = self._request_embedding(test_text, max_retries=1, timeout=30)
             logger.info(f"API connection test successful. Embedding shape: {result.shape}")
             return True
         except Exception as e:
@@ -273,7 +383,7 @@ class HuggingFaceEmbeddingService:
     
     def encode_with_fallback(self, texts: Union[str, List[str]], max_retries: int = 3) -> np.ndarray:
         """
-        Encode texts with fallback to local processing if API consistently fails
+        Encode texts, falling back to the same model run locally if the API consistently fails
         
         Args:
             texts: Single text string or list of text strings
@@ -286,51 +396,102 @@ class HuggingFaceEmbeddingService:
             return self.encode(texts)
         except Exception as e:
             logger.error(f"HuggingFace API failed consistently: {str(e)}")
-            logger.warning("Consider using a local embedding model as fallback")
-            # For now, re-raise the exception
-            # In a production system, you might want to implement a local fallback here
-            raise Exception(f"Embedding service unavailable: {str(e)}")
+            if self.fallback is None:
+                raise Exception(f"Embedding service unavailable: {str(e)}")
+            logger.warning(f"Falling back to {type(self.fallback).__name__} for {self.model_name}")
+            return self.fallback.encode(texts)
     
-    def safe_encode_single(self, text: str, default_dim: int = 384) -> np.ndarray:
-        """
-        Safely encode a single text with fallback to zero vector if all else fails
-        
-        Args:
-            text: Input text string
-            default_dim: Default embedding dimension for fallback
-            
-        Returns:
-            numpy array of embeddings or zero vector
-        """
-        try:
-            return self.encode_single(text)
-        except Exception as e:
-            logger.error(f"Failed to encode text '{text[:50]}...': {str(e)}")
-            logger.warning(f"Returning zero vector of dimension {default_dim}")
-            return np.zeros(default_dim, dtype='float32')
+    def limiter_stats(self) -> Optional[Dict[str, float]]:
+        return self.limiter.stats()
+    
+    def breaker_stats(self) -> Optional[Dict[str, float]]:
+        stats = self.breaker.stats()
+        stats['fallback_requests'] = self._fallback_requests
+        return stats
 
 
 # Global instance to be used across the application
 embedding_service = None
 
-def get_embedding_service() -> HuggingFaceEmbeddingService:
+def build_embedding_store() -> Optional[SqliteEmbeddingStore]:
+    """
+    Open the persistent content-addressed embedding store, or None if disabled
+    """
+    if not config.EMBEDDING_STORE_PATH:
+        return None
+    return SqliteEmbeddingStore(config.EMBEDDING_STORE_PATH)
+
+def build_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Create the embedding cache described by the config, or None if disabled
+    """
+    disk_store = None
+    if config.EMBEDDING_CACHE_DIR:
+        disk_store = SqliteEmbeddingStore(os.path.join(config.EMBEDDING_CACHE_DIR, "embeddings.sqlite3"))
+    if config.EMBEDDING_CACHE_SIZE <= 0 and disk_store is None:
+        return None
+    return EmbeddingCache(
+        max_entries=config.EMBEDDING_CACHE_SIZE,
+        ttl_seconds=config.EMBEDDING_CACHE_TTL_SECONDS,
+        disk_store=disk_store
+    )
+
+def create_embedding_service(model_name: str, backend: str = None) -> EmbeddingService:
+    """
+    Build the embedding backend selected by EMBEDDING_BACKEND
+    
+    Args:
+        model_name: Model to embed with (the hashing backend only reads a "hashing-<dimension>" name)
+        backend: "hf" (hosted API), "local" (in-process CPU model) or "hashing"
+    """
+    backend = backend or config.EMBEDDING_BACKEND
+    cache = build_embedding_cache()
+    store = build_embedding_store()
+    if backend == 'hf':
+        fallback = None
+        if config.EMBEDDING_FALLBACK_BACKEND == 'local':
+            fallback = LocalEmbeddingService(
+                model_name, runtime=config.LOCAL_EMBEDDING_RUNTIME, threads=config.LOCAL_EMBEDDING_THREADS
+            )
+        return HuggingFaceEmbeddingService(model_name, cache=cache, store=store, fallback=fallback)
+    if backend == 'local':
+        return LocalEmbeddingService(
+            model_name, cache=cache, store=store,
+            runtime=config.LOCAL_EMBEDDING_RUNTIME, threads=config.LOCAL_EMBEDDING_THREADS
+        )
+    if backend == 'hashing':
+        # "hashing-768" names its own dimension, so a recorded serving model round-trips
+        dimension = config.HASH_EMBEDDING_DIMENSION
+        if model_name.startswith('hashing-') and model_name[len('hashing-'):].isdigit():
+            dimension = int(model_name[len('hashing-'):])
+        return HashingEmbeddingService(dimension, cache=cache, store=store)
+    raise ValueError(f"Unsupported embedding backend: {backend}")
+
+def get_embedding_service() -> EmbeddingService:
     """
     Get the global embedding service instance
     """
     global embedding_service
     if embedding_service is None:
-        model_name = os.environ.get('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
-        embedding_service = HuggingFaceEmbeddingService(model_name)
+        model_name = config.EMBEDDING_MODEL
+        embedding_service = create_embedding_service(model_name)
     return embedding_service
 
+def set_embedding_service(service: EmbeddingService):
+    """
+    Replace the global embedding service (the serving model changed)
+    """
+    global embedding_service
+    embedding_service = service
+
 def initialize_embedding_service(model_name: str = None):
     """
     Initialize the global embedding service
     """
     global embedding_service
     if model_name is None:
-        model_name = os.environ.get('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+        model_name = config.EMBEDDING_MODEL
     
-    embedding_service = HuggingFaceEmbeddingService(model_name)
-    logger.info(f"Embedding service initialized with model: {model_name}")
+    embedding_service = create_embedding_service(model_name)
+    logger.info(f"Embedding service initialized with model: {embedding_service.model_name}")
     return embedding_service
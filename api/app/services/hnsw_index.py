@@ -0,0 +1,293 @@
+"""
+In-process HNSW approximate nearest-neighbor index
+For deployments without pgvector; built on hnswlib and persisted to a local directory
+"""
+import json
+import os
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+
+from .vector_index import normalize_rows, top_k_indices
+
+logger = logging.getLogger(__name__)
+
+try:
+    import hnswlib
+except ImportError:  # Optional dependency, only needed for VECTOR_BACKEND=hnsw
+    hnswlib = None
+
+INDEX_FILE = "index.bin"
+IDS_FILE = "ids.npy"
+META_FILE = "meta.json"
+
+
+class HnswVectorIndex:
+    """
+    Approximate cosine similarity index backed by an HNSW graph
+
+    Labels in the graph are Document ids, so no separate id mapping is needed.
+    Replacing a document updates its vector in place; removals are soft deletes.
+    """
+
+    def __init__(
+        self,
+        dimension: Optional[int] = None,
+        m: int = 16,
+        ef_construction: int = 200,
+        ef_search: int = 64,
+        initial_capacity: int = 1024,
+        brute_force_limit: int = 2048
+    ):
+        if hnswlib is None:
+            raise ImportError("hnswlib is required for the HNSW vector backend (pip install hnswlib)")
+        self.dimension = dimension
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.brute_force_limit = brute_force_limit
+        self._initial_capacity = initial_capacity
+        self._graph = None
+        self._ids = set()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, document_id: int) -> bool:
+        return document_id in self._ids
+
+    @property
+    def ids(self) -> np.ndarray:
+        return np.fromiter(self._ids, dtype='int64', count=len(self._ids))
+
+    def _new_graph(self, capacity: int):
+        graph = hnswlib.Index(space='cosine', dim=self.dimension)
+        graph.init_index(
+            max_elements=max(capacity, self._initial_capacity),
+            ef_construction=self.ef_construction,
+            M=self.m
+        )
+        graph.set_ef(self.ef_search)
+        return graph
+
+    def _reserve(self, extra: int):
+        """Resize the graph geometrically ahead of inserts"""
+        needed = self._graph.element_count + extra
+        capacity = self._graph.get_max_elements()
+        if needed > capacity:
+            self._graph.resize_index(max(needed, capacity * 2))
+
+    def _check_dimension(self, dimension: int):
+        if self.dimension is None:
+            self.dimension = dimension
+        elif dimension != self.dimension:
+            raise ValueError(
+                f"Embedding dimension {dimension} does not match index dimension {self.dimension}"
+            )
+
+    def load(self, document_ids: Sequence[int], embeddings: np.ndarray):
+        """Build the graph from scratch over the given embeddings"""
+        embeddings = np.asarray(embeddings, dtype='float32')
+        if embeddings.ndim == 1:
+            embeddings = embeddings.reshape(len(document_ids), -1)
+        if len(document_ids) != embeddings.shape[0]:
+            raise ValueError("document_ids and embeddings must have the same length")
+
+        self._ids = set()
+        self._graph = None
+        if embeddings.shape[0] == 0:
+            return
+        self._check_dimension(embeddings.shape[1])
+        self._graph = self._new_graph(embeddings.shape[0])
+        self._graph.add_items(normalize_rows(embeddings), np.asarray(document_ids, dtype='int64'))
+        self._ids = {int(doc_id) for doc_id in document_ids}
+        logger.info(f"Built HNSW graph over {len(self._ids)} embeddings (dimension {self.dimension})")
+
+    def upsert(self, document_id: int, embedding: np.ndarray):
+        """Insert or replace the embedding for a document"""
+        vector = normalize_rows(np.asarray(embedding, dtype='float32').flatten())
+        self._check_dimension(vector.shape[1])
+        if self._graph is None:
+            self._graph = self._new_graph(self._initial_capacity)
+        self._reserve(1)
+        # hnswlib unmarks a soft-deleted label when it is added again
+        self._graph.add_items(vector, np.asarray([document_id], dtype='int64'))
+        self._ids.add(int(document_id))
+
+    def remove(self, document_id: int) -> bool:
+        if document_id not in self._ids:
+            return False
+        self._graph.mark_deleted(int(document_id))
+        self._ids.discard(document_id)
+        return True
+
+    def get_vector(self, document_id: int) -> Optional[np.ndarray]:
+        if document_id not in self._ids:
+            return None
+        return np.asarray(self._graph.get_items([int(document_id)])[0], dtype='float32')
+
+    def export(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (document_ids, normalized matrix) for all live documents"""
+        ids = self.ids
+        if not len(ids):
+            return ids, np.zeros((0, self.dimension or 0), dtype='float32')
+        # hnswlib normalizes vectors on insert in the cosine space
+        return ids, np.asarray(self._graph.get_items(ids), dtype='float32')
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        k: int = 5,
+        min_similarity: float = 0.0,
+        candidate_ids: Optional[Iterable[int]] = None,
+        exclude_ids: Optional[Iterable[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Find approximately the k most similar documents
+
+        Args:
+            query_embedding: Query vector (need not be normalized)
+            k: Number of results to return
+            min_similarity: Minimum cosine similarity threshold
+            candidate_ids: Restrict the search to these documents (e.g. a metadata filter)
+            exclude_ids: Documents that may not be selected (e.g. the query document itself)
+
+        Returns:
+            List of (document_id, similarity) pairs, best first
+        """
+        query = normalize_rows(query_embedding)
+        self._check_dimension(query.shape[1])
+        excluded = {int(i) for i in exclude_ids} & self._ids if exclude_ids is not None else set()
+        if candidate_ids is not None:
+            allowed = {int(i) for i in candidate_ids if i in self._ids} - excluded
+            k = min(k, len(allowed))
+            if k <= 0:
+                return []
+            if len(allowed) <= self.brute_force_limit:
+                # Small subsets are cheaper to score exactly than to filter a graph walk
+                labels = np.fromiter(allowed, dtype='int64', count=len(allowed))
+                vectors = np.asarray(self._graph.get_items(labels), dtype='float32')
+                scores = vectors @ query[0]
+                order = top_k_indices(scores, k)
+                labels, distances = labels[order][None, :], (1.0 - scores[order])[None, :]
+            else:
+                self._graph.set_ef(max(self.ef_search, k))
+                labels, distances = self._graph.knn_query(query, k=k, filter=lambda label: label in allowed)
+        else:
+            k = min(k, len(self._ids) - len(excluded))
+            if k <= 0:
+                return []
+            # A handful of exclusions is cheaper to widen the walk for than to
+            # filter every visited node through a Python callback
+            self._graph.set_ef(max(self.ef_search, k + len(excluded)))
+            labels, distances = self._graph.knn_query(query, k=k + len(excluded))
+
+        results = []
+        for label, distance in zip(labels[0], distances[0]):
+            if int(label) in excluded:
+                continue
+            similarity = 1.0 - float(distance)
+            if similarity < min_similarity or len(results) == k:
+                break
+            results.append((int(label), similarity))
+        return results
+
+    def search_many(
+        self,
+        query_embeddings: np.ndarray,
+        k: int = 5,
+        min_similarity: float = 0.0
+    ) -> List[List[Tuple[int, float]]]:
+        """Find approximately the k most similar documents for each query in one batched graph query"""
+        queries = normalize_rows(query_embeddings)
+        self._check_dimension(queries.shape[1])
+        k = min(k, len(self._ids))
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+        self._graph.set_ef(max(self.ef_search, k))
+        labels, distances = self._graph.knn_query(queries, k=k)
+
+        results = []
+        for row_labels, row_distances in zip(labels, distances):
+            hits = []
+            for label, distance in zip(row_labels, row_distances):
+                similarity = 1.0 - float(distance)
+                if similarity < min_similarity:
+                    break
+                hits.append((int(label), similarity))
+            results.append(hits)
+        return results
+
+    def save(self, directory: str, model_name: str, watermark: Optional[str] = None):
+        """
+        Persist the graph and its metadata so restarts can skip the build
+
+        Every file is written to a temporary name and renamed into place, metadata
+        last, so a reader never pairs one save's graph with another's ids. Callers
+        sharing the directory between workers hold snapshot_lock around this.
+
+        Args:
+            directory: Directory to write the index files to
+            model_name: Embedding model the graph was built for
+            watermark: ISO timestamp of the newest change the graph reflects
+        """
+        if self._graph is None:
+            return
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, f".{INDEX_FILE}.tmp")
+        self._graph.save_index(tmp_path)
+        os.replace(tmp_path, os.path.join(directory, INDEX_FILE))
+        # Soft-deleted labels stay in the graph file, so record the live ones separately
+        ids = self.ids
+        tmp_path = os.path.join(directory, f".{IDS_FILE}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, ids)
+        os.replace(tmp_path, os.path.join(directory, IDS_FILE))
+        tmp_path = os.path.join(directory, f".{META_FILE}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({
+                'model_name': model_name,
+                'dimension': self.dimension,
+                'count': len(ids),
+                'm': self.m,
+                'ef_construction': self.ef_construction,
+                'watermark': watermark,
+            }, f)
+        os.replace(tmp_path, os.path.join(directory, META_FILE))
+        logger.info(f"Saved HNSW index with {len(self._ids)} embeddings to {directory}")
+
+    def restore(self, directory: str, model_name: str) -> Optional[Dict]:
+        """
+        Load a persisted graph if one exists for this model
+
+        Returns:
+            The saved metadata if the graph was restored, None if it must be rebuilt
+        """
+        index_path = os.path.join(directory, INDEX_FILE)
+        ids_path = os.path.join(directory, IDS_FILE)
+        meta_path = os.path.join(directory, META_FILE)
+        if not all(os.path.isfile(path) for path in (index_path, ids_path, meta_path)):
+            return None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get('model_name') != model_name:
+                logger.info(f"Ignoring HNSW index built for {meta.get('model_name')}")
+                return None
+            ids = np.load(ids_path)
+            if len(ids) != meta.get('count'):
+                logger.warning(f"HNSW index in {directory} is inconsistent, ignoring it")
+                return None
+            self.dimension = int(meta['dimension'])
+            graph = hnswlib.Index(space='cosine', dim=self.dimension)
+            graph.load_index(index_path)
+            graph.set_ef(self.ef_search)
+            self._graph = graph
+            self._ids = {int(doc_id) for doc_id in ids}
+            logger.info(f"Restored HNSW index with {len(self._ids)} embeddings from {directory}")
+            return meta
+        except Exception as e:
+            logger.warning(f"Could not restore HNSW index from {directory}: {str(e)}")
+            self._graph = None
+            self._ids = set()
+            return None
@@ -0,0 +1,112 @@
+"""
+On-disk snapshot of the corpus embedding matrix
+Lets every uvicorn worker memory-map one page-cached copy instead of scanning the database
+"""
+import fcntl
+import json
+import os
+import numpy as np
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_FILE = "embeddings.npy"
+IDS_FILE = "ids.npy"
+HEADER_FILE = "header.json"
+LOCK_FILE = "snapshot.lock"
+
+
+@contextmanager
+def snapshot_lock(directory: str, exclusive: bool = True):
+    """
+    Hold a cross-process lock on the snapshot directory
+
+    Writers take it exclusively and readers shared. It only ever covers file reads
+    and writes: holding it across a database query would stall every other worker's
+    startup behind that query.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_header(directory: str) -> Optional[Dict]:
+    path = os.path.join(directory, HEADER_FILE)
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_snapshot(
+    directory: str,
+    document_ids: np.ndarray,
+    embeddings: np.ndarray,
+    model_name: str,
+    watermark: Optional[str] = None
+):
+    """
+    Write the snapshot files, replacing any previous snapshot
+
+    Each file is written under a temporary name and renamed into place; processes
+    that still map the old files keep their pages until they remap.
+
+    Args:
+        directory: Snapshot directory
+        document_ids: Document id per row
+        embeddings: Normalized float32 matrix (n, dimension)
+        model_name: Embedding model the vectors came from
+        watermark: ISO timestamp of the newest change included
+    """
+    os.makedirs(directory, exist_ok=True)
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    header = {
+        'model_name': model_name,
+        'dimension': int(embeddings.shape[1]) if embeddings.ndim == 2 else 0,
+        'count': int(len(document_ids)),
+        'watermark': watermark,
+    }
+
+    for name, array in ((EMBEDDINGS_FILE, embeddings), (IDS_FILE, np.asarray(document_ids, dtype='int64'))):
+        tmp_path = os.path.join(directory, f".{name}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, os.path.join(directory, name))
+
+    # Header goes last so readers never see it ahead of the arrays it describes
+    tmp_path = os.path.join(directory, f".{HEADER_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(header, f)
+    os.replace(tmp_path, os.path.join(directory, HEADER_FILE))
+    logger.info(f"Wrote embedding snapshot with {header['count']} rows to {directory}")
+
+
+def read_snapshot(directory: str, model_name: str) -> Optional[Tuple[np.ndarray, np.ndarray, Dict]]:
+    """
+    Memory-map a snapshot written for the given model
+
+    Returns:
+        (document_ids, embeddings, header), or None if there is no usable snapshot
+    """
+    header = read_header(directory)
+    if header is None:
+        return None
+    if header.get('model_name') != model_name:
+        logger.info(f"Ignoring embedding snapshot built for {header.get('model_name')}")
+        return None
+    try:
+        embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode='r')
+        document_ids = np.load(os.path.join(directory, IDS_FILE))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read embedding snapshot in {directory}: {str(e)}")
+        return None
+    if embeddings.shape[0] != len(document_ids) or embeddings.shape[0] != header.get('count'):
+        logger.warning(f"Embedding snapshot in {directory} is inconsistent, ignoring it")
+        return None
+    return document_ids, embeddings, header
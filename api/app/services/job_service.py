@@ -0,0 +1,501 @@
+"""
+Background jobs for long-running maintenance work (index builds)
+Jobs run as tasks on the API's event loop and report progress that clients poll by job id
+"""
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import logging
+
+import asyncpg
+from prisma import Json
+
+from .rate_limiter import background_priority
+from ..utils.config import config
+
+logger = logging.getLogger(__name__)
+
+MAX_JOB_ERRORS = 20
+
+# Identifies the process running a job in its stored state
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Missed state syncs after which another worker's active job is reported as lost
+STALE_SYNC_INTERVALS = 10
+
+# Query parameters of a Prisma connection string that asyncpg would send as server settings
+PRISMA_URL_PARAMS = {'schema', 'connection_limit', 'pool_timeout', 'pgbouncer', 'socket_timeout', 'statement_cache_size'}
+
+JOB_ACTIONS = ('pause', 'resume', 'cancel')
+
+
+class JobConflictError(Exception):
+    """Raised when a job is submitted while another one with the same key is still active"""
+
+    def __init__(self, key: str, job_id: Optional[str] = None, kind: Optional[str] = None, status: Optional[str] = None):
+        if job_id is None:
+            super().__init__(f"Another worker is running a job for {key}")
+        else:
+            super().__init__(f"{kind} job {job_id} is already {status}")
+        self.key = key
+        self.job_id = job_id
+
+
+def lock_database_url() -> str:
+    """Postgres URL for job locks: JOB_LOCK_DATABASE_URL, else DATABASE_URL without Prisma-only parameters"""
+    url = config.JOB_LOCK_DATABASE_URL or os.environ.get("DATABASE_URL", "")
+    parts = urlsplit(url)
+    query = [(name, value) for name, value in parse_qsl(parts.query) if name not in PRISMA_URL_PARAMS]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class JobLock:
+    """
+    Postgres advisory lock on a job key, held for the job's duration
+
+    The lock is session-level, so it lives on a dedicated connection rather than
+    Prisma's pool, and that connection must not go through a transaction-mode
+    pooler. Postgres releases it when the connection drops, including when the
+    worker holding it dies.
+    """
+
+    def __init__(self, key: str):
+        self.key = f"job:{key}"
+        self._connection = None
+
+    async def acquire(self) -> bool:
+        """Take the lock without waiting; False if another session holds it"""
+        connection = await asyncpg.connect(lock_database_url())
+        try:
+            acquired = await connection.fetchval('SELECT pg_try_advisory_lock(hashtext($1))', self.key)
+        except Exception:
+            await connection.close()
+            raise
+        if not acquired:
+            await connection.close()
+            return False
+        self._connection = connection
+        return True
+
+    async def release(self):
+        connection = self._connection
+        self._connection = None
+        if connection is None:
+            return
+        try:
+            await connection.execute('SELECT pg_advisory_unlock(hashtext($1))', self.key)
+        except Exception as e:
+            logger.warning(f"Error releasing job lock {self.key}: {str(e)}")
+        finally:
+            await connection.close()
+
+
+class Job:
+    """
+    One background job and its progress
+
+    The work function receives the job and calls report() with its running stats
+    and wait_if_paused() at points where it is safe to stop (between chunks).
+    """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    PAUSED = 'paused'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    # Another worker's job whose stored state stopped being updated
+    LOST = 'lost'
+    ACTIVE_STATES = (QUEUED, RUNNING, PAUSED)
+
+    def __init__(self, kind: str, key: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.worker = WORKER_ID
+        self.status = self.QUEUED
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.progress: Dict = {}
+        self.rows_done: Optional[int] = None
+        self.rows_total: Optional[int] = None
+        self.errors: List[str] = []
+        self.result: Optional[Dict] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = asyncio.Event()
+        self._running.set()
+        # Throughput and ETA count only time spent running, not paused
+        self._active_seconds = 0.0
+        self._active_since: Optional[float] = None
+        self._rows_at_start: Optional[int] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in self.ACTIVE_STATES
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    def _elapsed(self) -> float:
+        if self._active_since is None:
+            return self._active_seconds
+        return self._active_seconds + time.monotonic() - self._active_since
+
+    def _start_clock(self):
+        if self._active_since is None:
+            self._active_since = time.monotonic()
+
+    def _stop_clock(self):
+        if self._active_since is not None:
+            self._active_seconds += time.monotonic() - self._active_since
+            self._active_since = None
+
+    def report(self, stats: Dict, rows_done: Optional[int] = None, rows_total: Optional[int] = None):
+        """
+        Record the work function's current stats
+
+        Args:
+            stats: Counters to show under "progress"; an "errors" list is collected separately
+            rows_done: Rows finished so far, for throughput and ETA
+            rows_total: Rows the job will process in total, for the ETA
+        """
+        self.progress.update({key: value for key, value in stats.items() if key != 'errors'})
+        for message in stats.get('errors', [])[len(self.errors):]:
+            self.add_error(message)
+        if rows_done is not None:
+            if self._rows_at_start is None:
+                # Rows done before this run (a resumed checkpoint) don't count towards throughput
+                self._rows_at_start = rows_done
+            self.rows_done = rows_done
+        if rows_total is not None:
+            self.rows_total = rows_total
+
+    def add_error(self, message: str):
+        if len(self.errors) < MAX_JOB_ERRORS:
+            self.errors.append(message)
+
+    async def wait_if_paused(self):
+        if self.paused:
+            self._stop_clock()
+            await self._running.wait()
+            self._start_clock()
+
+    def pause(self):
+        if self.status == self.RUNNING:
+            self._running.clear()
+            self.status = self.PAUSED
+            logger.info(f"Paused job {self.id}")
+
+    def resume(self):
+        if self.status == self.PAUSED:
+            self.status = self.RUNNING
+            self._running.set()
+            logger.info(f"Resumed job {self.id}")
+
+    def cancel(self):
+        if self.active and self._task is not None:
+            # Cancellation is delivered at the next await, including while paused
+            self._task.cancel()
+            logger.info(f"Cancelling job {self.id}")
+
+    def to_dict(self) -> Dict:
+        elapsed = self._elapsed()
+        rows_done = self.rows_done
+        total_rows = self.rows_total
+        throughput = None
+        eta_seconds = None
+        if rows_done is not None and elapsed > 0:
+            throughput = round((rows_done - (self._rows_at_start or 0)) / elapsed, 1)
+            if total_rows is not None and throughput > 0 and self.active:
+                eta_seconds = round(max(total_rows - rows_done, 0) / throughput, 1)
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'key': self.key,
+            'status': self.status,
+            'worker': self.worker,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'rows_done': rows_done,
+            'total_rows': total_rows,
+            'rows_per_second': throughput,
+            'eta_seconds': eta_seconds,
+            'elapsed_seconds': round(elapsed, 2),
+            'progress': self.progress,
+            'errors': self.errors,
+            'result': self.result,
+        }
+
+
+class JobManager:
+    """
+    Runs jobs as background tasks, at most one active job per key
+
+    Once attached to the database, a job also holds a Postgres advisory lock on
+    its key, so jobs with the same key run one at a time across all workers, and
+    its state is stored in the BackgroundJob table: any worker can report it, and
+    pause, resume or cancel requests made on another worker are applied by the
+    job's own worker at its next state sync. The work itself must be resumable
+    (the CSV ingest checkpoints to the database) so a lost or cancelled job can
+    be resubmitted.
+    """
+
+    def __init__(self, history_limit: int = 50, sync_interval: float = 2.0):
+        self.history_limit = history_limit
+        self.sync_interval = sync_interval
+        self.prisma = None
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._locks: Dict[str, JobLock] = {}
+        self._cleanups = set()
+
+    def attach(self, prisma_client):
+        """Share locks and job state with other workers through this database"""
+        self.prisma = prisma_client
+
+    @property
+    def shared(self) -> bool:
+        return self.prisma is not None and self.prisma.is_connected()
+
+    def _active_job(self, key: str) -> Optional[Job]:
+        for job in self._jobs.values():
+            if job.key == key and job.active:
+                return job
+        return None
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[:max(len(finished) - self.history_limit, 0)]:
+            del self._jobs[job_id]
+
+    async def submit(self, kind: str, key: str, work: Callable[[Job], Awaitable[Dict]]) -> Job:
+        """
+        Start a job in the background
+
+        Args:
+            kind: Job type, e.g. "build-index"
+            key: What the job works on; jobs of any kind with the same key run one at a time
+            work: Coroutine function called with the job, returning the job's result
+
+        Returns:
+            The queued job
+
+        Raises:
+            JobConflictError: If a job with this key is still active in any worker
+        """
+        existing = self._active_job(key)
+        if existing is not None:
+            raise JobConflictError(key, existing.id, existing.kind, existing.status)
+        job = Job(kind, key)
+        if self.shared:
+            lock = JobLock(key)
+            if not await lock.acquire():
+                raise await self._remote_conflict(key)
+            # Another submit for this key may have started while the lock was being taken
+            existing = self._active_job(key)
+            if existing is not None:
+                await lock.release()
+                raise JobConflictError(key, existing.id, existing.kind, existing.status)
+            self._locks[job.id] = lock
+            try:
+                await self.prisma.backgroundjob.create(data={
+                    'id': job.id,
+                    'kind': kind,
+                    'key': key,
+                    'status': job.status,
+                    'worker': job.worker,
+                    'state': self._state_json(job),
+                })
+            except Exception as e:
+                logger.warning(f"Could not store job {job.id}: {str(e)}")
+        self._jobs[job.id] = job
+        job._task = asyncio.create_task(self._run(job, work))
+        job._task.add_done_callback(lambda task: self._on_task_done(job))
+        self._prune()
+        logger.info(f"Submitted {kind} job {job.id} for {key}")
+        return job
+
+    async def _remote_conflict(self, key: str) -> JobConflictError:
+        """The conflict error for a key locked by another worker, naming its job when stored"""
+        try:
+            row = await self.prisma.backgroundjob.find_first(
+                where={'key': key, 'status': {'in': list(Job.ACTIVE_STATES)}},
+                order={'created_at': 'desc'}
+            )
+        except Exception as e:
+            logger.warning(f"Could not look up the active job for {key}: {str(e)}")
+            row = None
+        if row is None:
+            return JobConflictError(key)
+        return JobConflictError(key, row.id, row.kind, row.status)
+
+    async def _run(self, job: Job, work: Callable[[Job], Awaitable[Dict]]):
+        job.status = Job.RUNNING
+        job.started_at = datetime.now(timezone.utc)
+        job._start_clock()
+        sync_task = asyncio.create_task(self._sync_loop(job)) if self.shared else None
+        try:
+            # Embedding calls made by the job yield to search queries
+            with background_priority():
+                job.result = await work(job)
+            job.status = Job.COMPLETED
+            logger.info(f"Job {job.id} completed")
+        except asyncio.CancelledError:
+            job.status = Job.CANCELLED
+            logger.info(f"Job {job.id} cancelled")
+        except Exception as e:
+            job.status = Job.FAILED
+            job.add_error(str(e))
+            logger.error(f"Job {job.id} failed: {str(e)}")
+        finally:
+            job._stop_clock()
+            job._running.set()
+            job.finished_at = datetime.now(timezone.utc)
+            if sync_task is not None:
+                sync_task.cancel()
+                await asyncio.gather(sync_task, return_exceptions=True)
+            await self._finish(job)
+
+    def _on_task_done(self, job: Job):
+        # A job cancelled before its task first ran never reaches _run's cleanup
+        if job.status != Job.QUEUED:
+            return
+        job.status = Job.CANCELLED
+        job.finished_at = datetime.now(timezone.utc)
+        cleanup = asyncio.create_task(self._finish(job))
+        self._cleanups.add(cleanup)
+        cleanup.add_done_callback(self._cleanups.discard)
+
+    async def _finish(self, job: Job):
+        """Store the job's final state and release its lock"""
+        lock = self._locks.pop(job.id, None)
+        if lock is None:
+            return
+        await self._sync(job)
+        await lock.release()
+
+    async def _sync_loop(self, job: Job):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            action = await self._sync(job)
+            if action in JOB_ACTIONS:
+                getattr(job, action)()
+
+    async def _sync(self, job: Job) -> Optional[str]:
+        """
+        Store the job's state, which also serves as its worker's heartbeat
+
+        Returns:
+            The pause/resume/cancel action another worker requested since the last sync
+        """
+        try:
+            rows = await self.prisma.query_raw(
+                'UPDATE "BackgroundJob" AS j SET "status" = $2, "state" = $3::jsonb, "command" = NULL, '
+                '"updated_at" = now() AT TIME ZONE \'UTC\' '
+                'FROM (SELECT "id", "command" FROM "BackgroundJob" WHERE "id" = $1 FOR UPDATE) AS previous '
+                'WHERE j."id" = previous."id" RETURNING previous."command" AS command',
+                job.id, job.status, json.dumps(job.to_dict(), default=str)
+            )
+        except Exception as e:
+            logger.warning(f"Could not store state of job {job.id}: {str(e)}")
+            return None
+        return rows[0]['command'] if rows else None
+
+    @staticmethod
+    def _state_json(job: Job) -> Json:
+        return Json(json.loads(json.dumps(job.to_dict(), default=str)))
+
+    def _stored_state(self, row) -> Dict:
+        """A stored job's state as its worker last reported it"""
+        state = dict(row.state)
+        stale_after = timedelta(seconds=self.sync_interval * STALE_SYNC_INTERVALS)
+        if row.status in Job.ACTIVE_STATES and datetime.now(timezone.utc) - row.updated_at > stale_after:
+            state['status'] = Job.LOST
+        if row.command:
+            state['requested_action'] = row.command
+        return state
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """A job running or run by this worker"""
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        return list(self._jobs.values())
+
+    async def describe(self, job_id: str) -> Optional[Dict]:
+        """State of a job of any worker, or None if it is unknown"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if not self.shared:
+            return None
+        row = await self.prisma.backgroundjob.find_unique(where={'id': job_id})
+        return self._stored_state(row) if row is not None else None
+
+    async def describe_all(self) -> List[Dict]:
+        """Recent jobs of every worker, oldest first"""
+        states = {job.id: job.to_dict() for job in self._jobs.values()}
+        if self.shared:
+            rows = await self.prisma.backgroundjob.find_many(order={'created_at': 'desc'}, take=self.history_limit)
+            for row in rows:
+                if row.id not in states:
+                    states[row.id] = self._stored_state(row)
+        return sorted(states.values(), key=lambda state: state['created_at'])
+
+    async def control(self, job_id: str, action: str) -> Optional[Dict]:
+        """
+        Pause, resume or cancel a job of any worker
+
+        A job of this worker is changed at once. For another worker's job the action is
+        stored and applied by that worker at its next state sync.
+
+        Returns:
+            The job's state after the request, or None if it is unknown
+        """
+        if action not in JOB_ACTIONS:
+            raise ValueError(f"Unknown job action: {action}")
+        job = self._jobs.get(job_id)
+        if job is not None:
+            getattr(job, action)()
+            return job.to_dict()
+        if not self.shared:
+            return None
+        await self.prisma.backgroundjob.update_many(
+            where={'id': job_id, 'status': {'in': list(Job.ACTIVE_STATES)}},
+            data={'command': action}
+        )
+        return await self.describe(job_id)
+
+    async def shutdown(self):
+        """Cancel every active job and wait for it to stop"""
+        tasks = [job._task for job in self._jobs.values() if job.active and job._task is not None]
+        for job in self._jobs.values():
+            job.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if self._cleanups:
+            await asyncio.gather(*self._cleanups, return_exceptions=True)
+
+
+# Global instance
+_job_manager = None
+
+
+def get_job_manager() -> JobManager:
+    """Get the global job manager instance"""
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager(
+            history_limit=config.JOB_HISTORY_LIMIT,
+            sync_interval=config.JOB_STATE_SYNC_SECONDS
+        )
+    return _job_manager
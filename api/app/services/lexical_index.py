@@ -0,0 +1,189 @@
+"""
+In-process BM25 inverted index over document text and entity fields
+Catches exact party names and statute sections that embedding search misses
+"""
+import math
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import logging
+
+from ..classes.global_classes import VALID_PARAMS
+from .metadata_index import split_values
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "of", "on", "or", "that", "the", "to", "v", "vs", "was", "with",
+}
+
+# Party and entity fields count more than the same term in a long summary
+NAME_FIELD_WEIGHT = 3.0
+
+# Columns holding names of people and parties, whose labels can answer a query outright
+PERSON_NAME_COLUMNS = ('JUDGE', 'LAWYER')
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return [token for token in re.findall(r"[a-z0-9]+", str(text).casefold()) if token not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[int]],
+    k: int = 60,
+    normalize: bool = False
+) -> List[Tuple[int, float]]:
+    """
+    Fuse several ranked id lists: score(d) = sum over lists of 1 / (k + rank)
+
+    Args:
+        normalize: Scale scores to [0, 1], 1 meaning first in every ranking, so scores
+            fused from different numbers of rankings are comparable
+
+    Returns:
+        List of (document_id, fused score), best first
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, document_id in enumerate(ranking, start=1):
+            scores[document_id] = scores.get(document_id, 0.0) + 1.0 / (k + rank)
+    if normalize and rankings:
+        best_possible = len(rankings) / (k + 1)
+        scores = {document_id: score / best_possible for document_id, score in scores.items()}
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """
+    BM25 over summary, petitioner, respondent and the VALID_PARAMS entity columns
+
+    Name fields are weighted by NAME_FIELD_WEIGHT inside the term frequency, a
+    simplified BM25F.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._terms_of: Dict[int, Dict[str, float]] = {}
+        self._length: Dict[int, float] = {}
+        self._total_length = 0.0
+        self._names: Dict[int, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._terms_of)
+
+    def add(
+        self,
+        document_id: int,
+        summary: Optional[str] = None,
+        petitioner: Optional[str] = None,
+        respondent: Optional[str] = None,
+        metadata: Optional[Dict] = None
+    ):
+        """Index (or re-index) a document"""
+        self.remove(document_id)
+
+        names = [petitioner, respondent]
+        if isinstance(metadata, dict):
+            names.extend(metadata.get(column) for column in set(VALID_PARAMS.values()) - {'PETITIONER', 'RESPONDENT'})
+        name_tokens = [token for name in names for token in tokenize(name)]
+
+        terms: Dict[str, float] = {}
+        for token in tokenize(summary):
+            terms[token] = terms.get(token, 0.0) + 1.0
+        for token in name_tokens:
+            terms[token] = terms.get(token, 0.0) + NAME_FIELD_WEIGHT
+
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[document_id] = tf
+        length = sum(terms.values())
+        self._terms_of[document_id] = terms
+        self._length[document_id] = length
+        self._total_length += length
+        self._names[document_id] = self._name_labels(petitioner, respondent, metadata)
+
+    @staticmethod
+    def _name_labels(petitioner: Optional[str], respondent: Optional[str], metadata: Optional[Dict]) -> Set[str]:
+        """Each individual party, judge and lawyer name, as its token string"""
+        values = [petitioner, respondent]
+        if isinstance(metadata, dict):
+            values.extend(metadata.get(column) for column in PERSON_NAME_COLUMNS)
+        labels = set()
+        for value in values:
+            if not value:
+                continue
+            parts = split_values(value)
+            # A joined value is listed first, followed by its names
+            for part in parts[1:] if len(parts) > 1 else parts:
+                tokens = tokenize(part)
+                if tokens:
+                    labels.add(" ".join(tokens))
+        return labels
+
+    def remove(self, document_id: int) -> bool:
+        terms = self._terms_of.pop(document_id, None)
+        if terms is None:
+            return False
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(document_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._length.pop(document_id, 0.0)
+        self._names.pop(document_id, None)
+        return True
+
+    @property
+    def document_ids(self) -> Iterable[int]:
+        return self._terms_of.keys()
+
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        candidate_ids: Optional[Set[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Rank documents by BM25
+
+        Args:
+            query: Free-text query
+            k: Number of results to return
+            candidate_ids: Restrict scoring to these documents
+
+        Returns:
+            List of (document_id, score) pairs, best first
+        """
+        n = len(self._terms_of)
+        if n == 0:
+            return []
+        average_length = self._total_length / n
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for document_id, tf in postings.items():
+                if candidate_ids is not None and document_id not in candidate_ids:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self._length[document_id] / average_length)
+                scores[document_id] = scores.get(document_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def is_name_match(self, query: str, document_id: int) -> bool:
+        """
+        Whether the query is exactly one of the document's party, judge or lawyer names
+
+        Such queries are fully answered lexically and can skip the embedding call. Only
+        whole multi-word names count: topical phrases found in court, statute or
+        organization fields, or spanning two names, still need the vector ranking.
+        """
+        tokens = tokenize(query)
+        if len(tokens) < 2:
+            return False
+        return " ".join(tokens) in self._names.get(document_id, set())
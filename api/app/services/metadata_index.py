@@ -0,0 +1,149 @@
+"""
+Inverted index over document entity fields and metadata
+Maps each normalized field value to the set of document ids carrying it, so filters are
+resolved before any vector scoring happens
+"""
+import ast
+import re
+from typing import Dict, Iterable, List, Optional, Set, Union
+import logging
+
+from ..classes.global_classes import VALID_PARAMS
+
+logger = logging.getLogger(__name__)
+
+# Metadata values longer than this are free text rather than filterable labels
+MAX_VALUE_LENGTH = 200
+
+FilterValue = Union[str, int, float, bool, List[Union[str, int, float, bool]]]
+
+
+def normalize_value(value) -> str:
+    return re.sub(r"\s+", " ", str(value)).strip().casefold()
+
+
+def resolve_field(name: str) -> str:
+    """Map request parameter names (judge, court, ...) to the column names used in metadata"""
+    return VALID_PARAMS.get(name.lower(), name)
+
+
+def split_values(value) -> List[str]:
+    """
+    Split a stored entity value into individual labels
+
+    Entity columns from the NER export hold a list literal ("['A', 'B']"), names
+    joined by commas or semicolons (wrapped across lines), or a single name; both the
+    individual labels and the whole value are indexed.
+    """
+    if isinstance(value, (list, tuple)):
+        return [normalize_value(v) for v in value if v is not None and str(v).strip()]
+    text = str(value).strip()
+    values = [normalize_value(text)]
+    if text.startswith("[") and text.endswith("]"):
+        try:
+            parsed = ast.literal_eval(text)
+            if isinstance(parsed, (list, tuple)):
+                values.extend(normalize_value(v) for v in parsed if str(v).strip())
+        except (ValueError, SyntaxError):
+            pass
+    elif "," in text or ";" in text:
+        values.extend(normalize_value(v) for v in re.split(r"[,;]", text) if v.strip())
+    return [v for v in dict.fromkeys(values) if v]
+
+
+class MetadataFilterIndex:
+    """
+    Field -> value -> document id postings for structured search filters
+
+    Indexes the petitioner/respondent columns, every VALID_PARAMS entity column,
+    and any other short scalar metadata value.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, Set[int]]] = {}
+        self._fields_of: Dict[int, Dict[str, List[str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._fields_of)
+
+    def _document_fields(
+        self,
+        petitioner: Optional[str],
+        respondent: Optional[str],
+        metadata: Optional[Dict]
+    ) -> Dict[str, List[str]]:
+        fields = {}
+        if petitioner:
+            fields['PETITIONER'] = split_values(petitioner)
+        if respondent:
+            fields['RESPONDENT'] = split_values(respondent)
+        if isinstance(metadata, dict):
+            entity_columns = set(VALID_PARAMS.values())
+            for key, value in metadata.items():
+                if value is None:
+                    continue
+                if key not in entity_columns:
+                    if not isinstance(value, (str, int, float, bool)) or len(str(value)) > MAX_VALUE_LENGTH:
+                        continue
+                values = split_values(value)
+                if values:
+                    fields.setdefault(key, []).extend(values)
+        return fields
+
+    def add(
+        self,
+        document_id: int,
+        petitioner: Optional[str] = None,
+        respondent: Optional[str] = None,
+        metadata: Optional[Dict] = None
+    ):
+        """Index (or re-index) the filterable fields of a document"""
+        self.remove(document_id)
+        fields = self._document_fields(petitioner, respondent, metadata)
+        for field, values in fields.items():
+            postings = self._postings.setdefault(field, {})
+            for value in values:
+                postings.setdefault(value, set()).add(document_id)
+        self._fields_of[document_id] = fields
+
+    def remove(self, document_id: int) -> bool:
+        fields = self._fields_of.pop(document_id, None)
+        if fields is None:
+            return False
+        for field, values in fields.items():
+            postings = self._postings.get(field, {})
+            for value in values:
+                ids = postings.get(value)
+                if ids is not None:
+                    ids.discard(document_id)
+                    if not ids:
+                        del postings[value]
+        return True
+
+    @property
+    def document_ids(self) -> Iterable[int]:
+        return self._fields_of.keys()
+
+    def match(self, filters: Dict[str, FilterValue]) -> Set[int]:
+        """
+        Resolve filters to the matching document ids
+
+        Fields are ANDed together; a list of values for one field is ORed.
+
+        Args:
+            filters: Mapping of field name (VALID_PARAMS key or metadata key) to value(s)
+
+        Returns:
+            Set of matching document ids
+        """
+        result: Optional[Set[int]] = None
+        for name, wanted in filters.items():
+            postings = self._postings.get(resolve_field(name), {})
+            values = wanted if isinstance(wanted, list) else [wanted]
+            matched: Set[int] = set()
+            for value in values:
+                matched |= postings.get(normalize_value(value), set())
+            result = matched if result is None else result & matched
+            if not result:
+                return set()
+        return result if result is not None else set()
@@ -0,0 +1,286 @@
+"""
+Precomputed k-nearest-neighbor lists for every indexed document
+Built in bulk with blocked matrix products and kept current as documents change, so recommendations are a lookup
+"""
+import json
+import os
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+
+from .vector_index import top_k_rows
+
+logger = logging.getLogger(__name__)
+
+IDS_FILE = "ids.npy"
+NEIGHBORS_FILE = "neighbors.npy"
+SCORES_FILE = "scores.npy"
+META_FILE = "meta.json"
+
+
+class NeighborGraph:
+    """
+    Top-k neighbor list per document, as parallel (rows, k) id and score arrays
+
+    Row i holds the k most similar other documents of _ids[i], best first; unused
+    slots are -1 with score -inf. Incremental updates are approximate: a changed
+    document is only offered to the documents among its own update candidates,
+    which is where it can enter a top-k list in practice, and removing a document
+    leaves the lists it was in one entry short. A rebuild restores exactness.
+
+    build() may run in a worker thread while the event loop keeps updating and
+    reading the graph: it computes into new arrays, and changes made meanwhile are
+    applied to the current graph and replayed onto the new one when it is swapped in.
+    """
+
+    def __init__(self, k: int = 20, initial_capacity: int = 1024):
+        self.k = k
+        self._initial_capacity = initial_capacity
+        self._lock = threading.Lock()
+        self._building = False
+        self._pending: List[Tuple[int, Optional[Sequence[Tuple[int, float]]]]] = []
+        self._reset(0)
+
+    def _reset(self, capacity: int):
+        self._size = 0
+        self._ids = np.full(capacity, -1, dtype='int64')
+        self._neighbors = np.full((capacity, self.k), -1, dtype='int64')
+        self._scores = np.full((capacity, self.k), -np.inf, dtype='float32')
+        self._row_of: Dict[int, int] = {}
+        self._free: List[int] = []
+
+    def _install(self, ids: np.ndarray, neighbors: np.ndarray, scores: np.ndarray):
+        """Replace the graph with fully computed arrays; the caller holds the lock"""
+        self._reset(0)
+        self._ids, self._neighbors, self._scores = ids, neighbors, scores
+        self._size = len(ids)
+        self._row_of = {int(doc_id): row for row, doc_id in enumerate(ids)}
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def __contains__(self, document_id: int) -> bool:
+        return document_id in self._row_of
+
+    @property
+    def ids(self) -> np.ndarray:
+        with self._lock:
+            return np.fromiter(self._row_of, dtype='int64', count=len(self._row_of))
+
+    def _grow(self, min_capacity: int):
+        capacity = len(self._ids)
+        if min_capacity <= capacity:
+            return
+        capacity = max(min_capacity, capacity * 2, self._initial_capacity)
+        ids = np.full(capacity, -1, dtype='int64')
+        neighbors = np.full((capacity, self.k), -1, dtype='int64')
+        scores = np.full((capacity, self.k), -np.inf, dtype='float32')
+        ids[:self._size] = self._ids[:self._size]
+        neighbors[:self._size] = self._neighbors[:self._size]
+        scores[:self._size] = self._scores[:self._size]
+        self._ids, self._neighbors, self._scores = ids, neighbors, scores
+
+    def build(
+        self,
+        document_ids: Sequence[int],
+        normalized_embeddings: np.ndarray,
+        max_block_bytes: int = 256 * 1024 * 1024
+    ):
+        """
+        Compute every document's neighbor list from scratch
+
+        Rows are processed in blocks, each scored against the whole corpus as one
+        matrix product; blocks are sized so the score matrix stays under max_block_bytes.
+        Updates and removals made during the build are replayed onto the result.
+
+        Args:
+            document_ids: Document id per row
+            normalized_embeddings: L2-normalized float32 matrix (n, dimension)
+        """
+        with self._lock:
+            self._building = True
+            self._pending = []
+        try:
+            n = len(document_ids)
+            ids = np.asarray(document_ids, dtype='int64')
+            neighbors = np.full((n, self.k), -1, dtype='int64')
+            graph_scores = np.full((n, self.k), -np.inf, dtype='float32')
+            if n:
+                matrix = np.asarray(normalized_embeddings, dtype='float32')
+                k = min(self.k, n)
+                rows_per_block = max(1, max_block_bytes // (4 * n))
+                for start in range(0, n, rows_per_block):
+                    stop = min(start + rows_per_block, n)
+                    scores = matrix[start:stop] @ matrix.T
+                    # A document is not its own neighbor
+                    scores[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+                    best = top_k_rows(scores, k)
+                    neighbors[start:stop, :k] = ids[best]
+                    graph_scores[start:stop, :k] = np.take_along_axis(scores, best, axis=1)
+                neighbors[~np.isfinite(graph_scores)] = -1
+            with self._lock:
+                self._install(ids, neighbors, graph_scores)
+                for document_id, hits in self._pending:
+                    if hits is None:
+                        self._remove(document_id)
+                    else:
+                        self._update(document_id, hits)
+                replayed = len(self._pending)
+        finally:
+            with self._lock:
+                self._building = False
+                self._pending = []
+        logger.info(f"Built neighbor graph for {n} documents (k={self.k}, {replayed} changes replayed)")
+
+    def neighbors(self, document_id: int) -> Optional[List[Tuple[int, float]]]:
+        """(document_id, similarity) pairs best first, or None if the document is not in the graph"""
+        with self._lock:
+            row = self._row_of.get(document_id)
+            if row is None:
+                return None
+            return [
+                (int(neighbor), float(score))
+                for neighbor, score in zip(self._neighbors[row], self._scores[row])
+                if neighbor >= 0
+            ]
+
+    def _detach(self, document_id: int):
+        """Drop a document from every other document's list, shifting later entries up"""
+        rows, columns = np.nonzero(self._neighbors[:self._size] == document_id)
+        for row, column in zip(rows, columns):
+            self._neighbors[row, column:-1] = self._neighbors[row, column + 1:]
+            self._scores[row, column:-1] = self._scores[row, column + 1:]
+            self._neighbors[row, -1] = -1
+            self._scores[row, -1] = -np.inf
+
+    def _offer(self, row: int, document_id: int, score: float):
+        """Insert a neighbor into a row if it beats the row's current k-th entry"""
+        position = int(np.searchsorted(-self._scores[row], -score, side='right'))
+        if position >= self.k:
+            return
+        self._neighbors[row, position + 1:] = self._neighbors[row, position:-1]
+        self._scores[row, position + 1:] = self._scores[row, position:-1]
+        self._neighbors[row, position] = document_id
+        self._scores[row, position] = score
+
+    def update(self, document_id: int, hits: Sequence[Tuple[int, float]]):
+        """
+        Insert or refresh a document from its nearest documents
+
+        Args:
+            document_id: Document whose embedding was added or replaced
+            hits: (document_id, similarity) pairs from searching the index with its
+                embedding, best first; more hits than k lets more documents adopt it
+        """
+        hits = list(hits)
+        with self._lock:
+            if self._building:
+                self._pending.append((document_id, hits))
+            self._update(document_id, hits)
+
+    def _update(self, document_id: int, hits: Sequence[Tuple[int, float]]):
+        if document_id in self._row_of:
+            self._detach(document_id)
+            row = self._row_of[document_id]
+        else:
+            if self._free:
+                row = self._free.pop()
+            else:
+                self._grow(self._size + 1)
+                row = self._size
+                self._size += 1
+            self._ids[row] = document_id
+            self._row_of[document_id] = row
+
+        own = [(int(other), float(score)) for other, score in hits if other != document_id][:self.k]
+        self._neighbors[row] = -1
+        self._scores[row] = -np.inf
+        for column, (other, score) in enumerate(own):
+            self._neighbors[row, column] = other
+            self._scores[row, column] = score
+
+        for other, score in hits:
+            other_row = self._row_of.get(int(other))
+            if other_row is not None and other != document_id:
+                self._offer(other_row, document_id, float(score))
+
+    def remove(self, document_id: int) -> bool:
+        with self._lock:
+            if self._building:
+                self._pending.append((document_id, None))
+            return self._remove(document_id)
+
+    def _remove(self, document_id: int) -> bool:
+        row = self._row_of.pop(document_id, None)
+        if row is None:
+            return False
+        self._ids[row] = -1
+        self._neighbors[row] = -1
+        self._scores[row] = -np.inf
+        self._free.append(row)
+        self._detach(document_id)
+        return True
+
+    def save(self, directory: str, model_name: str, watermark: Optional[str] = None):
+        """
+        Persist the live rows as a sidecar next to the vector index
+
+        Args:
+            directory: Directory to write the graph files to
+            model_name: Embedding model the similarities came from
+            watermark: ISO timestamp of the newest change the graph reflects
+        """
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            live = np.flatnonzero(self._ids[:self._size] >= 0)
+            arrays = (
+                (IDS_FILE, self._ids[live]),
+                (NEIGHBORS_FILE, self._neighbors[live]),
+                (SCORES_FILE, self._scores[live]),
+            )
+        for name, array in arrays:
+            tmp_path = os.path.join(directory, f".{name}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, os.path.join(directory, name))
+        tmp_path = os.path.join(directory, f".{META_FILE}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({'model_name': model_name, 'k': self.k, 'count': len(live), 'watermark': watermark}, f)
+        os.replace(tmp_path, os.path.join(directory, META_FILE))
+        logger.info(f"Saved neighbor graph with {len(live)} documents to {directory}")
+
+    def restore(self, directory: str, model_name: str) -> Optional[Dict]:
+        """
+        Load a persisted graph built for this model and k
+
+        Returns:
+            The saved metadata if the graph was restored, None if it must be rebuilt
+        """
+        meta_path = os.path.join(directory, META_FILE)
+        if not os.path.isfile(meta_path):
+            return None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get('model_name') != model_name or meta.get('k') != self.k:
+                logger.info(f"Ignoring neighbor graph built for {meta.get('model_name')} (k={meta.get('k')})")
+                return None
+            ids = np.load(os.path.join(directory, IDS_FILE))
+            neighbors = np.load(os.path.join(directory, NEIGHBORS_FILE))
+            scores = np.load(os.path.join(directory, SCORES_FILE))
+            if not len(ids) == len(neighbors) == len(scores) == meta.get('count'):
+                logger.warning(f"Neighbor graph in {directory} is inconsistent, ignoring it")
+                return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not restore neighbor graph from {directory}: {str(e)}")
+            return None
+        n = len(ids)
+        with self._lock:
+            self._install(
+                np.asarray(ids, dtype='int64'),
+                np.asarray(neighbors, dtype='int64'),
+                np.asarray(scores, dtype='float32')
+            )
+        logger.info(f"Restored neighbor graph with {n} documents from {directory}")
+        return meta
@@ -0,0 +1,248 @@
+"""
+pgvector-backed approximate nearest-neighbor search
+Keeps embeddings in a vector column with an HNSW or IVFFlat index so only k rows leave the database
+
+The table and index are created on demand rather than through a Prisma migration,
+so deployments without the pgvector extension are unaffected. For local testing:
+    docker run -e POSTGRES_PASSWORD=postgres -p 5432:5432 pgvector/pgvector:pg16
+then run tests/test_pgvector_index.py against it (see its docstring).
+"""
+import hashlib
+import numpy as np
+from typing import Iterable, List, Optional, Sequence, Tuple
+import logging
+from prisma import Prisma
+
+logger = logging.getLogger(__name__)
+
+TABLE_NAME = "DocumentVector"
+IVFFLAT_LISTS = 100
+# pgvector's defaults: an HNSW scan returns at most ef_search rows, and 1000 is the largest allowed
+DEFAULT_EF_SEARCH = 40
+MAX_EF_SEARCH = 1000
+
+# Index access methods and their build parameters
+INDEX_METHODS = {
+    'hnsw': "hnsw ({column} vector_cosine_ops) WITH (m = 16, ef_construction = 64)",
+    'ivfflat': f"ivfflat ({{column}} vector_cosine_ops) WITH (lists = {IVFFLAT_LISTS})",
+}
+
+
+def to_vector_literal(embedding: np.ndarray) -> str:
+    """Format an embedding as a pgvector text literal"""
+    return "[" + ",".join(repr(float(x)) for x in np.asarray(embedding, dtype='float32').flatten()) + "]"
+
+
+class PgVectorIndex:
+    """
+    Vector index stored in Postgres via the pgvector extension
+
+    Every model shares one untyped vector column; a partial expression index per
+    model casts to that model's dimension, so several models can coexist. Searches
+    repeat the index predicate with the model name inlined, since the planner cannot
+    match a bound parameter against a partial index under a generic plan.
+
+    The ANN index applies filters after collecting its ef_search candidates, so a
+    selective filter would return fewer than k rows. Candidate sets up to
+    exact_filter_limit are scored exactly instead; larger ones widen the scan
+    (pgvector 0.8+ iterative scans, otherwise a higher ef_search / all IVF lists).
+    """
+
+    def __init__(
+        self,
+        prisma_client: Prisma,
+        model_name: str,
+        dimension: Optional[int],
+        index_method: str = 'hnsw',
+        exact_filter_limit: int = 2000,
+        filtered_ef_search: int = 200
+    ):
+        if index_method not in INDEX_METHODS:
+            raise ValueError(f"Unsupported pgvector index method: {index_method}")
+        self.prisma = prisma_client
+        self.model_name = model_name
+        # May be resolved later (from stored embeddings), but before ensure_schema or any query
+        self.dimension = int(dimension) if dimension is not None else None
+        self.index_method = index_method
+        self.exact_filter_limit = exact_filter_limit
+        self.filtered_ef_search = filtered_ef_search
+        # Set by ensure_schema from the installed extension version
+        self._iterative_scan = False
+
+    @property
+    def _typed_column(self) -> str:
+        return f'("embedding"::vector({self.dimension}))'
+
+    @property
+    def _model_predicate(self) -> str:
+        """The per-model index predicate, with the model name as a quoted literal"""
+        model_literal = self.model_name.replace("'", "''")
+        return f"\"model_name\" = '{model_literal}'"
+
+    @property
+    def _index_name(self) -> str:
+        digest = hashlib.sha1(f"{self.model_name}:{self.dimension}".encode()).hexdigest()[:12]
+        return f"{TABLE_NAME}_{self.index_method}_{digest}_idx"
+
+    async def ensure_schema(self):
+        """Create the extension, table and per-model ANN index if missing"""
+        try:
+            await self.prisma.execute_raw('CREATE EXTENSION IF NOT EXISTS vector')
+            await self.prisma.execute_raw(
+                f'CREATE TABLE IF NOT EXISTS "{TABLE_NAME}" ('
+                f'"document_id" INTEGER NOT NULL REFERENCES "Document"("id") ON DELETE CASCADE, '
+                f'"model_name" TEXT NOT NULL, '
+                f'"embedding" vector NOT NULL, '
+                f'PRIMARY KEY ("document_id", "model_name"))'
+            )
+            method = INDEX_METHODS[self.index_method].format(column=self._typed_column)
+            await self.prisma.execute_raw(
+                f'CREATE INDEX IF NOT EXISTS "{self._index_name}" ON "{TABLE_NAME}" '
+                f'USING {method} WHERE {self._model_predicate}'
+            )
+            rows = await self.prisma.query_raw("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+            version = tuple(int(part) for part in rows[0]['extversion'].split('.')[:2]) if rows else (0, 0)
+            self._iterative_scan = version >= (0, 8)
+            logger.info(f"pgvector schema ready ({self.index_method} index {self._index_name})")
+        except Exception as e:
+            logger.error(f"Error preparing pgvector schema: {str(e)}")
+            raise
+
+    async def count(self) -> int:
+        rows = await self.prisma.query_raw(
+            f'SELECT COUNT(*)::int AS n FROM "{TABLE_NAME}" WHERE "model_name" = $1',
+            self.model_name
+        )
+        return int(rows[0]['n']) if rows else 0
+
+    async def indexed_document_ids(self) -> List[int]:
+        rows = await self.prisma.query_raw(
+            f'SELECT "document_id" FROM "{TABLE_NAME}" WHERE "model_name" = $1',
+            self.model_name
+        )
+        return [int(row['document_id']) for row in rows]
+
+    async def upsert_many(self, document_ids: Sequence[int], embeddings: np.ndarray, batch_size: int = 200):
+        """
+        Insert or replace vectors for several documents
+
+        Args:
+            document_ids: Document ids, one per embedding row
+            embeddings: 2D array of embeddings (n, dimension)
+            batch_size: Rows per INSERT statement
+        """
+        embeddings = np.asarray(embeddings, dtype='float32').reshape(len(document_ids), -1)
+        if embeddings.shape[0] and embeddings.shape[1] != self.dimension:
+            raise ValueError(
+                f"Embedding dimension {embeddings.shape[1]} does not match pgvector dimension {self.dimension}"
+            )
+
+        for start in range(0, len(document_ids), batch_size):
+            batch_ids = document_ids[start:start + batch_size]
+            values = []
+            params = []
+            for offset, document_id in enumerate(batch_ids):
+                base = len(params)
+                values.append(f"(${base + 1}::int, ${base + 2}, ${base + 3}::vector)")
+                params.extend([int(document_id), self.model_name, to_vector_literal(embeddings[start + offset])])
+            await self.prisma.execute_raw(
+                f'INSERT INTO "{TABLE_NAME}" ("document_id", "model_name", "embedding") '
+                f'VALUES {", ".join(values)} '
+                f'ON CONFLICT ("document_id", "model_name") DO UPDATE SET "embedding" = EXCLUDED."embedding"',
+                *params
+            )
+
+    async def upsert(self, document_id: int, embedding: np.ndarray):
+        """Insert or replace the vector for one document"""
+        await self.upsert_many([document_id], np.asarray(embedding).reshape(1, -1))
+
+    async def remove(self, document_id: int):
+        await self.prisma.execute_raw(
+            f'DELETE FROM "{TABLE_NAME}" WHERE "document_id" = $1 AND "model_name" = $2',
+            int(document_id), self.model_name
+        )
+
+    async def search(
+        self,
+        query_embedding: np.ndarray,
+        k: int = 5,
+        min_similarity: float = 0.0,
+        candidate_ids: Optional[Iterable[int]] = None,
+        exclude_ids: Optional[Iterable[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Find the k nearest documents by cosine distance inside Postgres
+
+        Args:
+            query_embedding: Query vector
+            k: Number of results to return
+            min_similarity: Minimum cosine similarity threshold
+            candidate_ids: Restrict the search to these documents (e.g. a metadata filter)
+            exclude_ids: Documents that may not be selected (e.g. the query document itself)
+
+        Returns:
+            List of (document_id, similarity) pairs, best first
+        """
+        query = to_vector_literal(query_embedding)
+        excluded = {int(i) for i in exclude_ids} if exclude_ids is not None else set()
+        distance = f'{self._typed_column} <=> $1::vector({self.dimension})'
+        if candidate_ids is not None:
+            ids = sorted({int(i) for i in candidate_ids} - excluded)
+            if not ids:
+                return []
+            id_array = "'{" + ",".join(str(i) for i in ids) + "}'::int[]"
+            if len(ids) <= self.exact_filter_limit:
+                # Materializing the candidates keeps the planner off the ANN index, whose
+                # ef_search candidates would mostly be filtered out
+                rows = await self.prisma.query_raw(
+                    f'WITH candidates AS MATERIALIZED ('
+                    f'SELECT "document_id", {distance} AS distance FROM "{TABLE_NAME}" '
+                    f'WHERE {self._model_predicate} AND "document_id" = ANY({id_array})) '
+                    f'SELECT "document_id", 1 - distance AS similarity FROM candidates '
+                    f'ORDER BY distance LIMIT $2',
+                    query, int(k)
+                )
+            else:
+                rows = await self._ann_query(distance, f'AND "document_id" = ANY({id_array}) ', query, int(k), True)
+        else:
+            # A few exclusions (usually the query document) are cheaper to over-fetch than to filter
+            limit = int(k) + len(excluded)
+            rows = await self._ann_query(distance, '', query, limit, limit > DEFAULT_EF_SEARCH)
+
+        results = []
+        # Iterative scans may return rows slightly out of order
+        for row in sorted(rows, key=lambda row: -float(row['similarity'])):
+            document_id = int(row['document_id'])
+            if document_id in excluded:
+                continue
+            similarity = float(row['similarity'])
+            if similarity < min_similarity or len(results) == k:
+                break
+            results.append((document_id, similarity))
+        return results
+
+    async def _ann_query(self, distance: str, clause: str, query: str, limit: int, widen: bool) -> List[dict]:
+        """
+        Order by distance through the ANN index
+
+        Args:
+            widen: Let the scan go past the default ef_search (filtered or large-limit
+                queries), inside a transaction so the settings stay local to this query
+        """
+        sql = (
+            f'SELECT "document_id", 1 - ({distance}) AS similarity '
+            f'FROM "{TABLE_NAME}" WHERE {self._model_predicate} {clause}'
+            f'ORDER BY {distance} LIMIT $2'
+        )
+        if not widen:
+            return await self.prisma.query_raw(sql, query, limit)
+        if self.index_method == 'hnsw':
+            settings = [f'SET LOCAL hnsw.ef_search = {min(max(self.filtered_ef_search, limit), MAX_EF_SEARCH)}']
+            if self._iterative_scan:
+                settings.append("SET LOCAL hnsw.iterative_scan = relaxed_order")
+        else:
+            settings = [f'SET LOCAL ivfflat.probes = {IVFFLAT_LISTS}']
+        async with self.prisma.tx() as tx:
+            for setting in settings:
+                await tx.execute_raw(setting)
+            return await tx.query_raw(sql, query, limit)
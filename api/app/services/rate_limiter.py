@@ -0,0 +1,231 @@
+"""
+Client-side flow control for remote embedding APIs
+An adaptive token bucket that backs off on 429s and a circuit breaker that fails fast while the endpoint is down
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Set for bulk work (ingest jobs); inherited by the tasks and threads it starts
+_background = contextvars.ContextVar('embedding_background_priority', default=False)
+
+
+@contextmanager
+def background_priority():
+    """Mark embedding calls made in this context as yielding to interactive traffic"""
+    token = _background.set(True)
+    try:
+        yield
+    finally:
+        _background.reset(token)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint the circuit breaker considers unhealthy"""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose refill rate adapts to the server (AIMD)
+
+    Every request takes a token. A 429 halves the rate and, with Retry-After, pauses
+    all callers until the server's deadline; each success adds increase_step back,
+    so bulk work converges on the highest rate the endpoint sustains. One instance
+    is shared by the sync and async paths of a process.
+
+    Calls made under background_priority() never dip into the last
+    interactive_reserve tokens or go into debt: they wait until the bucket has
+    spare capacity, so a bulk job cannot queue ahead of search queries.
+    """
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: int = 10,
+        min_rate: float = 0.5,
+        max_rate: float = 50.0,
+        increase_step: float = 0.5,
+        interactive_reserve: float = 2.0
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.interactive_reserve = min(interactive_reserve, max(burst - 1, 0))
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self._counters = {
+            'acquired': 0, 'throttled': 0, 'waited': 0, 'wait_seconds': 0.0,
+            'background_acquired': 0, 'background_wait_seconds': 0.0
+        }
+
+    def _refill(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return now
+
+    def _reserve(self) -> float:
+        """Take a token (possibly going into debt) and return how long to wait for it"""
+        with self._lock:
+            now = self._refill()
+            self._tokens -= 1.0
+            wait = max(-self._tokens / self.rate if self._tokens < 0 else 0.0, self._blocked_until - now)
+            self._counters['acquired'] += 1
+            if wait > 0:
+                self._counters['waited'] += 1
+                self._counters['wait_seconds'] += wait
+            return wait
+
+    def _try_reserve_background(self) -> float:
+        """Take a token only if one is spare beyond the interactive reserve; otherwise how long to wait before retrying"""
+        with self._lock:
+            now = self._refill()
+            needed = 1.0 + self.interactive_reserve
+            wait = max((needed - self._tokens) / self.rate, self._blocked_until - now)
+            if wait <= 0:
+                self._tokens -= 1.0
+                self._counters['background_acquired'] += 1
+                return 0.0
+            self._counters['background_wait_seconds'] += wait
+            return wait
+
+    def acquire(self):
+        if _background.get():
+            wait = self._try_reserve_background()
+            while wait > 0:
+                time.sleep(wait)
+                wait = self._try_reserve_background()
+            return
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self):
+        if _background.get():
+            wait = self._try_reserve_background()
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self._try_reserve_background()
+            return
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_throttled(self, retry_after: Optional[float] = None):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+            self._counters['throttled'] += 1
+        logger.warning(f"Embedding API throttled, rate lowered to {self.rate:.2f}/s"
+                       + (f", pausing {retry_after:.1f}s" if retry_after else ""))
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats['rate_per_second'] = self.rate
+            stats['blocked_for_seconds'] = max(0.0, self._blocked_until - time.monotonic())
+        return stats
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after failure_threshold consecutive failures; open -> half-open
+    after reset_timeout, when a single trial request decides whether to close again.
+    A trial that never reports back (e.g. a cancelled caller) expires after reset_timeout.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started = 0.0
+        self._lock = threading.Lock()
+        self._counters = {'opened': 0, 'rejected': 0}
+
+    def allow(self) -> bool:
+        """Whether a request may go out now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and (
+                not self._trial_in_flight or now - self._trial_started >= self.reset_timeout
+            ):
+                self._trial_in_flight = True
+                self._trial_started = now
+                return True
+            self._counters['rejected'] += 1
+            return False
+
+    def check(self):
+        if not self.allow():
+            raise CircuitOpenError("Embedding API circuit is open, failing fast")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Embedding API circuit closed")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self._counters['opened'] += 1
+                    logger.warning(f"Embedding API circuit opened after {self._failures} consecutive failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats['state'] = self.state
+            stats['consecutive_failures'] = self._failures
+        return stats
@@ -0,0 +1,190 @@
+"""
+Blue/green re-embedding: build a new model's index next to the serving one, compare, then switch
+The serving store keeps answering searches until the shadow store replaces it in a single step
+"""
+import asyncio
+import numpy as np
+from typing import Callable, Dict, List, Optional
+import logging
+
+from .embedding_service import create_embedding_service, set_embedding_service
+from .job_service import Job
+from .vector_store_service import NeonVectorStore, set_vector_store
+from ..utils.config import config
+
+logger = logging.getLogger(__name__)
+
+
+def _excerpt(text: str, words: int) -> str:
+    """Leading words of a summary, used as a query whose right answer is that document"""
+    return " ".join(str(text).split()[:words])
+
+
+def _latency_summary(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {'p50_ms': None, 'p95_ms': None}
+    return {
+        'p50_ms': round(float(np.percentile(samples, 50)), 2),
+        'p95_ms': round(float(np.percentile(samples, 95)), 2),
+    }
+
+
+async def _indexed_documents(store: NeonVectorStore) -> int:
+    if store.pg_index is not None:
+        return len(await store.pg_index.indexed_document_ids())
+    return len(store.index)
+
+
+async def compare_models(
+    current: NeonVectorStore,
+    candidate: NeonVectorStore,
+    sample_size: int,
+    k: int
+) -> Dict:
+    """
+    Measure recall and latency of two stores on the same sample of queries
+
+    Each query is the opening words of a sampled document's summary; recall@k is the
+    share of queries whose source document comes back in the top k. Overlap@k is the
+    share of top-k results the two models have in common.
+
+    Returns:
+        Per-model recall and embedding/search latency percentiles, plus overlap
+    """
+    rows = await current.prisma.query_raw(
+        'SELECT "id", "summary" FROM "Document" WHERE "summary" IS NOT NULL ORDER BY random() LIMIT $1',
+        sample_size
+    )
+    results = {}
+    rankings = {}
+    for name, store in (('current', current), ('candidate', candidate)):
+        found = 0
+        embed_ms, search_ms = [], []
+        rankings[name] = []
+        for row in rows:
+            ranked, embed_time, search_time = await store.rank_query(
+                _excerpt(row['summary'], config.REINDEX_QUERY_WORDS), k
+            )
+            found += int(row['id']) in ranked
+            embed_ms.append(embed_time)
+            search_ms.append(search_time)
+            rankings[name].append(set(ranked))
+        results[name] = {
+            'model_name': store.model_name,
+            'dimension': store.dimension,
+            'documents': await _indexed_documents(store),
+            f'recall_at_{k}': round(found / len(rows), 4) if rows else None,
+            'embed_latency': _latency_summary(embed_ms),
+            'search_latency': _latency_summary(search_ms),
+        }
+    overlaps = [len(a & b) / k for a, b in zip(rankings['current'], rankings['candidate'])]
+    results[f'overlap_at_{k}'] = round(float(np.mean(overlaps)), 4) if overlaps else None
+    results['queries'] = len(rows)
+    return results
+
+
+async def _catch_up(store: NeonVectorStore, job: Optional[Job], max_passes: int = 3):
+    """Re-embed documents written through the serving model while the shadow was built"""
+    for _ in range(max_passes):
+        stats = await store.backfill_embeddings(job=job)
+        if not stats['pending']:
+            break
+    await store.refresh_index()
+
+
+async def reindex_to_model(
+    current: NeonVectorStore,
+    model_name: str,
+    switch: Callable[[NeonVectorStore], None],
+    job: Optional[Job] = None,
+    backend: Optional[str] = None,
+    sample_size: Optional[int] = None,
+    k: Optional[int] = None,
+    force: bool = False
+) -> Dict:
+    """
+    Re-embed the corpus with another model and switch to it if it is not worse
+
+    1. Backfill the new model's embeddings (rows keyed by model_name, so the serving
+       model's rows and index are untouched) and load them into a shadow store that
+       does not touch the on-disk index files.
+    2. Compare recall and latency of both stores on a sample of queries.
+    3. If the candidate keeps recall within REINDEX_MAX_RECALL_DROP and covers as many
+       documents (or force is set): catch up on writes made meanwhile, record the new
+       serving model, and hand the shadow store to `switch`, which must swap it in
+       without awaiting. Requests already running finish on the old store.
+
+    Args:
+        current: The serving vector store
+        model_name: Model to switch to
+        switch: Installs the new store wherever the application holds the serving one
+        job: Background job to report progress to
+        backend: Embedding backend for the new model (defaults to EMBEDDING_BACKEND)
+        sample_size: Evaluation queries (defaults to REINDEX_SAMPLE_SIZE)
+        k: Results per evaluation query (defaults to REINDEX_EVAL_K)
+        force: Switch even if the candidate measured worse
+
+    Returns:
+        Report with the backfill statistics, the comparison and whether models were switched
+    """
+    sample_size = sample_size or config.REINDEX_SAMPLE_SIZE
+    k = k or config.REINDEX_EVAL_K
+    report = {'from_model': current.model_name, 'to_model': model_name, 'switched': False}
+
+    def phase(name: str):
+        logger.info(f"Reindex to {model_name}: {name}")
+        if job is not None:
+            job.report({'phase': name})
+
+    embedding_service = create_embedding_service(model_name, backend)
+    candidate = NeonVectorStore(current.prisma, embedding_service, persist=False)
+    report['to_model'] = candidate.model_name
+    try:
+        if candidate.model_name == current.model_name:
+            raise ValueError(f"{candidate.model_name} is already the serving model")
+        phase('backfill')
+        report['backfill'] = {
+            key: value for key, value in (await candidate.backfill_embeddings(job=job)).items() if key != 'errors'
+        }
+        phase('loading')
+        await candidate.load_index()
+
+        phase('evaluating')
+        comparison = await compare_models(current, candidate, sample_size, k)
+        report['comparison'] = comparison
+        recall_key = f'recall_at_{k}'
+        current_recall = comparison['current'][recall_key] or 0.0
+        candidate_recall = comparison['candidate'][recall_key] or 0.0
+        accepted = (
+            candidate_recall >= current_recall - config.REINDEX_MAX_RECALL_DROP
+            and comparison['candidate']['documents'] >= comparison['current']['documents']
+        )
+        report['accepted'] = accepted
+        if not accepted and not force:
+            logger.warning(f"Not switching to {candidate.model_name}: {comparison}")
+            phase('rejected')
+            await embedding_service.aclose()
+            return report
+
+        phase('switching')
+        await _catch_up(candidate, job)
+        await candidate.save_serving_model()
+        # From here on nothing awaits until the new store is installed everywhere
+        candidate.persist = True
+        switch(candidate)
+        set_vector_store(candidate)
+        set_embedding_service(embedding_service)
+        report['switched'] = True
+        logger.info(f"Switched serving model from {current.model_name} to {candidate.model_name}")
+    except BaseException:
+        if not report['switched']:
+            await embedding_service.aclose()
+        raise
+
+    await current.stop_refresher()
+    candidate.start_refresher()
+    # Writes that reached the old store during the switch
+    await candidate.backfill_embeddings()
+    await asyncio.to_thread(candidate.save_index)
+    phase('done')
+    return report
@@ -0,0 +1,643 @@
+"""
+In-memory vector index for corpus embeddings
+Keeps a resident, pre-normalized float32 matrix so a query is one matrix-vector product
+"""
+import heapq
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize vectors row-wise, leaving zero rows as zeros"""
+    vectors = np.asarray(vectors, dtype='float32')
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return indices of the k highest scores, ordered best first"""
+    if k <= 0 or scores.size == 0:
+        return np.empty(0, dtype='int64')
+    if k < scores.size:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.size)
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k largest values in each row of a 2-D score matrix, best first"""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype='int64')
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+class Int8Quantizer:
+    """
+    Per-dimension scalar quantizer mapping float32 components to int8 codes
+
+    x ~= (code + 128) * scale + offset, with offset/scale fitted to each dimension's range.
+    """
+
+    def __init__(self, dimension: int):
+        # Normalized vectors have components in [-1, 1]; used until fit() sees real data
+        self.offset = np.full(dimension, -1.0, dtype='float32')
+        self.scale = np.full(dimension, 2.0 / 255, dtype='float32')
+
+    def fit(self, vectors: np.ndarray):
+        if vectors.shape[0] == 0:
+            return
+        low = vectors.min(axis=0).astype('float32')
+        high = vectors.max(axis=0).astype('float32')
+        self.offset = low
+        self.scale = np.maximum(high - low, 1e-6) / 255
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((vectors - self.offset) / self.scale) - 128
+        return np.clip(codes, -128, 127).astype('int8')
+
+    def approximate_scores(self, codes: np.ndarray, query: np.ndarray, block: int = 65536) -> np.ndarray:
+        """
+        Approximate dot products between a query and quantized rows
+
+        q.x ~= (q * scale).code + 128 * sum(q * scale) + q.offset. Rows are decoded in
+        blocks so the float temporary stays bounded.
+        """
+        weights = query * self.scale
+        bias = 128 * float(weights.sum()) + float(query @ self.offset)
+        scores = np.empty(codes.shape[0], dtype='float32')
+        for start in range(0, codes.shape[0], block):
+            scores[start:start + block] = codes[start:start + block].astype('float32') @ weights
+        scores += bias
+        return scores
+
+
+class ExactVectorIndex:
+    """
+    Exact cosine similarity index over a resident embedding matrix
+
+    Rows are stored pre-normalized, so cosine similarity reduces to a dot product.
+    A parallel array maps each row back to its Document id.
+
+    The index has two segments: an optional read-only base (typically a memory-mapped
+    snapshot shared between worker processes) and a private, growable delta. Changes to
+    base rows tombstone them and append to the delta, so the shared pages are never written.
+
+    With quantize=True an int8 copy of every row is kept alongside the floats. Searches
+    scan the int8 codes, then re-rank the best rerank_candidates rows with exact float32
+    cosine, so the returned top k matches the exact ordering unless a true neighbor falls
+    outside the candidate pool.
+
+    With shards > 1, full scans of large indexes are split into contiguous row ranges
+    scored on a thread pool; the matrix products release the GIL, so the shards run on
+    separate cores. Each shard selects its own top k and the sorted lists are merged
+    with a heap, so results are identical to the single-threaded scan.
+    """
+
+    def __init__(
+        self,
+        dimension: Optional[int] = None,
+        initial_capacity: int = 1024,
+        quantize: bool = False,
+        rerank_candidates: int = 256,
+        shards: int = 1,
+        min_shard_rows: int = 16384
+    ):
+        self.dimension = dimension
+        self._initial_capacity = initial_capacity
+        self.quantize = quantize
+        self.rerank_candidates = rerank_candidates
+        self.shards = max(1, shards)
+        self.min_shard_rows = min_shard_rows
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._quantizer: Optional[Int8Quantizer] = None
+        if quantize and dimension is not None:
+            self._quantizer = Int8Quantizer(dimension)
+        self._reset_base()
+        self._reset_delta()
+
+    def _reset_base(self):
+        self._base = np.zeros((0, self.dimension or 0), dtype='float32')
+        self._base_ids = np.zeros(0, dtype='int64')
+        self._base_alive = np.zeros(0, dtype=bool)
+        self._base_codes = np.zeros((0, self.dimension or 0), dtype='int8')
+        self._base_row_of: Dict[int, int] = {}
+
+    def _reset_delta(self):
+        self._capacity = 0
+        self._size = 0
+        self._matrix = np.zeros((0, self.dimension or 0), dtype='float32')
+        self._ids = np.zeros(0, dtype='int64')
+        self._alive = np.zeros(0, dtype=bool)
+        self._codes = np.zeros((0, self.dimension or 0), dtype='int8')
+        self._row_of: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._base_row_of) + len(self._row_of)
+
+    def __contains__(self, document_id: int) -> bool:
+        return document_id in self._row_of or document_id in self._base_row_of
+
+    @property
+    def _row_ids(self) -> np.ndarray:
+        """Document id of every row (base then delta), including dead rows"""
+        if not len(self._base_ids):
+            return self._ids[:self._size]
+        return np.concatenate([self._base_ids, self._ids[:self._size]])
+
+    @property
+    def _row_alive(self) -> np.ndarray:
+        if not len(self._base_alive):
+            return self._alive[:self._size]
+        return np.concatenate([self._base_alive, self._alive[:self._size]])
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Document ids of the live rows, in row order"""
+        return self._row_ids[self._row_alive]
+
+    def _check_dimension(self, dimension: int):
+        if self.dimension is None:
+            self.dimension = dimension
+            if self.quantize and self._quantizer is None:
+                self._quantizer = Int8Quantizer(dimension)
+        elif dimension != self.dimension:
+            raise ValueError(
+                f"Embedding dimension {dimension} does not match index dimension {self.dimension}"
+            )
+
+    def _grow(self, min_capacity: int):
+        """Grow the delta arrays geometrically so appends stay amortized O(1)"""
+        if min_capacity <= self._capacity:
+            return
+        capacity = max(min_capacity, self._capacity * 2, self._initial_capacity)
+        matrix = np.zeros((capacity, self.dimension), dtype='float32')
+        ids = np.full(capacity, -1, dtype='int64')
+        alive = np.zeros(capacity, dtype=bool)
+        if self._size:
+            matrix[:self._size] = self._matrix[:self._size]
+            ids[:self._size] = self._ids[:self._size]
+            alive[:self._size] = self._alive[:self._size]
+        self._matrix, self._ids, self._alive = matrix, ids, alive
+        if self.quantize:
+            codes = np.zeros((capacity, self.dimension), dtype='int8')
+            if self._size:
+                codes[:self._size] = self._codes[:self._size]
+            self._codes = codes
+        self._capacity = capacity
+
+    def load(self, document_ids: Sequence[int], embeddings: np.ndarray):
+        """
+        Replace the index contents in bulk
+
+        Args:
+            document_ids: Document ids, one per embedding row
+            embeddings: 2D array of embeddings (n, dimension)
+        """
+        embeddings = np.asarray(embeddings, dtype='float32')
+        if embeddings.ndim == 1:
+            embeddings = embeddings.reshape(len(document_ids), -1)
+        if len(document_ids) != embeddings.shape[0]:
+            raise ValueError("document_ids and embeddings must have the same length")
+
+        self._reset_base()
+        self._reset_delta()
+        if embeddings.shape[0] == 0:
+            return
+        self._check_dimension(embeddings.shape[1])
+        self._grow(embeddings.shape[0])
+
+        n = embeddings.shape[0]
+        self._matrix[:n] = normalize_rows(embeddings)
+        if self.quantize:
+            self._quantizer.fit(self._matrix[:n])
+            self._codes[:n] = self._quantizer.encode(self._matrix[:n])
+        self._ids[:n] = np.asarray(document_ids, dtype='int64')
+        self._alive[:n] = True
+        self._size = n
+        self._row_of = {int(doc_id): row for row, doc_id in enumerate(self._ids[:n])}
+        logger.info(f"Loaded {n} embeddings into vector index (dimension {self.dimension})")
+
+    def attach_base(self, document_ids: np.ndarray, normalized_embeddings: np.ndarray):
+        """
+        Use an existing normalized matrix, such as a memory-mapped snapshot, as the base segment
+
+        The matrix is never written to, so a read-only mapping stays shared between processes.
+
+        Args:
+            document_ids: Document ids, one per row
+            normalized_embeddings: 2D array of L2-normalized float32 rows
+        """
+        if len(document_ids) != normalized_embeddings.shape[0]:
+            raise ValueError("document_ids and embeddings must have the same length")
+        self._reset_delta()
+        self._reset_base()
+        if normalized_embeddings.shape[0]:
+            self._check_dimension(normalized_embeddings.shape[1])
+        self._base = normalized_embeddings
+        self._base_ids = np.asarray(document_ids, dtype='int64')
+        self._base_alive = np.ones(len(self._base_ids), dtype=bool)
+        self._base_row_of = {int(doc_id): row for row, doc_id in enumerate(self._base_ids)}
+        if self.quantize and len(self._base_ids):
+            # Codes are private to the process; at a quarter of the float size
+            self._quantizer.fit(self._base)
+            self._base_codes = self._quantizer.encode(self._base)
+        logger.info(f"Attached {len(self._base_ids)} base embeddings to vector index")
+
+    def export(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (document_ids, normalized matrix) for all live rows"""
+        base_rows = self._base[self._base_alive] if len(self._base_ids) else self._base
+        delta_rows = self._matrix[:self._size][self._alive[:self._size]]
+        if self.dimension is None:
+            return np.zeros(0, dtype='int64'), np.zeros((0, 0), dtype='float32')
+        matrix = np.concatenate([base_rows.reshape(-1, self.dimension), delta_rows])
+        return self.ids, np.ascontiguousarray(matrix, dtype='float32')
+
+    def upsert(self, document_id: int, embedding: np.ndarray):
+        """Insert or replace the embedding for a document"""
+        vector = normalize_rows(np.asarray(embedding, dtype='float32').flatten())[0]
+        self._check_dimension(vector.shape[0])
+
+        base_row = self._base_row_of.pop(document_id, None)
+        if base_row is not None:
+            self._base_alive[base_row] = False
+
+        row = self._row_of.get(document_id)
+        if row is None:
+            self._grow(self._size + 1)
+            row = self._size
+            self._size += 1
+            self._ids[row] = document_id
+            self._alive[row] = True
+            self._row_of[document_id] = row
+        self._matrix[row] = vector
+        if self.quantize:
+            self._codes[row] = self._quantizer.encode(vector)
+
+    def remove(self, document_id: int) -> bool:
+        """Drop a document from the index; returns False if it was not indexed"""
+        base_row = self._base_row_of.pop(document_id, None)
+        if base_row is not None:
+            self._base_alive[base_row] = False
+            return True
+        row = self._row_of.pop(document_id, None)
+        if row is None:
+            return False
+        self._alive[row] = False
+        # Compact once tombstones dominate so scans don't pay for dead rows
+        if self._size > self._initial_capacity and len(self._row_of) < self._size // 2:
+            self._compact()
+        return True
+
+    def _compact(self):
+        live = np.flatnonzero(self._alive[:self._size])
+        ids = self._ids[live].copy()
+        matrix = self._matrix[live].copy()
+        n = len(live)
+        self._capacity = 0
+        self._size = 0
+        self._grow(n)
+        self._matrix[:n] = matrix
+        if self.quantize:
+            self._codes[:n] = self._quantizer.encode(matrix)
+        self._ids[:n] = ids
+        self._alive[:n] = True
+        self._size = n
+        self._row_of = {int(doc_id): row for row, doc_id in enumerate(ids)}
+
+    def get_vector(self, document_id: int) -> Optional[np.ndarray]:
+        """Return the normalized stored vector for a document, if indexed"""
+        row = self._row_of.get(document_id)
+        if row is not None:
+            return self._matrix[row]
+        base_row = self._base_row_of.get(document_id)
+        if base_row is not None:
+            return np.asarray(self._base[base_row])
+        return None
+
+    def _mask_dead(self, scores: np.ndarray) -> np.ndarray:
+        if len(self) != scores.shape[0]:
+            scores[~self._row_alive] = -np.inf
+        return scores
+
+    def _rows(self, rows: np.ndarray) -> np.ndarray:
+        """Gather float rows by global row number (base rows first, then delta)"""
+        n_base = len(self._base_ids)
+        out = np.empty((len(rows), self.dimension), dtype='float32')
+        in_base = rows < n_base
+        if in_base.any():
+            out[in_base] = self._base[rows[in_base]]
+        if (~in_base).any():
+            out[~in_base] = self._matrix[rows[~in_base] - n_base]
+        return out
+
+    def scores(self, query_embedding: np.ndarray) -> np.ndarray:
+        """Cosine similarity of the query against every row (dead rows score -inf)"""
+        query = normalize_rows(query_embedding)[0]
+        self._check_dimension(query.shape[0])
+        scores = self._matrix[:self._size] @ query if self._size else np.zeros(0, dtype='float32')
+        if len(self._base_ids):
+            scores = np.concatenate([self._base @ query, scores])
+        return self._mask_dead(scores)
+
+    def approximate_scores(self, query_embedding: np.ndarray) -> np.ndarray:
+        """Scores from the int8 codes (dead rows score -inf)"""
+        query = normalize_rows(query_embedding)[0]
+        self._check_dimension(query.shape[0])
+        scores = self._quantizer.approximate_scores(self._codes[:self._size], query)
+        if len(self._base_ids):
+            scores = np.concatenate([self._quantizer.approximate_scores(self._base_codes, query), scores])
+        return self._mask_dead(scores)
+
+    def _shard_count(self) -> int:
+        """Shards worth using for a full scan; small indexes are not worth the thread hand-off"""
+        n_rows = len(self._base_ids) + self._size
+        return min(self.shards, n_rows // max(self.min_shard_rows, 1))
+
+    def _shard_ranges(self, count: int) -> List[Tuple[int, int]]:
+        """Split the rows into about count contiguous (start, stop) ranges, none crossing from base into delta"""
+        n_base = len(self._base_ids)
+        n_rows = n_base + self._size
+        per_shard = -(-n_rows // count)
+        ranges = []
+        for segment_start, segment_stop in ((0, n_base), (n_base, n_rows)):
+            for start in range(segment_start, segment_stop, per_shard):
+                ranges.append((start, min(start + per_shard, segment_stop)))
+        return ranges
+
+    def _scan_shard(
+        self,
+        start: int,
+        stop: int,
+        query: np.ndarray,
+        k: int,
+        approximate: bool,
+        excluded_rows: Optional[np.ndarray]
+    ) -> List[Tuple[float, int]]:
+        """Top k (score, global row) pairs of one row range, best first"""
+        n_base = len(self._base_ids)
+        if start < n_base:
+            matrix, codes, alive = self._base, self._base_codes, self._base_alive
+        else:
+            matrix, codes, alive = self._matrix, self._codes, self._alive
+            start, stop = start - n_base, stop - n_base
+        if approximate:
+            scores = self._quantizer.approximate_scores(codes[start:stop], query)
+        else:
+            scores = matrix[start:stop] @ query
+        live = alive[start:stop]
+        if not live.all():
+            scores[~live] = -np.inf
+        offset = start + (n_base if matrix is self._matrix else 0)
+        if excluded_rows is not None and len(excluded_rows):
+            local = excluded_rows[(excluded_rows >= offset) & (excluded_rows < offset + len(scores))] - offset
+            scores[local] = -np.inf
+        best = top_k_indices(scores, min(k, len(scores)))
+        return list(zip(scores[best].tolist(), (best + offset).tolist()))
+
+    def _sharded_top_k(
+        self,
+        query: np.ndarray,
+        k: int,
+        shard_count: int,
+        approximate: bool = False,
+        excluded_rows: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Best k rows over all shards scored in parallel, merged with a heap"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.shards, thread_name_prefix="vector-shard")
+        futures = [
+            self._executor.submit(self._scan_shard, start, stop, query, k, approximate, excluded_rows)
+            for start, stop in self._shard_ranges(shard_count)
+        ]
+        per_shard = [future.result() for future in futures]
+        best = list(islice(heapq.merge(*per_shard, key=lambda hit: -hit[0]), k))
+        rows = np.fromiter((row for _, row in best), dtype='int64', count=len(best))
+        scores = np.fromiter((score for score, _ in best), dtype='float32', count=len(best))
+        return rows, scores
+
+    def _ranked_rows(
+        self,
+        query_embedding: np.ndarray,
+        k: int,
+        excluded_rows: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Best k rows and their exact scores, best first, never selecting excluded_rows"""
+        shard_count = self._shard_count()
+        if self.quantize and len(self) > max(k, self.rerank_candidates):
+            query = normalize_rows(query_embedding)[0]
+            if shard_count > 1:
+                self._check_dimension(query.shape[0])
+                candidates, approx = self._sharded_top_k(
+                    query, max(k, self.rerank_candidates), shard_count, approximate=True, excluded_rows=excluded_rows
+                )
+            else:
+                approx = self.approximate_scores(query_embedding)
+                if excluded_rows is not None:
+                    approx[excluded_rows] = -np.inf
+                candidates = top_k_indices(approx, max(k, self.rerank_candidates))
+                approx = approx[candidates]
+            # A pool wider than the live rows picks up dead and excluded rows; don't re-score them
+            candidates = candidates[np.isfinite(approx)]
+            exact = self._rows(candidates) @ query
+            order = top_k_indices(exact, k)
+            return candidates[order], exact[order]
+        if shard_count > 1:
+            query = normalize_rows(query_embedding)[0]
+            self._check_dimension(query.shape[0])
+            return self._sharded_top_k(query, k, shard_count, excluded_rows=excluded_rows)
+        scores = self.scores(query_embedding)
+        if excluded_rows is not None:
+            scores[excluded_rows] = -np.inf
+        rows = top_k_indices(scores, k)
+        return rows, scores[rows]
+
+    def _rows_for_ids(self, document_ids: Iterable[int]) -> np.ndarray:
+        """Global row numbers of the indexed documents among document_ids"""
+        n_base = len(self._base_ids)
+        rows = []
+        for document_id in document_ids:
+            row = self._row_of.get(document_id)
+            if row is not None:
+                rows.append(n_base + row)
+                continue
+            row = self._base_row_of.get(document_id)
+            if row is not None:
+                rows.append(row)
+        return np.asarray(rows, dtype='int64')
+
+    def _ranked_candidate_rows(
+        self,
+        query_embedding: np.ndarray,
+        k: int,
+        candidate_ids: Iterable[int]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Best k rows restricted to the candidate documents, scored exactly"""
+        rows = self._rows_for_ids(candidate_ids)
+        if not len(rows):
+            return rows, np.zeros(0, dtype='float32')
+        if len(rows) * 4 < len(self):
+            # Selective filter: only touch the matching rows
+            query = normalize_rows(query_embedding)[0]
+            self._check_dimension(query.shape[0])
+            scores = self._rows(rows) @ query
+        else:
+            scores = self.scores(query_embedding)[rows]
+        order = top_k_indices(scores, min(k, len(rows)))
+        return rows[order], scores[order]
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        k: int = 5,
+        min_similarity: float = 0.0,
+        candidate_ids: Optional[Iterable[int]] = None,
+        exclude_ids: Optional[Iterable[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Find the k most similar documents
+
+        Args:
+            query_embedding: Query vector (need not be normalized)
+            k: Number of results to return
+            min_similarity: Minimum cosine similarity threshold
+            candidate_ids: Restrict scoring to these documents (e.g. a metadata filter)
+            exclude_ids: Documents that may not be selected (e.g. the query document itself)
+
+        Returns:
+            List of (document_id, similarity) pairs, best first
+        """
+        if not len(self):
+            return []
+        if candidate_ids is not None:
+            if exclude_ids is not None:
+                candidate_ids = set(candidate_ids) - set(exclude_ids)
+            rows, scores = self._ranked_candidate_rows(query_embedding, k, candidate_ids)
+        elif exclude_ids is not None:
+            excluded_rows = self._rows_for_ids(exclude_ids)
+            rows, scores = self._ranked_rows(
+                query_embedding, min(k, len(self) - len(excluded_rows)), excluded_rows
+            )
+        else:
+            rows, scores = self._ranked_rows(query_embedding, min(k, len(self)))
+        row_ids = self._row_ids
+        results = []
+        for row, score in zip(rows, scores):
+            score = float(score)
+            if score < min_similarity:
+                break
+            results.append((int(row_ids[row]), score))
+        return results
+
+    def scores_many(self, query_embeddings: np.ndarray) -> np.ndarray:
+        """Cosine similarity of each query against every row, as one (queries, rows) matrix product"""
+        queries = normalize_rows(query_embeddings)
+        self._check_dimension(queries.shape[1])
+        scores = (
+            queries @ self._matrix[:self._size].T if self._size
+            else np.zeros((len(queries), 0), dtype='float32')
+        )
+        if len(self._base_ids):
+            scores = np.concatenate([queries @ self._base.T, scores], axis=1)
+        if len(self) != scores.shape[1]:
+            scores[:, ~self._row_alive] = -np.inf
+        return scores
+
+    def search_many(
+        self,
+        query_embeddings: np.ndarray,
+        k: int = 5,
+        min_similarity: float = 0.0,
+        max_block_bytes: int = 256 * 1024 * 1024
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Find the k most similar documents for each of several queries
+
+        Queries are scored as a matrix-matrix product, so the corpus is streamed
+        from memory once per block of queries rather than once per query. Blocks
+        are sized so the score matrix stays under max_block_bytes.
+
+        Args:
+            query_embeddings: Query vectors (n_queries, dimension)
+            k: Number of results per query
+            min_similarity: Minimum cosine similarity threshold
+
+        Returns:
+            One list of (document_id, similarity) pairs per query, best first
+        """
+        queries = np.asarray(query_embeddings, dtype='float32')
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        if not len(self):
+            return [[] for _ in range(len(queries))]
+
+        row_ids = self._row_ids
+        rows_per_block = max(1, max_block_bytes // (4 * len(row_ids)))
+        results = []
+        for start in range(0, len(queries), rows_per_block):
+            scores = self.scores_many(queries[start:start + rows_per_block])
+            best = top_k_rows(scores, min(k, len(self)))
+            best_scores = np.take_along_axis(scores, best, axis=1)
+            for rows, row_scores in zip(best, best_scores):
+                hits = []
+                for row, score in zip(rows, row_scores):
+                    score = float(score)
+                    if score < min_similarity:
+                        break
+                    hits.append((int(row_ids[row]), score))
+                results.append(hits)
+        return results
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Bytes held by the float rows and by the int8 codes"""
+        return {
+            'float32_bytes': int(self._base.nbytes + self._matrix[:self._size].nbytes),
+            'int8_bytes': int(self._base_codes.nbytes + self._codes[:self._size].nbytes) if self.quantize else 0,
+        }
+
+
+def quantization_report(index: ExactVectorIndex, queries: np.ndarray, k: int = 10) -> Dict[str, float]:
+    """
+    Compare quantized search with exact scoring on a sample of queries
+
+    Args:
+        index: Index built with quantize=True
+        queries: 2D array of query vectors
+        k: Result size to compare
+
+    Returns:
+        Mean top-k overlap, share of queries with identical ordering, and memory ratio
+    """
+    if not index.quantize:
+        raise ValueError("quantization_report needs an index built with quantize=True")
+    overlap = 0.0
+    identical = 0
+    for query in np.atleast_2d(queries):
+        scores = index.scores(query)
+        exact_rows = top_k_indices(scores, min(k, len(index)))
+        quantized_rows, _ = index._ranked_rows(query, min(k, len(index)))
+        overlap += len(set(exact_rows.tolist()) & set(quantized_rows.tolist())) / max(len(exact_rows), 1)
+        identical += int(np.array_equal(exact_rows, quantized_rows))
+    n = len(np.atleast_2d(queries))
+    usage = index.memory_usage()
+    return {
+        'queries': n,
+        'k': k,
+        'mean_overlap': overlap / n,
+        'identical_order': identical / n,
+        'scan_bytes_ratio': usage['int8_bytes'] / max(usage['float32_bytes'], 1),
+    }
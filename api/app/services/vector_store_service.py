@@ -5,12 +5,27 @@ Replaces FAISS with PostgreSQL-based vector storage
 import os
 import numpy as np
 import pandas as pd
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, Iterable, List, Dict, NamedTuple, Optional, Set, Tuple
 from dotenv import load_dotenv
 import logging
 import json
-from prisma import Prisma, Json
-from .embedding_service import get_embedding_service
+import base64
+import hashlib
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from prisma import Prisma, Json, Base64
+from .embedding_base import EmbeddingService
+from .embedding_service import create_embedding_service, get_embedding_service, set_embedding_service
+from ..utils.config import config
+from .vector_index import ExactVectorIndex
+from .hnsw_index import HnswVectorIndex
+from .pgvector_index import PgVectorIndex
+from .metadata_index import MetadataFilterIndex
+from .lexical_index import BM25Index, reciprocal_rank_fusion
+from .neighbor_graph import NeighborGraph
+from .index_snapshot import snapshot_lock, read_header, read_snapshot, write_snapshot
+from .job_service import Job
 import asyncio
 
 # Load environment variables
@@ -18,18 +33,123 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Re-read this far behind the watermark so rows committed late with earlier timestamps are not missed
+REFRESH_LOOKBACK = timedelta(seconds=5)
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    """Raw queries return timestamps as ISO strings; Prisma models return datetimes"""
+    if value is None or isinstance(value, datetime):
+        return value
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+# Raw byte layouts for DocumentEmbedding.vector_data
+_STORAGE_DTYPES = {
+    'float32': np.dtype('<f4'),
+    'float16': np.dtype('<f2'),
+}
+
+# Columns of ner_data.csv stored as Document fields; every other column goes into metadata
+_CSV_FIELD_COLUMNS = ('uuid', 'summary', 'Filename', 'PETITIONER', 'RESPONDENT')
+
+# Error messages kept in bulk ingest stats; the rest are only logged
+_MAX_INGEST_ERRORS = 20
+
+def _content_hash(
+    text: str,
+    filename: Optional[str],
+    petitioner: Optional[str],
+    respondent: Optional[str],
+    metadata: Optional[Dict]
+) -> str:
+    """Fingerprint of the ingested fields a document's stored row and embedding are derived from"""
+    payload = json.dumps(
+        [text, filename, petitioner, respondent, metadata],
+        sort_keys=True, default=str, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _count_csv_rows(path: str, chunk_size: int) -> int:
+    """Parsed data rows in a CSV (quoted newlines included), for progress reporting"""
+    return sum(len(chunk) for chunk in pd.read_csv(path, chunksize=chunk_size, usecols=[0]))
+
+def _file_sha256(path: str, block_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class EmbeddingRow(NamedTuple):
+    """The columns of a DocumentEmbedding row that indexing needs"""
+    id: int
+    document_id: int
+    embedding: np.ndarray
+    created_at: Optional[datetime]
+
 class NeonVectorStore:
     """
     Vector store service using Neon DB for embedding storage and similarity search
     """
     
-    def __init__(self, prisma_client: Prisma = None):
+    def __init__(
+        self,
+        prisma_client: Prisma = None,
+        embedding_service: Optional[EmbeddingService] = None,
+        persist: bool = True
+    ):
+        """
+        Args:
+            prisma_client: Connected Prisma client
+            embedding_service: Model to embed with (defaults to the global embedding service)
+            persist: Read and write the on-disk index files; off for a shadow store
+                built next to the serving one, so it cannot replace their files
+        """
         self.prisma = prisma_client
-        self.embedding_service = get_embedding_service()
-        self.model_name = os.environ.get('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
-        self.dimension = 384  # Default dimension for all-MiniLM-L6-v2
+        self.embedding_service = embedding_service or get_embedding_service()
+        self.model_name = self.embedding_service.model_name
+        # Resolved by load_index from stored embeddings, or by probing the model
+        self.dimension: Optional[int] = None
+        self.persist = persist
+        self.storage_dtype = config.EMBEDDING_STORAGE_DTYPE
+        self.backend = config.VECTOR_BACKEND
+        self.pg_index = None
+        if self.backend == 'hnsw':
+            self.index = HnswVectorIndex(
+                m=config.HNSW_M,
+                ef_construction=config.HNSW_EF_CONSTRUCTION,
+                ef_search=config.HNSW_EF_SEARCH
+            )
+        elif self.backend in ('memory', 'pgvector'):
+            self.index = ExactVectorIndex(
+                quantize=config.INDEX_QUANTIZATION == 'int8',
+                rerank_candidates=config.QUANTIZED_RERANK_CANDIDATES,
+                shards=config.INDEX_SEARCH_SHARDS,
+                min_shard_rows=config.INDEX_MIN_SHARD_ROWS
+            )
+        else:
+            raise ValueError(f"Unsupported vector backend: {self.backend}")
+        if self.backend == 'pgvector':
+            self.pg_index = PgVectorIndex(
+                prisma_client, self.model_name, self.dimension, config.PGVECTOR_INDEX_METHOD,
+                exact_filter_limit=config.PGVECTOR_EXACT_FILTER_LIMIT,
+                filtered_ef_search=config.PGVECTOR_FILTERED_EF_SEARCH
+            )
         
-        logger.info(f"Initialized NeonVectorStore with model: {self.model_name}")
+        self.filter_index = MetadataFilterIndex()
+        self.lexical_index = BM25Index()
+        # Precomputed recommendations; built from the in-process vectors, so not with pgvector
+        self.neighbor_graph = None
+        if config.NEIGHBOR_GRAPH_K > 0 and self.pg_index is None:
+            self.neighbor_graph = NeighborGraph(config.NEIGHBOR_GRAPH_K)
+        
+        # Newest Document.updated_at / DocumentEmbedding.created_at reflected in the index
+        self._watermark: Optional[datetime] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        
+        logger.info(f"Initialized NeonVectorStore with model: {self.model_name} (backend: {self.backend})")
     
     def _embedding_to_json(self, embedding: np.ndarray) -> Json:
         """Convert numpy embedding to JSON for Prisma storage"""
@@ -38,8 +158,21 @@ class NeonVectorStore:
         # Use prisma.Json wrapper for proper type handling
         return Json({"vector": embedding.astype(float).tolist()})
     
+    def _embedding_to_bytes(self, embedding: np.ndarray) -> Base64:
+        """Convert numpy embedding to raw little-endian bytes for Prisma storage"""
+        dtype = _STORAGE_DTYPES.get(self.storage_dtype)
+        if dtype is None:
+            raise ValueError(f"Unsupported embedding storage dtype: {self.storage_dtype}")
+        return Base64.encode(np.ascontiguousarray(embedding.flatten(), dtype=dtype).tobytes())
+    
+    def _bytes_to_embedding(self, data, dtype: str = 'float32') -> np.ndarray:
+        """Convert raw little-endian bytes to numpy embedding without copying"""
+        if isinstance(data, Base64):
+            data = data.decode()
+        return np.frombuffer(data, dtype=_STORAGE_DTYPES[dtype])
+    
     def _json_to_embedding(self, json_data: Dict) -> np.ndarray:
-        """Convert JSON dict to numpy embedding"""
+        """Convert legacy JSON dict to numpy embedding"""
         if isinstance(json_data, dict) and "vector" in json_data:
             return np.array(json_data["vector"], dtype='float32')
         elif isinstance(json_data, list):
@@ -48,6 +181,54 @@ class NeonVectorStore:
         else:
             raise ValueError(f"Invalid embedding format: {type(json_data)}")
     
+    async def _find_embedding_rows(
+        self,
+        document_ids: Optional[Iterable[int]] = None,
+        since: Optional[datetime] = None
+    ) -> List[EmbeddingRow]:
+        """
+        Read embeddings for the current model through a narrow projection, oldest first
+        
+        Only id, document_id, the vector and created_at cross the wire: the vector as
+        base64 text, and the legacy JSON copy only for rows not yet migrated to binary.
+        
+        Args:
+            document_ids: Restrict to these documents
+            since: Only rows created after this time
+        """
+        clauses = ['"model_name" = $1']
+        params = [self.model_name]
+        if document_ids is not None:
+            ids = ",".join(str(int(i)) for i in document_ids)
+            if not ids:
+                return []
+            clauses.append(f"\"document_id\" = ANY('{{{ids}}}'::int[])")
+        if since is not None:
+            if since.tzinfo is not None:
+                # created_at is a UTC timestamp without time zone
+                since = since.astimezone(timezone.utc).replace(tzinfo=None)
+            params.append(since.isoformat())
+            clauses.append(f'"created_at" > ${len(params)}::timestamp')
+        rows = await self.prisma.query_raw(
+            'SELECT "id", "document_id", "dtype", "created_at", '
+            'encode("vector_data", \'base64\') AS "vector_b64", '
+            'CASE WHEN "vector_data" IS NULL THEN "embedding" END AS "legacy_embedding" '
+            f'FROM "DocumentEmbedding" WHERE {" AND ".join(clauses)} ORDER BY "id"',
+            *params
+        )
+        
+        result = []
+        for row in rows:
+            if row.get('vector_b64'):
+                embedding = self._bytes_to_embedding(base64.b64decode(row['vector_b64']), row.get('dtype') or 'float32')
+            else:
+                legacy = row.get('legacy_embedding')
+                embedding = self._json_to_embedding(json.loads(legacy) if isinstance(legacy, str) else legacy)
+            result.append(EmbeddingRow(
+                int(row['id']), int(row['document_id']), embedding, _parse_timestamp(row.get('created_at'))
+            ))
+        return result
+    
     def _cosine_similarity(self, a: np.ndarray, b: np.ndarray) -> float:
         """Calculate cosine similarity between two embeddings"""
         if a.ndim > 1:
@@ -64,6 +245,506 @@ class NeonVectorStore:
         
         return float(dot_product / (norm_a * norm_b))
     
+    async def load_index(self) -> int:
+        """
+        Load all embeddings for the current model into the search backend
+        
+        For the pgvector backend this only prepares the table and copies over
+        embeddings that are not in it yet; nothing is held in memory. The HNSW
+        backend restores its persisted graph, and the memory backend maps the shared
+        embedding snapshot, when possible; both then only apply the difference against
+        the database. The neighbor graph is loaded last, from the finished index.
+        
+        Returns:
+            Number of documents indexed
+        """
+        try:
+            await self._resolve_dimension()
+            await self._load_document_indexes()
+            
+            if self.pg_index is not None:
+                return await self._sync_pg_index()
+            
+            count = await self._load_vector_index()
+            if self.neighbor_graph is not None:
+                await self._load_neighbor_graph()
+            return count
+            
+        except Exception as e:
+            logger.error(f"Error loading vector index: {str(e)}")
+            raise
+    
+    async def _resolve_dimension(self) -> int:
+        """
+        Embedding dimension of the current model: from its stored embeddings, else from
+        the model itself (one probe call when nothing is stored for it yet)
+        """
+        if self.dimension is None:
+            rows = await self.prisma.query_raw(
+                'SELECT "dimension" FROM "DocumentEmbedding" WHERE "model_name" = $1 LIMIT 1',
+                self.model_name
+            )
+            if rows and rows[0].get('dimension'):
+                self.dimension = int(rows[0]['dimension'])
+            elif getattr(self.embedding_service, 'dimension', None):
+                self.dimension = int(self.embedding_service.dimension)
+            else:
+                probe = await self.embedding_service.aencode_single("dimension probe")
+                self.dimension = int(np.asarray(probe).size)
+            logger.info(f"Embedding dimension for {self.model_name}: {self.dimension}")
+        if self.pg_index is not None:
+            self.pg_index.dimension = self.dimension
+        return self.dimension
+    
+    def _check_dimension(self, embedding: np.ndarray) -> int:
+        """Refuse to store an embedding whose size does not match the current model's"""
+        dimension = int(np.asarray(embedding).size)
+        if self.dimension is None:
+            self.dimension = dimension
+        elif dimension != self.dimension:
+            raise ValueError(
+                f"Embedding dimension {dimension} does not match {self.model_name} ({self.dimension})"
+            )
+        return dimension
+    
+    async def _load_vector_index(self) -> int:
+        """Fill the in-process index from a persisted copy where possible, else the database"""
+        if not self.persist:
+            return await self._load_from_database()
+        if self.backend == 'hnsw':
+            with snapshot_lock(config.HNSW_INDEX_DIR, exclusive=False):
+                meta = self.index.restore(config.HNSW_INDEX_DIR, self.model_name)
+            if meta is not None:
+                if meta.get('watermark'):
+                    self._watermark = datetime.fromisoformat(meta['watermark'])
+                return await self._reconcile_index()
+        
+        if self.backend == 'memory' and config.INDEX_SNAPSHOT_DIR:
+            return await self._load_with_snapshot(config.INDEX_SNAPSHOT_DIR)
+        
+        return await self._load_from_database()
+    
+    async def _load_neighbor_graph(self):
+        """
+        Restore the neighbor graph sidecar if it matches the index, otherwise rebuild it
+        
+        A sidecar saved at the index's watermark only needs the id difference applied;
+        anything older may hold stale similarities and is rebuilt.
+        """
+        directory = config.NEIGHBOR_GRAPH_DIR if self.persist else ""
+        if not directory:
+            await self.rebuild_neighbor_graph(save=False)
+            return
+        watermark = self._watermark.isoformat() if self._watermark else None
+        with snapshot_lock(directory, exclusive=False):
+            meta = self.neighbor_graph.restore(directory, self.model_name)
+        if meta is not None and meta.get('watermark') == watermark:
+            graph_ids = {int(document_id) for document_id in self.neighbor_graph.ids}
+            indexed_ids = {int(document_id) for document_id in self.index.ids}
+            await self._apply_neighbor_changes(
+                {document_id: self.index.get_vector(document_id) for document_id in indexed_ids - graph_ids},
+                graph_ids - indexed_ids
+            )
+            return
+        # _save_neighbor_graph takes the lock only for the write
+        await self.rebuild_neighbor_graph()
+    
+    async def rebuild_neighbor_graph(self, save: bool = True):
+        """
+        Recompute every document's neighbor list from the in-process index
+        
+        The blocked matrix products run in a worker thread so the event loop keeps serving.
+        """
+        if self.neighbor_graph is None:
+            return
+        document_ids, embeddings = self.index.export()
+        await asyncio.to_thread(self.neighbor_graph.build, document_ids, embeddings)
+        if save and config.NEIGHBOR_GRAPH_DIR:
+            self._save_neighbor_graph()
+    
+    def _save_neighbor_graph(self):
+        directory = config.NEIGHBOR_GRAPH_DIR
+        # An empty graph next to a non-empty index was never built; don't let it replace a good sidecar
+        if not directory or not self.persist or (not len(self.neighbor_graph) and len(self.index)):
+            return
+        try:
+            watermark = self._watermark.isoformat() if self._watermark else None
+            with snapshot_lock(directory):
+                self.neighbor_graph.save(directory, self.model_name, watermark)
+        except Exception as e:
+            logger.error(f"Error saving neighbor graph: {str(e)}")
+    
+    def _update_neighbors(self, document_id: int, embedding: np.ndarray):
+        """Fold an added or re-embedded document into the neighbor graph"""
+        if self.neighbor_graph is None:
+            return
+        hits = self.index.search(embedding, k=config.NEIGHBOR_GRAPH_UPDATE_CANDIDATES + 1)
+        self.neighbor_graph.update(document_id, hits)
+    
+    def _remove_neighbors(self, document_id: int):
+        if self.neighbor_graph is not None:
+            self.neighbor_graph.remove(document_id)
+    
+    async def _apply_neighbor_changes(self, upserted: Dict[int, np.ndarray], removed: Iterable[int]):
+        """
+        Fold a batch of index changes into the neighbor graph
+        
+        Each per-document update scans the whole index on the event loop, so deltas
+        above NEIGHBOR_GRAPH_REBUILD_THRESHOLD rebuild the graph in a worker thread instead.
+        """
+        if self.neighbor_graph is None:
+            return
+        removed = list(removed)
+        if len(upserted) + len(removed) > config.NEIGHBOR_GRAPH_REBUILD_THRESHOLD:
+            await self.rebuild_neighbor_graph()
+            return
+        for document_id in removed:
+            self._remove_neighbors(document_id)
+        for document_id, embedding in upserted.items():
+            self._update_neighbors(document_id, embedding)
+    
+    async def _load_document_indexes(self):
+        """Build the metadata filter and BM25 indexes from a narrow projection of Document"""
+        rows = await self.prisma.query_raw(
+            'SELECT "id", "summary", "petitioner", "respondent", "metadata", "updated_at" FROM "Document"'
+        )
+        for row in rows:
+            metadata = row.get('metadata')
+            if isinstance(metadata, str):
+                metadata = json.loads(metadata)
+            self._index_fields(
+                int(row['id']), row.get('summary'), row.get('petitioner'), row.get('respondent'), metadata
+            )
+            self._advance_watermark(_parse_timestamp(row.get('updated_at')))
+        logger.info(f"Metadata filter and BM25 indexes loaded with {len(rows)} documents")
+    
+    def _index_fields(
+        self,
+        document_id: int,
+        summary: Optional[str],
+        petitioner: Optional[str],
+        respondent: Optional[str],
+        metadata: Optional[Dict]
+    ):
+        """Keep the metadata filter and BM25 indexes in sync with a stored document"""
+        self.filter_index.add(document_id, petitioner, respondent, metadata)
+        self.lexical_index.add(document_id, summary, petitioner, respondent, metadata)
+    
+    async def _load_from_database(self) -> int:
+        """Build the in-process index from every stored embedding for the model"""
+        embedding_rows = await self._find_embedding_rows()
+        
+        # Later rows win, so each document keeps its most recent embedding
+        vectors_by_document = {}
+        for row in embedding_rows:
+            vectors_by_document[row.document_id] = row.embedding
+            self._advance_watermark(row.created_at)
+        
+        document_ids = list(vectors_by_document.keys())
+        if document_ids:
+            self.index.load(document_ids, np.vstack(list(vectors_by_document.values())))
+        else:
+            self.index.load([], np.zeros((0, self.dimension), dtype='float32'))
+        
+        logger.info(f"Vector index loaded with {len(document_ids)} documents")
+        if self.backend == 'hnsw':
+            self.save_index()
+        return len(document_ids)
+    
+    async def _load_with_snapshot(self, directory: str) -> int:
+        """
+        Map the shared embedding snapshot, building it first if there is none
+        
+        The snapshot lock is held only around file reads and writes, never across
+        database queries. Workers that find no snapshot each load the database; the
+        first to finish writes the snapshot, and later ones map it instead of
+        replacing it with their own equally current copy.
+        """
+        with snapshot_lock(directory, exclusive=False):
+            snapshot = read_snapshot(directory, self.model_name)
+        if snapshot is None:
+            count = await self._load_from_database()
+            watermark = self._watermark.isoformat() if self._watermark else ''
+            with snapshot_lock(directory):
+                snapshot = read_snapshot(directory, self.model_name)
+                if snapshot is None or (snapshot[2].get('watermark') or '') < watermark:
+                    self._write_snapshot(directory)
+                    # Remap what was just written so this worker shares pages as well
+                    snapshot = read_snapshot(directory, self.model_name)
+            if snapshot is None:
+                return count
+            document_ids, embeddings, header = snapshot
+            self.index.attach_base(document_ids, embeddings)
+            if header.get('watermark'):
+                self._watermark = datetime.fromisoformat(header['watermark'])
+            return len(document_ids)
+        
+        document_ids, embeddings, header = snapshot
+        self.index.attach_base(document_ids, embeddings)
+        if header.get('watermark'):
+            self._watermark = datetime.fromisoformat(header['watermark'])
+        return await self._reconcile_index()
+    
+    def _write_snapshot(self, directory: str):
+        document_ids, embeddings = self.index.export()
+        watermark = self._watermark.isoformat() if self._watermark else None
+        write_snapshot(directory, document_ids, embeddings, self.model_name, watermark)
+    
+    async def _reconcile_index(self) -> int:
+        """Bring a restored index in line with the embeddings currently in the database"""
+        rows = await self.prisma.query_raw(
+            'SELECT DISTINCT "document_id" FROM "DocumentEmbedding" WHERE "model_name" = $1',
+            self.model_name
+        )
+        stored_ids = {int(row['document_id']) for row in rows}
+        indexed_ids = {int(document_id) for document_id in self.index.ids}
+        
+        for document_id in indexed_ids - stored_ids:
+            self.index.remove(document_id)
+        
+        missing_ids = stored_ids - indexed_ids
+        if missing_ids:
+            for row in await self._find_embedding_rows(document_ids=missing_ids):
+                self.index.upsert(row.document_id, row.embedding)
+        
+        logger.info(
+            f"Reconciled restored index: {len(missing_ids)} added, "
+            f"{len(indexed_ids - stored_ids)} removed"
+        )
+        return len(self.index)
+    
+    def save_index(self):
+        """Persist the in-process index (and the neighbor graph) where the backend supports it"""
+        if not self.persist:
+            return
+        if self.neighbor_graph is not None:
+            self._save_neighbor_graph()
+        if self.backend == 'hnsw':
+            try:
+                watermark = self._watermark.isoformat() if self._watermark else None
+                # Workers share the directory; one at a time writes its files
+                with snapshot_lock(config.HNSW_INDEX_DIR):
+                    self.index.save(config.HNSW_INDEX_DIR, self.model_name, watermark)
+            except Exception as e:
+                logger.error(f"Error saving HNSW index: {str(e)}")
+        elif self.backend == 'memory' and config.INDEX_SNAPSHOT_DIR:
+            directory = config.INDEX_SNAPSHOT_DIR
+            try:
+                with snapshot_lock(directory):
+                    header = read_header(directory)
+                    if header and header.get('model_name') == self.model_name and header.get('count') == len(self.index):
+                        saved = header.get('watermark')
+                        if self._watermark is None or (saved and datetime.fromisoformat(saved) >= self._watermark):
+                            # Another worker already wrote an equally fresh snapshot
+                            return
+                    self._write_snapshot(directory)
+            except Exception as e:
+                logger.error(f"Error saving embedding snapshot: {str(e)}")
+    
+    def _advance_watermark(self, timestamp: Optional[datetime]):
+        if timestamp is not None and (self._watermark is None or timestamp > self._watermark):
+            self._watermark = timestamp
+    
+    async def refresh_index(self) -> Dict[str, int]:
+        """
+        Apply changes made since the last watermark to the in-memory indexes
+        
+        Picks up documents written by bulk ingest or other API replicas by polling
+        Document.updated_at and DocumentEmbedding.created_at, so only deltas are read.
+        Deletions, and rows whose timestamps fell behind the watermark (a long ingest
+        transaction stamps them with its start time), are detected by comparing
+        document counts, and only then by id.
+        
+        Returns:
+            Dictionary with the number of upserted and removed documents
+        """
+        stats = {'upserted': 0, 'removed': 0}
+        # Neighbor graph changes are applied together at the end
+        neighbor_upserts = {}
+        neighbor_removals = []
+        
+        try:
+            since = self._watermark - REFRESH_LOOKBACK if self._watermark else None
+            changed_ids = set()
+            new_embeddings = []
+            
+            # pgvector is written synchronously and read in place; only the filter index needs refreshing
+            if self.pg_index is None:
+                new_embeddings = await self._find_embedding_rows(since=since)
+                changed_ids = {row.document_id for row in new_embeddings}
+                for row in new_embeddings:
+                    self._advance_watermark(row.created_at)
+            
+            if since is not None:
+                changed_documents = await self.prisma.document.find_many(
+                    where={'updated_at': {'gt': since}}
+                )
+                for doc in changed_documents:
+                    changed_ids.add(doc.id)
+                    self._advance_watermark(doc.updated_at)
+                    self._index_fields(doc.id, doc.summary, doc.petitioner, doc.respondent, doc.metadata)
+            
+            # Re-read the current embedding of every touched document (later rows win)
+            if changed_ids and self.pg_index is None:
+                current = {}
+                rows = new_embeddings
+                missing_ids = changed_ids - {row.document_id for row in new_embeddings}
+                if missing_ids:
+                    rows = rows + await self._find_embedding_rows(document_ids=missing_ids)
+                for row in sorted(rows, key=lambda r: r.id):
+                    current[row.document_id] = row
+                
+                for document_id in changed_ids:
+                    row = current.get(document_id)
+                    if row is not None:
+                        embedding = row.embedding
+                        self.index.upsert(document_id, embedding)
+                        neighbor_upserts[document_id] = embedding
+                        stats['upserted'] += 1
+                    elif self.index.remove(document_id):
+                        neighbor_removals.append(document_id)
+                        stats['removed'] += 1
+            
+            # Deleted documents leave no timestamp behind, and rows committed late may carry
+            # one older than the watermark, so fall back to an id diff in both directions
+            if self.pg_index is None:
+                stored_count = await self.prisma.query_raw(
+                    'SELECT COUNT(DISTINCT "document_id")::int AS n FROM "DocumentEmbedding" WHERE "model_name" = $1',
+                    self.model_name
+                )
+                if stored_count and int(stored_count[0]['n']) != len(self.index):
+                    rows = await self.prisma.query_raw(
+                        'SELECT DISTINCT "document_id" FROM "DocumentEmbedding" WHERE "model_name" = $1',
+                        self.model_name
+                    )
+                    stored_ids = {int(row['document_id']) for row in rows}
+                    indexed_ids = {int(i) for i in self.index.ids}
+                    for document_id in indexed_ids - stored_ids:
+                        self.index.remove(document_id)
+                        neighbor_removals.append(document_id)
+                        stats['removed'] += 1
+                    missing_ids = stored_ids - indexed_ids
+                    if missing_ids:
+                        # Oldest first, so each document ends on its latest embedding
+                        current = {}
+                        for row in await self._find_embedding_rows(document_ids=missing_ids):
+                            current[row.document_id] = row.embedding
+                        for document_id, embedding in current.items():
+                            self.index.upsert(document_id, embedding)
+                            neighbor_upserts[document_id] = embedding
+                            stats['upserted'] += 1
+            
+            await self._apply_neighbor_changes(neighbor_upserts, neighbor_removals)
+            
+            document_count = await self.prisma.document.count()
+            if document_count != len(self.filter_index):
+                rows = await self.prisma.query_raw('SELECT "id" FROM "Document"')
+                stored_ids = {int(row['id']) for row in rows}
+                indexed_ids = set(self.filter_index.document_ids)
+                for document_id in indexed_ids - stored_ids:
+                    self.filter_index.remove(document_id)
+                    self.lexical_index.remove(document_id)
+                missing_ids = stored_ids - indexed_ids
+                if missing_ids:
+                    for doc in await self.prisma.document.find_many(where={'id': {'in': list(missing_ids)}}):
+                        self._index_fields(doc.id, doc.summary, doc.petitioner, doc.respondent, doc.metadata)
+            
+            if stats['upserted'] or stats['removed']:
+                logger.info(f"Index refresh applied {stats}")
+            return stats
+            
+        except Exception as e:
+            logger.error(f"Error refreshing vector index: {str(e)}")
+            raise
+    
+    async def _refresh_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                serving_model = await load_serving_model(self.prisma)
+                if serving_model and serving_model != self.model_name:
+                    # A reindex on another worker switched models; the new store's refresher takes over
+                    await follow_serving_model(self, serving_model)
+                    self._refresh_task = None
+                    return
+                await self.refresh_index()
+            except Exception:
+                # Already logged; keep polling
+                pass
+    
+    def start_refresher(self, interval: float = None):
+        """Start polling for changes in the background"""
+        if interval is None:
+            interval = config.INDEX_REFRESH_INTERVAL_SECONDS
+        if interval <= 0 or self._refresh_task is not None:
+            return
+        self._refresh_task = asyncio.create_task(self._refresh_loop(interval))
+        logger.info(f"Index refresher started (every {interval}s)")
+    
+    async def stop_refresher(self):
+        """Stop the background refresher if it is running"""
+        if self._refresh_task is None:
+            return
+        self._refresh_task.cancel()
+        try:
+            await self._refresh_task
+        except asyncio.CancelledError:
+            pass
+        self._refresh_task = None
+    
+    async def _sync_pg_index(self) -> int:
+        """Create the pgvector table if needed and backfill missing embeddings"""
+        await self.pg_index.ensure_schema()
+        indexed = set(await self.pg_index.indexed_document_ids())
+        
+        missing = {}
+        for row in await self._find_embedding_rows():
+            if row.document_id not in indexed:
+                missing[row.document_id] = row.embedding
+        
+        if missing:
+            await self.pg_index.upsert_many(list(missing.keys()), np.vstack(list(missing.values())))
+            logger.info(f"Backfilled {len(missing)} embeddings into pgvector")
+        
+        return len(indexed) + len(missing)
+    
+    async def _search_hits(
+        self,
+        query_embedding: np.ndarray,
+        k: int,
+        min_similarity: float,
+        candidate_ids: Optional[Set[int]] = None,
+        exclude_ids: Optional[Set[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """Rank documents against a query vector using the configured backend"""
+        if self.pg_index is not None:
+            return await self.pg_index.search(
+                query_embedding, k=k, min_similarity=min_similarity,
+                candidate_ids=candidate_ids, exclude_ids=exclude_ids
+            )
+        return self.index.search(
+            query_embedding, k=k, min_similarity=min_similarity,
+            candidate_ids=candidate_ids, exclude_ids=exclude_ids
+        )
+    
+    async def _stored_embedding(self, document_id: int) -> Optional[np.ndarray]:
+        """The document's current embedding for this model, without encoding anything"""
+        if self.pg_index is None:
+            vector = self.index.get_vector(document_id)
+            if vector is not None:
+                return vector
+        # pgvector, or written by another replica since the last refresh
+        rows = await self._find_embedding_rows(document_ids=[document_id])
+        return rows[-1].embedding if rows else None
+    
+    async def _index_document(self, document_id: int, embedding: np.ndarray):
+        """Keep the search backend in sync with a stored embedding"""
+        if self.pg_index is not None:
+            await self.pg_index.upsert(document_id, embedding)
+        else:
+            self.index.upsert(document_id, embedding)
+            self._update_neighbors(document_id, embedding)
+    
     async def add_document(
         self, 
         uuid: str, 
@@ -89,9 +770,10 @@ class NeonVectorStore:
         """
         try:
             # Generate embedding
-            embedding = self.embedding_service.encode(text)
-            embedding_json = self._embedding_to_json(embedding)
-            dimension = len(embedding.flatten())  # Calculate dimension from original embedding
+            # Unchanged texts are served from the content-addressed store without an API call
+            embedding = await self.embedding_service.aencode_document(text)
+            self._check_dimension(embedding)
+            content_hash = _content_hash(text, filename, petitioner, respondent, metadata)
             
             # Check if document already exists
             existing_doc = await self.prisma.document.find_unique(
@@ -104,7 +786,8 @@ class NeonVectorStore:
                     'filename': filename,
                     'petitioner': petitioner,
                     'respondent': respondent,
-                    'summary': text
+                    'summary': text,
+                    'content_hash': content_hash
                 }
                 
                 # Only add metadata if it's provided and not None
@@ -116,20 +799,19 @@ class NeonVectorStore:
                     data=update_data
                 )
                 
-                # Delete old embeddings and create new ones
+                # Replace this model's embedding; other models' rows stay for switching back
                 await self.prisma.documentembedding.delete_many(
-                    where={'document_id': document.id}
+                    where={'document_id': document.id, 'model_name': self.model_name}
                 )
                 
                 await self.prisma.documentembedding.create(
-                    data={
-                        'document_id': document.id,
-                        'embedding': embedding_json,
-                        'model_name': self.model_name,
-                        'dimension': dimension
-                    }
+                    data=self._embedding_data(document.id, embedding)
                 )
                 
+                await self._index_document(document.id, embedding)
+                self._index_fields(
+                    document.id, document.summary, document.petitioner, document.respondent, document.metadata
+                )
                 logger.info(f"Updated document {uuid} with new embedding")
                 return document.id
             else:
@@ -139,7 +821,8 @@ class NeonVectorStore:
                     'filename': filename,
                     'petitioner': petitioner,
                     'respondent': respondent,
-                    'summary': text
+                    'summary': text,
+                    'content_hash': content_hash
                 }
                 
                 # Only add metadata if it's provided and not None
@@ -150,14 +833,13 @@ class NeonVectorStore:
                 
                 # Create embedding
                 await self.prisma.documentembedding.create(
-                    data={
-                        'document_id': document.id,
-                        'embedding': embedding_json,
-                        'model_name': self.model_name,
-                        'dimension': dimension
-                    }
+                    data=self._embedding_data(document.id, embedding)
                 )
                 
+                await self._index_document(document.id, embedding)
+                self._index_fields(
+                    document.id, document.summary, document.petitioner, document.respondent, document.metadata
+                )
                 logger.info(f"Added new document {uuid} with embedding")
                 return document.id
                 
@@ -169,76 +851,275 @@ class NeonVectorStore:
         self, 
         query_text: str, 
         k: int = 5,
-        min_similarity: float = 0.0
+        min_similarity: float = 0.0,
+        filters: Optional[Dict] = None
     ) -> List[Dict]:
         """
-        Perform similarity search using cosine similarity
+        Perform similarity search using cosine similarity against the configured backend
         
         Args:
             query_text: Query text to search for
             k: Number of results to return
             min_similarity: Minimum similarity threshold
+            filters: Structured filters on entity fields (judge, court, ...) or metadata keys;
+                fields are ANDed, a list of values for one field is ORed
             
         Returns:
             List of documents with similarity scores
         """
         try:
             # Generate query embedding
-            query_embedding = self.embedding_service.encode(query_text)
-            
-            # Get all documents with embeddings
-            documents_with_embeddings = await self.prisma.document.find_many(
-                include={
-                    'embeddings': {
-                        'where': {'model_name': self.model_name}
-                    }
-                }
+            query_embedding = await self.embedding_service.aencode(query_text)
+            return await self.similarity_search_by_vector(query_embedding, k, min_similarity, filters)
+            
+        except Exception as e:
+            logger.error(f"Error in similarity search: {str(e)}")
+            raise
+    
+    async def similarity_search_by_vector(
+        self,
+        query_embedding: np.ndarray,
+        k: int = 5,
+        min_similarity: float = 0.0,
+        filters: Optional[Dict] = None,
+        exclude_ids: Optional[Set[int]] = None
+    ) -> List[Dict]:
+        """
+        Similarity search for an embedding the caller already has
+        
+        Args:
+            query_embedding: Query vector (need not be normalized)
+            k: Number of results to return
+            min_similarity: Minimum similarity threshold
+            filters: Structured filters, as in similarity_search
+            exclude_ids: Document ids left out of the top-k selection
+            
+        Returns:
+            List of documents with similarity scores
+        """
+        # Resolve filters first so scoring only touches the matching documents
+        candidate_ids = None
+        if filters:
+            candidate_ids = self.filter_index.match(filters)
+            if not candidate_ids:
+                return []
+        
+        # Score the whole corpus in one pass (or let pgvector do it in the database)
+        hits = await self._search_hits(query_embedding, k, min_similarity, candidate_ids, exclude_ids)
+        if not hits:
+            return []
+        
+        return await self._hydrate(hits)
+    
+    async def search_by_document_id(
+        self,
+        document_id: int,
+        k: int = 5,
+        min_similarity: float = 0.0,
+        filters: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        Documents most similar to a stored document, using its stored embedding
+        
+        The document itself is excluded from the results.
+        
+        Args:
+            document_id: Id of the reference document
+            k: Number of results to return
+            min_similarity: Minimum similarity threshold
+            filters: Structured filters, as in similarity_search
+            
+        Returns:
+            List of documents with similarity scores
+        """
+        try:
+            embedding = await self._stored_embedding(document_id)
+            if embedding is None:
+                raise ValueError(f"Document {document_id} has no stored embedding for {self.model_name}")
+            return await self.similarity_search_by_vector(
+                embedding, k, min_similarity, filters, exclude_ids={document_id}
             )
             
+        except Exception as e:
+            logger.error(f"Error searching by document {document_id}: {str(e)}")
+            raise
+    
+    async def rank_query(self, query: str, k: int = 10) -> Tuple[List[int], float, float]:
+        """
+        Rank documents for a text query without hydrating them, for comparing models
+        
+        Returns:
+            (document ids best first, embedding time in ms, search time in ms)
+        """
+        started = time.perf_counter()
+        query_embedding = await self.embedding_service.aencode_single(query)
+        embedded = time.perf_counter()
+        hits = await self._search_hits(query_embedding, k, 0.0)
+        searched = time.perf_counter()
+        return [document_id for document_id, _ in hits], (embedded - started) * 1000, (searched - embedded) * 1000
+    
+    async def _hydrate(self, hits: List[Tuple[int, float]], score_key: str = 'similarity_score') -> List[Dict]:
+        """Fetch only the winning documents and return them in rank order"""
+        return (await self._hydrate_many([hits], score_key))[0]
+    
+    async def _hydrate_many(
+        self,
+        hits_per_query: List[List[Tuple[int, float]]],
+        score_key: str = 'similarity_score'
+    ) -> List[List[Dict]]:
+        """Hydrate several rankings with a single query for the union of their documents"""
+        wanted_ids = {document_id for hits in hits_per_query for document_id, _ in hits}
+        if not wanted_ids:
+            return [[] for _ in hits_per_query]
+        documents = await self.prisma.document.find_many(
+            where={'id': {'in': list(wanted_ids)}}
+        )
+        documents_by_id = {doc.id: doc for doc in documents}
+        
+        all_results = []
+        for hits in hits_per_query:
             results = []
-            
-            for doc in documents_with_embeddings:
-                if not doc.embeddings:
+            for document_id, score in hits:
+                doc = documents_by_id.get(document_id)
+                if doc is None:
+                    # Deleted since the index was loaded
                     continue
-                
-                # Get the most recent embedding for this model
-                embedding_record = doc.embeddings[0]
-                doc_embedding = self._json_to_embedding(embedding_record.embedding)
-                
-                # Calculate similarity
-                similarity = self._cosine_similarity(query_embedding, doc_embedding)
-                
-                if similarity >= min_similarity:
-                    results.append({
-                        'uuid': doc.uuid,
-                        'petitioner': doc.petitioner,
-                        'respondent': doc.respondent,
-                        'summary': doc.summary,
-                        'filename': doc.filename,
-                        'metadata': doc.metadata,
-                        'similarity_score': similarity,
-                        'document_id': doc.id
-                    })
-            
-            # Sort by similarity score (descending) and return top k
-            results.sort(key=lambda x: x['similarity_score'], reverse=True)
-            return results[:k]
+                results.append({
+                    'uuid': doc.uuid,
+                    'petitioner': doc.petitioner,
+                    'respondent': doc.respondent,
+                    'summary': doc.summary,
+                    'filename': doc.filename,
+                    'metadata': doc.metadata,
+                    score_key: score,
+                    'document_id': doc.id
+                })
+            all_results.append(results)
+        return all_results
+    
+    async def similarity_search_many(
+        self,
+        query_texts: List[str],
+        k: int = 5,
+        min_similarity: float = 0.0,
+        filters: Optional[Dict] = None
+    ) -> List[List[Dict]]:
+        """
+        Run several similarity searches at once
+        
+        All queries are embedded in one encode call and, for the in-memory backends,
+        scored against the corpus as one matrix-matrix product; the winning documents
+        of every query are then fetched in a single round trip.
+        
+        Args:
+            query_texts: Query texts to search for
+            k: Number of results per query
+            min_similarity: Minimum similarity threshold
+            filters: Structured filters applied to every query, as in similarity_search
+            
+        Returns:
+            One list of documents with similarity scores per query, in input order
+        """
+        try:
+            if not query_texts:
+                return []
+            
+            candidate_ids = None
+            if filters:
+                candidate_ids = self.filter_index.match(filters)
+                if not candidate_ids:
+                    return [[] for _ in query_texts]
+            
+            query_embeddings = np.asarray(await self.embedding_service.aencode(list(query_texts)), dtype='float32')
+            
+            if self.pg_index is None and candidate_ids is None:
+                hits_per_query = self.index.search_many(query_embeddings, k=k, min_similarity=min_similarity)
+            else:
+                hits_per_query = [
+                    await self._search_hits(query_embedding, k, min_similarity, candidate_ids)
+                    for query_embedding in query_embeddings
+                ]
+            
+            return await self._hydrate_many(hits_per_query)
             
         except Exception as e:
-            logger.error(f"Error in similarity search: {str(e)}")
+            logger.error(f"Error in batched similarity search: {str(e)}")
+            raise
+    
+    async def hybrid_search(
+        self,
+        query_text: str,
+        k: int = 10,
+        min_similarity: float = 0.0,
+        filters: Optional[Dict] = None,
+        candidates: int = 50
+    ) -> List[Dict]:
+        """
+        Rank documents by fusing BM25 and vector rankings (reciprocal rank fusion)
+        
+        Exact party or entity names often embed poorly, so the lexical ranking keeps
+        them on top. Multi-word queries that are exactly one of the top lexical hit's
+        party, judge or lawyer names are answered from BM25 alone, without an embedding call.
+        
+        Args:
+            query_text: Query text to search for
+            k: Number of results to return
+            min_similarity: Minimum similarity for the vector ranking
+            filters: Structured filters, as in similarity_search
+            candidates: Depth of each ranking before fusion
+            
+        Returns:
+            List of documents with 'relevance_score', the rank fusion scaled to [0, 1]
+            (1 = ranked first by every ranking consulted), plus the BM25 'lexical_score'
+            and vector 'similarity_score' of the rankings that found them
+        """
+        try:
+            candidate_ids = None
+            if filters:
+                candidate_ids = self.filter_index.match(filters)
+                if not candidate_ids:
+                    return []
+            
+            depth = max(candidates, k)
+            lexical_hits = self.lexical_index.search(query_text, k=depth, candidate_ids=candidate_ids)
+            rankings = [[document_id for document_id, _ in lexical_hits]]
+            vector_hits = []
+            # An exact name match is answered by BM25 alone, but scored on the same scale
+            if not (lexical_hits and self.lexical_index.is_name_match(query_text, lexical_hits[0][0])):
+                query_embedding = await self.embedding_service.aencode(query_text)
+                vector_hits = await self._search_hits(query_embedding, depth, min_similarity, candidate_ids)
+                rankings.append([document_id for document_id, _ in vector_hits])
+            
+            fused = reciprocal_rank_fusion(rankings, normalize=True)[:k]
+            results = await self._hydrate(fused, score_key='relevance_score')
+            lexical_scores = dict(lexical_hits)
+            similarities = dict(vector_hits)
+            for result in results:
+                if result['document_id'] in lexical_scores:
+                    result['lexical_score'] = lexical_scores[result['document_id']]
+                if result['document_id'] in similarities:
+                    result['similarity_score'] = similarities[result['document_id']]
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error in hybrid search: {str(e)}")
             raise
     
     async def get_document_by_uuid(self, uuid: str) -> Optional[Dict]:
         """Get document by UUID including its embedding"""
         try:
             document = await self.prisma.document.find_unique(
-                where={'uuid': uuid},
-                include={'embeddings': True}
+                where={'uuid': uuid}
             )
             
             if not document:
                 return None
             
+            # Count instead of including the embedding rows, which would ship every vector
+            embedding_count = await self.prisma.documentembedding.count(
+                where={'document_id': document.id}
+            )
+            
             return {
                 'uuid': document.uuid,
                 'petitioner': document.petitioner,
@@ -247,124 +1128,582 @@ class NeonVectorStore:
                 'filename': document.filename,
                 'metadata': document.metadata,
                 'document_id': document.id,
-                'has_embedding': len(document.embeddings) > 0
+                'has_embedding': embedding_count > 0
             }
             
         except Exception as e:
             logger.error(f"Error getting document {uuid}: {str(e)}")
             raise
     
-    async def recommend_similar_cases(self, uuid: str, k: int = 5) -> List[Dict]:
+    async def recommend_similar_cases(self, uuid: str, k: int = 5, reference_doc: Optional[Dict] = None) -> List[Dict]:
         """
         Find similar cases to a given document UUID
         
+        Served from the precomputed neighbor graph when the document is in it, which
+        costs no embedding call and no corpus scan, only the hydration of k rows.
+        
         Args:
             uuid: UUID of the reference document
             k: Number of similar cases to return
+            reference_doc: The reference document as returned by get_document_by_uuid,
+                if the caller already fetched it
             
         Returns:
             List of similar documents with similarity scores
         """
         try:
             # Get the reference document
-            reference_doc = await self.get_document_by_uuid(uuid)
+            if reference_doc is None:
+                reference_doc = await self.get_document_by_uuid(uuid)
             
             if not reference_doc:
                 raise ValueError(f"Document with UUID {uuid} not found")
             
-            if not reference_doc.get('summary'):
-                raise ValueError(f"Document {uuid} has no summary to compare")
+            if self.neighbor_graph is not None and k <= self.neighbor_graph.k:
+                neighbors = self.neighbor_graph.neighbors(reference_doc['document_id'])
+                if neighbors is not None:
+                    hits = [(document_id, score) for document_id, score in neighbors if score >= 0.1]
+                    return await self._hydrate(hits[:k])
             
-            # Perform similarity search using the document's summary
-            similar_docs = await self.similarity_search(
-                query_text=reference_doc['summary'],
-                k=k + 1,  # +1 because the result will include the reference document itself
-                min_similarity=0.1  # Minimum similarity threshold
-            )
-            
-            # Filter out the reference document itself
-            filtered_results = [
-                doc for doc in similar_docs 
-                if doc['uuid'] != uuid
-            ]
+            # Reuse the stored embedding; only a document not yet embedded with this model is encoded
+            embedding = await self._stored_embedding(reference_doc['document_id'])
+            if embedding is None:
+                if not reference_doc.get('summary'):
+                    raise ValueError(f"Document {uuid} has no summary to compare")
+                embedding = await self.embedding_service.aencode(reference_doc['summary'])
             
-            return filtered_results[:k]
+            return await self.similarity_search_by_vector(
+                embedding,
+                k=k,
+                min_similarity=0.1,  # Minimum similarity threshold
+                exclude_ids={reference_doc['document_id']}
+            )
             
         except Exception as e:
             logger.error(f"Error recommending similar cases for {uuid}: {str(e)}")
             raise
     
-    async def bulk_migrate_from_csv(self, csv_file_path: str) -> Dict[str, int]:
+    def _rows_from_csv_chunk(self, chunk: pd.DataFrame, stats: Dict[str, int]) -> List[Dict]:
+        """Convert a CSV chunk to document rows, dropping rows without uuid or summary"""
+        def value(val):
+            if pd.isna(val):
+                return None
+            # Ensure JSON serializable values
+            if isinstance(val, np.generic):
+                val = val.item()
+            return val if isinstance(val, (int, float, str, bool)) else str(val)
+        
+        metadata_columns = [col for col in chunk.columns if col not in _CSV_FIELD_COLUMNS]
+        rows = {}
+        for record in chunk.to_dict('records'):
+            uuid, summary = value(record.get('uuid')), value(record.get('summary'))
+            if uuid is None or summary is None:
+                stats['skipped'] += 1
+                continue
+            metadata = {}
+            for col in metadata_columns:
+                val = value(record.get(col))
+                if val is not None:
+                    metadata[col] = val
+            # A uuid repeated within the chunk keeps its last row, as serial updates would
+            row = {
+                'uuid': str(uuid),
+                'text': str(summary),
+                'filename': value(record.get('Filename')),
+                'petitioner': value(record.get('PETITIONER')),
+                'respondent': value(record.get('RESPONDENT')),
+                'metadata': metadata or None,
+            }
+            row['content_hash'] = _content_hash(
+                row['text'], row['filename'], row['petitioner'], row['respondent'], row['metadata']
+            )
+            rows[row['uuid']] = row
+        return list(rows.values())
+    
+    async def _drop_unchanged(self, rows: List[Dict], stats: Dict[str, int]) -> List[Dict]:
+        """
+        Drop rows whose stored document has the same content hash and already has an
+        embedding for the current model (e.g. one written by a reindex to this model)
+        """
+        placeholders = ", ".join(f"${i + 2}" for i in range(len(rows)))
+        stored = await self.prisma.query_raw(
+            'SELECT d."uuid", d."content_hash" FROM "Document" d '
+            f'WHERE d."uuid" IN ({placeholders}) AND EXISTS ('
+            'SELECT 1 FROM "DocumentEmbedding" e WHERE e."document_id" = d."id" AND e."model_name" = $1)',
+            self.model_name, *[row['uuid'] for row in rows]
+        )
+        stored_hashes = {record['uuid']: record['content_hash'] for record in stored}
+        changed = [row for row in rows if stored_hashes.get(row['uuid']) != row['content_hash']]
+        stats['unchanged'] += len(rows) - len(changed)
+        return changed
+    
+    def _ingest_error(self, stats: Dict, message: str):
+        logger.error(message)
+        if len(stats['errors']) < _MAX_INGEST_ERRORS:
+            stats['errors'].append(message)
+    
+    async def _embed_ingest_rows(self, rows: List[Dict], stats: Dict) -> List[Optional[np.ndarray]]:
+        """
+        Embed a chunk in batches; if the chunk fails, retry row by row so one bad
+        summary only costs its own row
+        """
+        texts = [row['text'] for row in rows]
+        try:
+            return list(await self.embedding_service.aencode_documents(texts))
+        except Exception as e:
+            logger.warning(f"Embedding a chunk of {len(texts)} rows failed ({str(e)}), retrying per row")
+        embeddings = []
+        for row in rows:
+            try:
+                embeddings.append(await self.embedding_service.aencode_document(row['text']))
+            except Exception as e:
+                self._ingest_error(stats, f"Error embedding document {row['uuid']}: {str(e)}")
+                embeddings.append(None)
+        return embeddings
+    
+    def _embedding_data(self, document_id: int, embedding: np.ndarray) -> Dict:
+        """DocumentEmbedding create data for the current model"""
+        data = {
+            'document_id': document_id,
+            'vector_data': self._embedding_to_bytes(embedding),
+            'dtype': self.storage_dtype,
+            'model_name': self.model_name,
+            'dimension': len(embedding.flatten())
+        }
+        if config.EMBEDDING_WRITE_LEGACY_JSON:
+            # Replicas from before binary storage only read the JSON column
+            data['embedding'] = self._embedding_to_json(embedding)
+        return data
+    
+    async def _write_ingest_rows(self, rows: List[Dict], embeddings: List[np.ndarray]) -> Dict[str, int]:
+        """
+        Upsert a chunk of documents and replace their embeddings in one transaction
+        
+        Documents go in as a single INSERT ... ON CONFLICT ("uuid") DO UPDATE, and
+        embeddings as one delete_many plus one create_many, instead of four round
+        trips per row.
+        
+        Returns:
+            Mapping of uuid to Document id
+        """
+        values = []
+        params = []
+        for row in rows:
+            base = len(params)
+            values.append(
+                f"(${base + 1}, ${base + 2}, ${base + 3}, ${base + 4}, ${base + 5}, ${base + 6}::jsonb, ${base + 7}, now())"
+            )
+            params.extend([
+                row['uuid'], row['filename'], row['petitioner'], row['respondent'], row['text'],
+                json.dumps(row['metadata']) if row['metadata'] is not None else None,
+                row['content_hash']
+            ])
+        
+        async with self.prisma.tx(timeout=timedelta(seconds=120)) as tx:
+            upserted = await tx.query_raw(
+                'INSERT INTO "Document" '
+                '("uuid", "filename", "petitioner", "respondent", "summary", "metadata", "content_hash", "updated_at") '
+                f'VALUES {", ".join(values)} '
+                'ON CONFLICT ("uuid") DO UPDATE SET '
+                '"filename" = EXCLUDED."filename", "petitioner" = EXCLUDED."petitioner", '
+                '"respondent" = EXCLUDED."respondent", "summary" = EXCLUDED."summary", '
+                # Metadata is only replaced when the row has some, as in add_document
+                '"metadata" = COALESCE(EXCLUDED."metadata", "Document"."metadata"), '
+                '"content_hash" = EXCLUDED."content_hash", "updated_at" = now() '
+                'RETURNING "id", "uuid"',
+                *params
+            )
+            ids_by_uuid = {row['uuid']: int(row['id']) for row in upserted}
+            document_ids = list(ids_by_uuid.values())
+            
+            await tx.documentembedding.delete_many(
+                where={'document_id': {'in': document_ids}, 'model_name': self.model_name}
+            )
+            await tx.documentembedding.create_many(
+                data=[
+                    self._embedding_data(ids_by_uuid[row['uuid']], embedding)
+                    for row, embedding in zip(rows, embeddings)
+                ]
+            )
+        return ids_by_uuid
+    
+    async def _ingest_chunk(self, rows: List[Dict], embeddings: List[Optional[np.ndarray]], stats: Dict):
+        """Write an embedded chunk and mirror it into the in-process indexes"""
+        embedded = []
+        for row, embedding in zip(rows, embeddings):
+            if embedding is None:
+                continue
+            try:
+                self._check_dimension(embedding)
+            except ValueError as e:
+                self._ingest_error(stats, f"Error embedding document {row['uuid']}: {str(e)}")
+                continue
+            embedded.append((row, embedding))
+        stats['failed'] += len(rows) - len(embedded)
+        if not embedded:
+            return
+        rows, embeddings = [row for row, _ in embedded], [embedding for _, embedding in embedded]
+        try:
+            ids_by_uuid = await self._write_ingest_rows(rows, embeddings)
+        except Exception as e:
+            self._ingest_error(stats, f"Error writing a chunk of {len(rows)} documents: {str(e)}")
+            stats['failed'] += len(rows)
+            return
+        
+        document_ids = [ids_by_uuid[row['uuid']] for row in rows]
+        if self.pg_index is not None:
+            await self.pg_index.upsert_many(document_ids, np.vstack(embeddings))
+        else:
+            # The neighbor graph is rebuilt once the whole file is in
+            for document_id, embedding in zip(document_ids, embeddings):
+                self.index.upsert(document_id, embedding)
+        for document_id, row in zip(document_ids, rows):
+            self._index_fields(document_id, row['text'], row['petitioner'], row['respondent'], row['metadata'])
+        stats['successful'] += len(rows)
+    
+    async def _load_checkpoint(self, source: str):
+        try:
+            return await self.prisma.ingestcheckpoint.find_first(
+                where={'source': source, 'model_name': self.model_name}
+            )
+        except Exception as e:
+            logger.warning(f"Could not read ingest checkpoint for {source}: {str(e)}")
+            return None
+    
+    async def _save_checkpoint(self, source: str, file_hash: str, rows_done: int, completed: bool = False):
+        """Record ingest progress; a lost checkpoint only costs hash lookups on the next run"""
+        try:
+            await self.prisma.execute_raw(
+                'INSERT INTO "IngestCheckpoint" ("source", "model_name", "file_hash", "rows_done", "completed", "updated_at") '
+                'VALUES ($1, $2, $3, $4, $5, now()) '
+                'ON CONFLICT ("source", "model_name") DO UPDATE SET '
+                '"file_hash" = EXCLUDED."file_hash", "rows_done" = EXCLUDED."rows_done", '
+                '"completed" = EXCLUDED."completed", "updated_at" = now()',
+                source, self.model_name, file_hash, rows_done, completed
+            )
+        except Exception as e:
+            logger.warning(f"Could not save ingest checkpoint for {source}: {str(e)}")
+    
+    async def bulk_migrate_from_csv(
+        self,
+        csv_file_path: str,
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        resume: bool = True,
+        job: Optional[Job] = None
+    ) -> Dict:
         """
         Migrate data from CSV file to Neon DB
         
+        The file is streamed in chunks. Up to `concurrency` chunks are embedded at once
+        (in real batches, paced by the embedding rate limiter) while finished chunks
+        are written in order, each in a single transaction.
+        
+        Progress is checkpointed per file and model after every written chunk, so an
+        interrupted run of the same file resumes after the last chunk it finished.
+        Rows whose content hash matches the stored document, and which already have an
+        embedding for the current model, are not re-embedded, which makes re-running an
+        unchanged file a read-only pass.
+        
         Args:
             csv_file_path: Path to the CSV file
+            chunk_size: Rows per chunk (defaults to INGEST_CHUNK_SIZE)
+            concurrency: Chunks embedded concurrently (defaults to INGEST_CONCURRENCY)
+            resume: Continue from the checkpoint of an interrupted run of this file
+            job: Background job to report progress to; pausing it drains in-flight
+                chunks and waits, cancelling it stops after the last written chunk
             
         Returns:
             Dictionary with migration statistics
         """
-        try:
-            df = pd.read_csv(csv_file_path)
-            stats = {
-                'total_rows': len(df),
-                'successful': 0,
-                'failed': 0,
-                'skipped': 0
-            }
-            
-            for index, row in df.iterrows():
+        chunk_size = chunk_size or config.INGEST_CHUNK_SIZE
+        concurrency = max(1, concurrency or config.INGEST_CONCURRENCY)
+        stats = {
+            'total_rows': 0,
+            'successful': 0,
+            'failed': 0,
+            'skipped': 0,
+            'unchanged': 0,
+            'resumed_from': 0,
+            'rows_done': 0,
+            'errors': []
+        }
+        started = time.monotonic()
+        pending = deque()
+        source = os.path.abspath(csv_file_path)
+        file_hash = await asyncio.to_thread(_file_sha256, source)
+        # Rows before this one are all written (or deliberately skipped); failures stop it advancing
+        checkpoint = {'rows_done': 0, 'advancing': True}
+        
+        async def write_oldest():
+            rows, task, end_row = pending.popleft()
+            failed_before = stats['failed']
+            if task is not None:
                 try:
-                    uuid = row.get('uuid')
-                    summary = row.get('summary')
-                    
-                    if pd.isna(uuid) or pd.isna(summary):
-                        stats['skipped'] += 1
-                        continue
-                    
-                    # Extract other fields
-                    filename = row.get('Filename') if not pd.isna(row.get('Filename')) else None
-                    petitioner = row.get('PETITIONER') if not pd.isna(row.get('PETITIONER')) else None
-                    respondent = row.get('RESPONDENT') if not pd.isna(row.get('RESPONDENT')) else None
-                    
-                    # Create metadata from remaining columns
-                    metadata = {}
-                    for col in df.columns:
-                        if col not in ['uuid', 'summary', 'Filename', 'PETITIONER', 'RESPONDENT']:
-                            val = row.get(col)
-                            if not pd.isna(val):
-                                # Ensure JSON serializable values
-                                if isinstance(val, (int, float, str, bool)):
-                                    metadata[col] = val
-                                else:
-                                    metadata[col] = str(val)
-                    
-                    await self.add_document(
-                        uuid=str(uuid),
-                        text=str(summary),
-                        filename=filename,
-                        petitioner=petitioner,
-                        respondent=respondent,
-                        metadata=metadata if metadata else None
-                    )
-                    
-                    stats['successful'] += 1
-                    
-                    # Progress indicator
-                    if stats['successful'] % 10 == 0:
-                        logger.info(f"Migrated {stats['successful']}/{stats['total_rows']} documents")
-                        
+                    embeddings = await task
                 except Exception as e:
-                    logger.error(f"Error migrating row {index}: {str(e)}")
-                    stats['failed'] += 1
+                    self._ingest_error(stats, f"Error embedding a chunk of {len(rows)} documents: {str(e)}")
+                    stats['failed'] += len(rows)
+                else:
+                    await self._ingest_chunk(rows, embeddings, stats)
+                    elapsed = time.monotonic() - started
+                    logger.info(
+                        f"Migrated {stats['successful']}/{stats['total_rows']} documents "
+                        f"({stats['successful'] / max(elapsed, 1e-9):.1f} rows/s)"
+                    )
+            if stats['failed'] > failed_before:
+                checkpoint['advancing'] = False
+            if checkpoint['advancing']:
+                checkpoint['rows_done'] = end_row
+                await self._save_checkpoint(source, file_hash, end_row)
+            stats['rows_done'] = end_row
+            if job is not None:
+                job.report(stats, rows_done=end_row)
+        
+        try:
+            start_row = 0
+            if resume:
+                previous = await self._load_checkpoint(source)
+                if previous and previous.file_hash == file_hash and not previous.completed:
+                    start_row = previous.rows_done
+            if start_row:
+                logger.info(f"Resuming ingest of {source} after row {start_row}")
+            stats['resumed_from'] = stats['rows_done'] = start_row
+            checkpoint['rows_done'] = start_row
+            await self._save_checkpoint(source, file_hash, start_row)
+            if job is not None:
+                stats['file_rows'] = await asyncio.to_thread(_count_csv_rows, source, chunk_size)
+                job.report(stats, rows_done=start_row, rows_total=stats['file_rows'])
+            
+            reader = pd.read_csv(csv_file_path, chunksize=chunk_size)
+            position = 0
+            while True:
+                if job is not None:
+                    if job.paused:
+                        # Finish and checkpoint in-flight chunks so a paused job holds no work
+                        while pending:
+                            await write_oldest()
+                    await job.wait_if_paused()
+                # Parsing is blocking; keep it off the event loop
+                chunk = await asyncio.to_thread(next, reader, None)
+                if chunk is None:
+                    break
+                chunk_start, position = position, position + len(chunk)
+                # Counting parsed rows (not file lines) keeps quoted multi-line summaries aligned
+                if position <= start_row:
                     continue
+                if chunk_start < start_row:
+                    chunk = chunk.iloc[start_row - chunk_start:]
+                stats['total_rows'] += len(chunk)
+                rows = self._rows_from_csv_chunk(chunk, stats)
+                if rows:
+                    rows = await self._drop_unchanged(rows, stats)
+                task = asyncio.create_task(self._embed_ingest_rows(rows, stats)) if rows else None
+                pending.append((rows, task, position))
+                if len(pending) >= concurrency:
+                    await write_oldest()
+            while pending:
+                await write_oldest()
             
+            if checkpoint['advancing']:
+                await self._save_checkpoint(source, file_hash, checkpoint['rows_done'], completed=True)
+            
+            # Per-document updates only approximate the graph; recompute it exactly once at the end
+            if stats['successful']:
+                await self.rebuild_neighbor_graph()
+            
+            if job is not None:
+                job.report(stats)
+            elapsed = time.monotonic() - started
+            stats['elapsed_seconds'] = round(elapsed, 2)
+            stats['rows_per_second'] = round(stats['successful'] / max(elapsed, 1e-9), 1)
             logger.info(f"Migration completed: {stats}")
             return stats
             
         except Exception as e:
             logger.error(f"Error in bulk migration: {str(e)}")
             raise
+        finally:
+            # Also reached when the caller is cancelled; don't leave embedding work running
+            for _, task, _ in pending:
+                if task is not None:
+                    task.cancel()
+    
+    async def backfill_embeddings(
+        self,
+        batch_size: Optional[int] = None,
+        job: Optional[Job] = None
+    ) -> Dict:
+        """
+        Embed every document that has no embedding for the current model, or only one
+        older than the document's last update
+        
+        Embeddings are keyed by model_name, so this can build a new model's embeddings
+        while another model serves, and later catch up on documents written meanwhile.
+        Only DocumentEmbedding rows are written; load_index or refresh_index brings
+        them into the in-process indexes.
+        
+        Args:
+            batch_size: Documents embedded and written per transaction (defaults to INGEST_CHUNK_SIZE)
+            job: Background job to report progress to and pause at between batches
+            
+        Returns:
+            Dictionary with backfill statistics
+        """
+        batch_size = batch_size or config.INGEST_CHUNK_SIZE
+        stale = (
+            'FROM "Document" d LEFT JOIN ('
+            'SELECT "document_id", MAX("created_at") AS "embedded_at" FROM "DocumentEmbedding" '
+            'WHERE "model_name" = $1 GROUP BY "document_id"'
+            ') e ON e."document_id" = d."id" '
+            'WHERE d."summary" IS NOT NULL AND (e."embedded_at" IS NULL OR e."embedded_at" < d."updated_at")'
+        )
+        stats = {'pending': 0, 'embedded': 0, 'failed': 0, 'errors': []}
+        
+        try:
+            await self._resolve_dimension()
+            count = await self.prisma.query_raw(f'SELECT COUNT(*)::int AS n {stale}', self.model_name)
+            stats['pending'] = int(count[0]['n']) if count else 0
+            if job is not None:
+                job.report(stats, rows_done=0, rows_total=stats['pending'])
+            
+            last_id = 0
+            while True:
+                if job is not None:
+                    await job.wait_if_paused()
+                records = await self.prisma.query_raw(
+                    f'SELECT d."id", d."uuid", d."summary" {stale} AND d."id" > $2 ORDER BY d."id" LIMIT $3',
+                    self.model_name, last_id, batch_size
+                )
+                if not records:
+                    break
+                last_id = int(records[-1]['id'])
+                
+                rows = [{'id': int(record['id']), 'uuid': record['uuid'], 'text': record['summary']} for record in records]
+                embeddings = await self._embed_ingest_rows(rows, stats)
+                embedded = []
+                for row, embedding in zip(rows, embeddings):
+                    if embedding is None:
+                        continue
+                    try:
+                        self._check_dimension(embedding)
+                    except ValueError as e:
+                        self._ingest_error(stats, f"Error embedding document {row['uuid']}: {str(e)}")
+                        continue
+                    embedded.append((row['id'], embedding))
+                stats['failed'] += len(rows) - len(embedded)
+                
+                if embedded:
+                    try:
+                        async with self.prisma.tx(timeout=timedelta(seconds=120)) as tx:
+                            # Only this model's rows; other models' embeddings keep serving
+                            await tx.documentembedding.delete_many(
+                                where={
+                                    'document_id': {'in': [document_id for document_id, _ in embedded]},
+                                    'model_name': self.model_name
+                                }
+                            )
+                            await tx.documentembedding.create_many(
+                                data=[self._embedding_data(document_id, embedding) for document_id, embedding in embedded]
+                            )
+                        stats['embedded'] += len(embedded)
+                    except Exception as e:
+                        self._ingest_error(stats, f"Error writing {len(embedded)} embeddings: {str(e)}")
+                        stats['failed'] += len(embedded)
+                
+                logger.info(f"Backfilled {stats['embedded']}/{stats['pending']} embeddings for {self.model_name}")
+                if job is not None:
+                    job.report(stats, rows_done=stats['embedded'] + stats['failed'])
+            
+            return stats
+            
+        except Exception as e:
+            logger.error(f"Error backfilling embeddings for {self.model_name}: {str(e)}")
+            raise
+    
+    async def save_serving_model(self):
+        """Record this store's model as the one every worker and restart serves"""
+        await self.prisma.execute_raw(
+            'INSERT INTO "ServingModel" ("id", "model_name", "dimension", "updated_at") '
+            'VALUES (1, $1, $2, now()) '
+            'ON CONFLICT ("id") DO UPDATE SET "model_name" = EXCLUDED."model_name", '
+            '"dimension" = EXCLUDED."dimension", "updated_at" = now()',
+            self.model_name, self.dimension
+        )
+        logger.info(f"Serving model set to {self.model_name} ({self.dimension} dimensions)")
+    
+    async def migrate_embeddings_to_binary(
+        self,
+        batch_size: int = 500,
+        clear_json: bool = True,
+        job: Optional[Job] = None
+    ) -> Dict[str, int]:
+        """
+        Convert remaining legacy JSON embeddings to binary storage in place
+        
+        The schema migration converts existing rows in SQL but keeps their JSON copies,
+        which replicas from before binary storage still read. Run this once every replica
+        is upgraded (POST /recommend/migrate-embeddings): it converts rows written by old
+        replicas during the rollout, then clears the JSON copies.
+        
+        Args:
+            batch_size: Number of rows converted per batch
+            clear_json: Drop the JSON copies of converted rows afterwards
+            job: Background job to report progress to
+            
+        Returns:
+            Dictionary with conversion statistics
+        """
+        try:
+            stats = {'converted': 0, 'failed': 0, 'cleared': 0}
+            last_id = 0
+            
+            while True:
+                if job is not None:
+                    await job.wait_if_paused()
+                records = await self.prisma.documentembedding.find_many(
+                    where={'vector_data': None, 'id': {'gt': last_id}},
+                    take=batch_size,
+                    order={'id': 'asc'}
+                )
+                if not records:
+                    break
+                last_id = records[-1].id
+                
+                async with self.prisma.batch_() as batcher:
+                    for record in records:
+                        try:
+                            embedding = self._json_to_embedding(record.embedding)
+                        except ValueError as e:
+                            logger.error(f"Cannot convert embedding {record.id}: {str(e)}")
+                            stats['failed'] += 1
+                            continue
+                        batcher.documentembedding.update(
+                            where={'id': record.id},
+                            data={
+                                'vector_data': self._embedding_to_bytes(embedding),
+                                'dtype': self.storage_dtype
+                            }
+                        )
+                        stats['converted'] += 1
+                
+                logger.info(f"Converted {stats['converted']} embeddings to binary storage")
+                if job is not None:
+                    job.report(stats)
+            
+            if clear_json:
+                # Drop the JSON copies now that the binary column is authoritative
+                stats['cleared'] = await self.prisma.execute_raw(
+                    'UPDATE "DocumentEmbedding" SET "embedding" = NULL '
+                    'WHERE "vector_data" IS NOT NULL AND "embedding" IS NOT NULL'
+                )
+            
+            logger.info(f"Embedding storage migration completed: {stats}")
+            return stats
+            
+        except Exception as e:
+            logger.error(f"Error migrating embeddings to binary: {str(e)}")
+            raise
     
     async def get_stats(self) -> Dict:
         """Get statistics about stored documents and embeddings"""
@@ -372,13 +1711,11 @@ class NeonVectorStore:
             total_docs = await self.prisma.document.count()
             total_embeddings = await self.prisma.documentembedding.count()
             
-            # Simple count by model using find_many and grouping in Python
-            all_embeddings = await self.prisma.documentembedding.find_many()
-            
-            model_counts = {}
-            for emb in all_embeddings:
-                model_name = emb.model_name
-                model_counts[model_name] = model_counts.get(model_name, 0) + 1
+            # Group in the database rather than fetching every vector to count it
+            rows = await self.prisma.query_raw(
+                'SELECT "model_name", COUNT(*)::int AS n FROM "DocumentEmbedding" GROUP BY "model_name"'
+            )
+            model_counts = {row['model_name']: int(row['n']) for row in rows}
             
             return {
                 'total_documents': total_docs,
@@ -393,6 +1730,7 @@ class NeonVectorStore:
 
 # Global instance
 _vector_store = None
+_vector_store_listeners: List[Callable[[NeonVectorStore], None]] = []
 
 def get_vector_store(prisma_client: Prisma = None) -> NeonVectorStore:
     """Get the global vector store instance"""
@@ -401,9 +1739,68 @@ def get_vector_store(prisma_client: Prisma = None) -> NeonVectorStore:
         _vector_store = NeonVectorStore(prisma_client)
     return _vector_store
 
+def set_vector_store(store: NeonVectorStore):
+    """Replace the global vector store (the serving model changed)"""
+    global _vector_store
+    _vector_store = store
+    for listener in _vector_store_listeners:
+        listener(store)
+
+def add_vector_store_listener(listener: Callable[[NeonVectorStore], None]):
+    """Call listener with the new store whenever the global one is replaced; it must not await"""
+    _vector_store_listeners.append(listener)
+
+async def load_serving_model(prisma_client: Prisma) -> Optional[str]:
+    """The model recorded by the last model switch, or None before the first one"""
+    try:
+        row = await prisma_client.servingmodel.find_unique(where={'id': 1})
+    except Exception as e:
+        logger.warning(f"Could not read the serving model: {str(e)}")
+        return None
+    return row.model_name if row else None
+
 async def initialize_vector_store(prisma_client: Prisma) -> NeonVectorStore:
-    """Initialize the global vector store"""
+    """Initialize the global vector store for the serving model"""
     global _vector_store
-    _vector_store = NeonVectorStore(prisma_client)
+    embedding_service = get_embedding_service()
+    serving_model = await load_serving_model(prisma_client)
+    if serving_model and serving_model != embedding_service.model_name:
+        # A reindex switched models; EMBEDDING_MODEL only picks the initial one
+        logger.warning(
+            f"Serving {serving_model} as recorded by the last model switch "
+            f"(EMBEDDING_MODEL gives {embedding_service.model_name})"
+        )
+        embedding_service = create_embedding_service(serving_model)
+        set_embedding_service(embedding_service)
+    _vector_store = NeonVectorStore(prisma_client, embedding_service)
+    await _vector_store.load_index()
+    _vector_store.start_refresher()
     logger.info("Vector store initialized with Neon DB")
     return _vector_store
+
+async def follow_serving_model(current: NeonVectorStore, model_name: str) -> Optional[NeonVectorStore]:
+    """
+    Switch this worker to the serving model a reindex on another worker recorded
+
+    Loads the new model's index (from the snapshot the reindexing worker saved where
+    possible) while the current store keeps serving, then swaps it in.
+
+    Returns:
+        The new store, or None if the current one stopped serving meanwhile
+    """
+    logger.info(f"Serving model changed to {model_name}; switching from {current.model_name}")
+    embedding_service = create_embedding_service(model_name)
+    try:
+        store = NeonVectorStore(current.prisma, embedding_service)
+        await store.load_index()
+    except BaseException:
+        await embedding_service.aclose()
+        raise
+    if _vector_store is not current:
+        await embedding_service.aclose()
+        return None
+    set_vector_store(store)
+    set_embedding_service(embedding_service)
+    store.start_refresher()
+    logger.info(f"Switched serving model from {current.model_name} to {store.model_name}")
+    return store
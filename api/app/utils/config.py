@@ -18,8 +18,62 @@ class Settings(BaseSettings):
     LLM_TOP_P: float = 1.0
     
     # Embedding Model Configuration
-    EMBEDDING_MODEL: str = "Alibaba-NLP/gte-base-en-v1.5"
+    EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"  # Initial model; after a reindex the ServingModel row wins
+    EMBEDDING_BACKEND: str = "hf"  # "hf" (hosted API), "local" (in-process CPU model) or "hashing" (offline stand-in)
+    EMBEDDING_FALLBACK_BACKEND: str = ""  # "local" runs the same model in-process when the HF API fails
+    LOCAL_EMBEDDING_RUNTIME: str = "torch"  # "torch" or "onnx" (ONNX Runtime via sentence-transformers)
+    LOCAL_EMBEDDING_THREADS: int = 2  # Inference threads serving async callers
+    HASH_EMBEDDING_DIMENSION: int = 384
     MAX_CHUNK_SIZE: int = 100
+    EMBEDDING_STORAGE_DTYPE: str = "float32"  # "float32" or "float16" for DocumentEmbedding.vector_data
+    EMBEDDING_WRITE_LEGACY_JSON: bool = False  # Also write the JSON column while pre-binary replicas still serve
+    EMBEDDING_REQUEST_TIMEOUT_SECONDS: float = 60.0
+    EMBEDDING_MAX_CONNECTIONS: int = 16  # Pooled keep-alive connections to the HF router per worker
+    EMBEDDING_RATE_LIMIT_PER_SECOND: float = 10.0  # Starting request rate; adapts to 429s between the bounds below
+    EMBEDDING_RATE_LIMIT_MIN: float = 0.5
+    EMBEDDING_RATE_LIMIT_MAX: float = 50.0
+    EMBEDDING_RATE_LIMIT_BURST: int = 10
+    EMBEDDING_INTERACTIVE_RESERVE: int = 2  # Bucket tokens background jobs (ingest) leave for search queries
+    EMBEDDING_MAX_RETRIES: int = 3  # Per request, on timeouts and 5xx; 429s wait on the rate limiter instead
+    EMBEDDING_BREAKER_FAILURE_THRESHOLD: int = 5  # Consecutive failures before the circuit opens
+    EMBEDDING_BREAKER_RESET_SECONDS: float = 30.0  # Open time before a trial request is let through
+    EMBEDDING_COALESCE_WINDOW_MS: float = 5.0  # Batch concurrent single-text requests; 0 disables
+    EMBEDDING_COALESCE_MAX_BATCH: int = 32
+    EMBEDDING_BATCH_SIZE: int = 32  # Texts per feature-extraction request
+    EMBEDDING_BATCH_MAX_BYTES: int = 262144  # UTF-8 payload bound per request
+    EMBEDDING_CACHE_SIZE: int = 4096  # In-process LRU entries for computed embeddings; 0 disables
+    EMBEDDING_CACHE_TTL_SECONDS: float = 86400.0  # 0 keeps entries until evicted
+    EMBEDDING_CACHE_DIR: str = ""  # SQLite second tier that survives restarts; "" disables
+    EMBEDDING_STORE_PATH: str = "./data/embeddings/store.sqlite3"  # Content-addressed document embeddings; "" disables
+    
+    # Vector Search Configuration
+    VECTOR_BACKEND: str = "memory"  # "memory" (resident matrix), "hnsw" (in-process ANN) or "pgvector"
+    PGVECTOR_INDEX_METHOD: str = "hnsw"  # "hnsw" or "ivfflat"
+    PGVECTOR_EXACT_FILTER_LIMIT: int = 2000  # Filtered searches over at most this many documents skip the ANN index
+    PGVECTOR_FILTERED_EF_SEARCH: int = 200  # hnsw.ef_search for larger filtered searches
+    HNSW_INDEX_DIR: str = "./data/index/hnsw"
+    HNSW_M: int = 16
+    HNSW_EF_CONSTRUCTION: int = 200
+    HNSW_EF_SEARCH: int = 64
+    INDEX_QUANTIZATION: str = "none"  # "none" or "int8" (memory backend: int8 scan, exact float32 re-rank)
+    QUANTIZED_RERANK_CANDIDATES: int = 256
+    INDEX_SNAPSHOT_DIR: str = "./data/index/snapshot"  # Memory-mapped matrix shared by workers; "" disables
+    INDEX_REFRESH_INTERVAL_SECONDS: float = 5.0  # Poll for changes and model switches from other workers; 0 disables
+    INDEX_SEARCH_SHARDS: int = 1  # Threads scanning the matrix per query; set OPENBLAS_NUM_THREADS=1 when > 1
+    INDEX_MIN_SHARD_ROWS: int = 16384  # Rows per shard below which a scan stays single-threaded
+    NEIGHBOR_GRAPH_K: int = 20  # Precomputed neighbors per document for /recommend; 0 disables
+    NEIGHBOR_GRAPH_DIR: str = "./data/index/neighbors"  # Sidecar files; "" rebuilds on every start
+    NEIGHBOR_GRAPH_UPDATE_CANDIDATES: int = 100  # Documents offered a changed document as a new neighbor
+    NEIGHBOR_GRAPH_REBUILD_THRESHOLD: int = 50  # Changes per refresh above which the graph is rebuilt off-thread
+    INGEST_CHUNK_SIZE: int = 500  # CSV rows read, embedded and written per transaction by bulk ingest
+    INGEST_CONCURRENCY: int = 4  # Chunks being embedded while earlier ones are written
+    JOB_HISTORY_LIMIT: int = 50  # Finished background jobs kept for GET /jobs/{id}
+    JOB_STATE_SYNC_SECONDS: float = 2.0  # How often a running job stores its progress and picks up other workers' requests
+    JOB_LOCK_DATABASE_URL: str = ""  # Direct (unpooled) Postgres URL for job advisory locks; "" uses DATABASE_URL
+    REINDEX_SAMPLE_SIZE: int = 50  # Documents whose summary excerpts are used to compare models before a switch
+    REINDEX_EVAL_K: int = 10  # Results per sample query when measuring recall
+    REINDEX_QUERY_WORDS: int = 32  # Words of a summary used as its sample query
+    REINDEX_MAX_RECALL_DROP: float = 0.02  # Largest recall@k loss that still switches models without force
     
     # Chunking Parameters
     MAX_CHUNK_SIZE: int = 100
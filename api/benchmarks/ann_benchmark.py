@@ -0,0 +1,107 @@
+"""
+Recall/latency benchmark for the in-process HNSW index against exact brute force
+
+Run from the api directory:
+    python -m benchmarks.ann_benchmark --sizes 10000 100000 1000000
+
+Corpora are synthetic clustered vectors, which behave closer to sentence
+embeddings than uniform noise. The 1M run needs roughly 3 GB of RAM at 384 dims.
+"""
+import argparse
+import time
+import numpy as np
+
+from app.services.vector_index import ExactVectorIndex, normalize_rows
+from app.services.hnsw_index import HnswVectorIndex
+
+
+def make_corpus(n: int, dimension: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """Gaussian clusters around random centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(clusters, dimension)).astype('float32')
+    assignments = rng.integers(0, clusters, size=n)
+    noise = rng.normal(scale=0.6, size=(n, dimension)).astype('float32')
+    return centroids[assignments] + noise
+
+
+def exact_ground_truth(corpus: np.ndarray, queries: np.ndarray, k: int, block: int = 65536) -> np.ndarray:
+    """Exact top-k ids per query, scored in blocks to bound memory"""
+    corpus = normalize_rows(corpus)
+    queries = normalize_rows(queries)
+    best_scores = np.full((len(queries), k), -np.inf, dtype='float32')
+    best_ids = np.zeros((len(queries), k), dtype='int64')
+    for start in range(0, len(corpus), block):
+        scores = queries @ corpus[start:start + block].T
+        merged_scores = np.concatenate([best_scores, scores], axis=1)
+        merged_ids = np.concatenate(
+            [best_ids, np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)], axis=1
+        )
+        order = np.argsort(-merged_scores, axis=1)[:, :k]
+        best_scores = np.take_along_axis(merged_scores, order, axis=1)
+        best_ids = np.take_along_axis(merged_ids, order, axis=1)
+    return best_ids
+
+
+def time_queries(index, queries: np.ndarray, k: int) -> np.ndarray:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, k=k, min_similarity=-1.0)
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+def recall_at_k(index, queries: np.ndarray, truth: np.ndarray, k: int) -> float:
+    hits = 0
+    for query, expected in zip(queries, truth):
+        found = {doc_id for doc_id, _ in index.search(query, k=k, min_similarity=-1.0)}
+        hits += len(found & set(expected.tolist()))
+    return hits / (len(queries) * k)
+
+
+def run(n: int, dimension: int, n_queries: int, k: int, ef_search: int, exact_queries: int):
+    corpus = make_corpus(n, dimension)
+    queries = make_corpus(n_queries, dimension, seed=1)
+    ids = np.arange(n)
+
+    start = time.perf_counter()
+    truth = exact_ground_truth(corpus, queries, k)
+    truth_seconds = time.perf_counter() - start
+
+    exact = ExactVectorIndex()
+    start = time.perf_counter()
+    exact.load(ids, corpus)
+    exact_build = time.perf_counter() - start
+    exact_latency = time_queries(exact, queries[:exact_queries], k)
+
+    hnsw = HnswVectorIndex(ef_search=ef_search)
+    start = time.perf_counter()
+    hnsw.load(ids, corpus)
+    hnsw_build = time.perf_counter() - start
+    hnsw_latency = time_queries(hnsw, queries, k)
+    recall = recall_at_k(hnsw, queries, truth, k)
+
+    print(f"\nn={n:,} dim={dimension} queries={n_queries} k={k} (ground truth {truth_seconds:.1f}s)")
+    print(f"  {'index':<8} {'build s':>9} {'p50 ms':>9} {'p99 ms':>9} {'recall@k':>9}")
+    print(f"  {'exact':<8} {exact_build:>9.2f} {np.percentile(exact_latency, 50):>9.3f} "
+          f"{np.percentile(exact_latency, 99):>9.3f} {1.0:>9.3f}")
+    print(f"  {'hnsw':<8} {hnsw_build:>9.2f} {np.percentile(hnsw_latency, 50):>9.3f} "
+          f"{np.percentile(hnsw_latency, 99):>9.3f} {recall:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--exact-queries', type=int, default=200, help="Queries timed against brute force")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--ef-search', type=int, default=64)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        run(n, args.dimension, args.queries, args.k, args.ef_search, args.exact_queries)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Accuracy and latency report for the int8-quantized index against exact float32 scoring
+
+Run from the api directory:
+    python -m benchmarks.quantization_benchmark --sizes 10000 100000 --rerank 256
+"""
+import argparse
+import time
+import numpy as np
+
+from app.services.vector_index import ExactVectorIndex, quantization_report
+from benchmarks.ann_benchmark import make_corpus, time_queries
+
+
+def run(n: int, dimension: int, n_queries: int, k: int, rerank: int):
+    corpus = make_corpus(n, dimension)
+    queries = make_corpus(n_queries, dimension, seed=1)
+    ids = np.arange(n)
+
+    exact = ExactVectorIndex()
+    exact.load(ids, corpus)
+    quantized = ExactVectorIndex(quantize=True, rerank_candidates=rerank)
+    start = time.perf_counter()
+    quantized.load(ids, corpus)
+    build = time.perf_counter() - start
+
+    report = quantization_report(quantized, queries, k)
+    exact_latency = time_queries(exact, queries, k)
+    quantized_latency = time_queries(quantized, queries, k)
+    usage = quantized.memory_usage()
+
+    print(f"\nn={n:,} dim={dimension} queries={n_queries} k={k} rerank={rerank} (quantize {build:.2f}s)")
+    print(f"  top-{k} overlap {report['mean_overlap']:.4f}, identical order {report['identical_order']:.3f}")
+    print(f"  scan bytes: float32 {usage['float32_bytes'] / 2**20:.1f} MiB, int8 {usage['int8_bytes'] / 2**20:.1f} MiB")
+    print(f"  p50/p99 ms: exact {np.percentile(exact_latency, 50):.3f}/{np.percentile(exact_latency, 99):.3f}, "
+          f"int8 {np.percentile(quantized_latency, 50):.3f}/{np.percentile(quantized_latency, 99):.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--rerank', type=int, default=256)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        run(n, args.dimension, args.queries, args.k, args.rerank)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Latency scaling of the exact index when each query's scan is split across shards
+
+BLAS should run single-threaded so the shards, not the library, use the cores.
+Run from the api directory:
+    OPENBLAS_NUM_THREADS=1 OMP_NUM_THREADS=1 MKL_NUM_THREADS=1 \
+        python -m benchmarks.shard_benchmark --sizes 1000000 --shards 1 2 4 8
+"""
+import argparse
+import os
+import numpy as np
+
+from app.services.vector_index import ExactVectorIndex
+from benchmarks.ann_benchmark import make_corpus, time_queries
+
+
+def run(n: int, dimension: int, n_queries: int, k: int, shard_counts, quantize: bool):
+    corpus = make_corpus(n, dimension)
+    queries = make_corpus(n_queries, dimension, seed=1)
+    ids = np.arange(n)
+
+    print(f"\nn={n:,} dim={dimension} queries={n_queries} k={k}{' int8' if quantize else ''}")
+    baseline = None
+    expected = None
+    for shards in shard_counts:
+        index = ExactVectorIndex(quantize=quantize, shards=shards, min_shard_rows=1)
+        index.load(ids, corpus)
+        results = [[doc_id for doc_id, _ in index.search(query, k=k, min_similarity=-1.0)] for query in queries]
+        if expected is None:
+            expected = results
+        identical = np.mean([a == b for a, b in zip(results, expected)])
+        latency = time_queries(index, queries, k)
+        p50 = np.percentile(latency, 50)
+        if baseline is None:
+            baseline = p50
+        print(f"  shards={shards:<3d} p50/p99 ms {p50:.3f}/{np.percentile(latency, 99):.3f}  "
+              f"speedup {baseline / p50:.2f}x  identical to first {identical:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cores = os.cpu_count() or 1
+    parser.add_argument('--sizes', type=int, nargs='+', default=[200_000, 1_000_000])
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--shards', type=int, nargs='+',
+                        default=sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1))))
+    parser.add_argument('--quantize', action='store_true', help='Shard the int8 pre-scan instead of the float32 scan')
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        run(n, args.dimension, args.queries, args.k, args.shards, args.quantize)
+
+
+if __name__ == '__main__':
+    main()
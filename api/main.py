@@ -1,6 +1,6 @@
 from typing import List
 from dotenv import load_dotenv
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import os
 import asyncio
 
@@ -9,7 +9,10 @@ from app.routers.chat import chat_router
 from app.routers.doc_gen import doc_gen_router
 from api.app.utils.database import prisma, logger as db_logger
 from api.app.utils.config import ModelConfig as config
-from app.services.vector_store_service import initialize_vector_store
+from app.services.vector_store_service import add_vector_store_listener, initialize_vector_store
+from app.services.embedding_service import get_embedding_service
+from app.services.job_service import Job, JobConflictError, get_job_manager
+from app.services.reindex_service import reindex_to_model
 from contextlib import asynccontextmanager
 
 from api.app.classes.global_classes import (SearchRequest_NER, SearchResult_NER)
@@ -26,6 +29,13 @@ MODEL_NAME = config.EMBEDDING_MODEL
 
 vector_store = None
 
+def _install_vector_store(store):
+    """Serve from a new store once a model switch installs it, here or on another worker"""
+    global vector_store
+    vector_store = store
+
+add_vector_store_listener(_install_vector_store)
+
 @asynccontextmanager
 async def lifespan():
     """Manage database connections and load initial data."""
@@ -47,6 +57,10 @@ async def lifespan():
                 db_logger.warning(f"Connection failed: {e}, retrying in {retry_delay}s...")
                 await asyncio.sleep(retry_delay)
     
+    # Jobs lock their key and store their state in the database, shared by all workers
+    if prisma.is_connected():
+        get_job_manager().attach(prisma)
+    
     # Initialize vector store
     try:
         vector_store = await initialize_vector_store(prisma)
@@ -57,6 +71,15 @@ async def lifespan():
     
     yield
     
+    # Stop background builds first; they resume from their checkpoint next time
+    await get_job_manager().shutdown()
+    
+    # Persist the in-process index so the next start can skip the rebuild
+    if vector_store:
+        await vector_store.stop_refresher()
+        vector_store.save_index()
+        await vector_store.embedding_service.aclose()
+    
     # Disconnect from Prisma
     if prisma.is_connected():
         await prisma.disconnect()
@@ -103,6 +126,17 @@ async def health_check():
             content={"status": "unhealthy", "error": str(e)}
         )
 
+@app.get("/metrics")
+async def metrics():
+    """In-process counters (embedding cache, request coalescing, API flow control) for this worker."""
+    service = get_embedding_service()
+    return {
+        "embedding_cache": service.cache_stats(),
+        "embedding_coalescer": service.coalescer_stats(),
+        "embedding_rate_limiter": service.limiter_stats(),
+        "embedding_circuit_breaker": service.breaker_stats(),
+    }
+
 @app.get("/recommend/{uuid}")
 async def recommend_cases(uuid: str):
     """
@@ -121,7 +155,7 @@ async def recommend_cases(uuid: str):
             raise HTTPException(status_code=404, detail="UUID not found")
 
         # Get similar cases
-        similar_cases = await vector_store.recommend_similar_cases(uuid, k=5)
+        similar_cases = await vector_store.recommend_similar_cases(uuid, k=5, reference_doc=case_data)
         
         # Helper to safely get value or None (mimicking old behavior)
         def convert_row(doc_dict):
@@ -164,7 +198,7 @@ def safe_get_value(val, default_for_none=""):
 @app.post("/search/entity", response_model=List[SearchResult_NER])
 async def search_entity(request: SearchRequest_NER):
     """
-    Search for cases using semantic search on the database.
+    Search for cases using hybrid BM25 + semantic search on the database.
     Replaces the old fuzzy search over CSV columns.
     """
     global vector_store
@@ -174,8 +208,10 @@ async def search_entity(request: SearchRequest_NER):
         return []
     
     try:
-        # Perform similarity search using the query
-        results = await vector_store.similarity_search(request.query, k=10, min_similarity=0.1)
+        # Fuse lexical and vector rankings so exact party names are not lost
+        results = await vector_store.hybrid_search(
+            request.query, k=10, min_similarity=0.1, filters=request.filters
+        )
         
         response = []
         for result in results:
@@ -194,11 +230,13 @@ async def search_entity(request: SearchRequest_NER):
         return []
 
 # Additional imports for semantic search
-from typing import List, Optional
+from typing import Dict, List, Optional, Union
+from api.app.classes.global_classes import VALID_PARAMS
 
 class SearchRequestSEM(BaseModel):
     query: str
     param: Optional[str] = ""
+    filters: Optional[Dict[str, Union[str, List[str]]]] = None
 
 class ActSearchRequestSEM(BaseModel):
     act_name: str
@@ -206,6 +244,39 @@ class ActSearchRequestSEM(BaseModel):
 class SearchResponseSEM(BaseModel):
     SemanticResultData: List[dict]
 
+class BatchSearchRequestSEM(BaseModel):
+    queries: List[str]
+    # Results per query; bounded like the batch size so one request can't fetch the whole corpus
+    k: int = Field(10, ge=1, le=100)
+    filters: Optional[Dict[str, Union[str, List[str]]]] = None
+
+# Upper bound on queries per batch request, keeps one request from monopolizing the scan
+MAX_BATCH_QUERIES = 64
+
+def format_semantic_results(results: List[dict]) -> List[dict]:
+    semantic_result_data = []
+    for result in results:
+        petitioner = result.get('petitioner', '')
+        respondent = result.get('respondent', '')
+        filename = result.get('filename', '')
+        
+        if petitioner and respondent:
+            title = f"{petitioner} v. {respondent}"
+        elif filename:
+            title = filename.replace('.pdf', '').replace('.txt', '')
+        else:
+            title = "Legal Case Document"
+        
+        result_data = {
+            "uuid": result['uuid'],
+            "title": title,
+            "summary": result['summary'],
+            "score": float(result['similarity_score']),
+            "metadata": result['metadata'] or {},
+        }
+        semantic_result_data.append(result_data)
+    return semantic_result_data
+
 # Updated semantic search using vector store
 @app.post("/search/semantic")
 async def search_endpoint(request: SearchRequestSEM):
@@ -224,31 +295,18 @@ async def search_endpoint(request: SearchRequestSEM):
     query = request.query
     logger.info(f"Semantic Search Query: {query}")
 
+    # A VALID_PARAMS param narrows the search to cases where that entity matches the query;
+    # a query that is not a known label of that entity searches unfiltered, as before
+    filters = dict(request.filters or {})
+    if request.param and request.param.lower() in VALID_PARAMS and request.param not in filters:
+        if vector_store.filter_index.match({request.param: query}):
+            filters[request.param] = query
+
     try:
         # Use vector store for similarity search
-        results = await vector_store.similarity_search(query, k=10, min_similarity=0.1)
+        results = await vector_store.similarity_search(query, k=10, min_similarity=0.1, filters=filters or None)
         
-        semantic_result_data = []
-        for result in results:
-            petitioner = result.get('petitioner', '')
-            respondent = result.get('respondent', '')
-            filename = result.get('filename', '')
-            
-            if petitioner and respondent:
-                title = f"{petitioner} v. {respondent}"
-            elif filename:
-                title = filename.replace('.pdf', '').replace('.txt', '')
-            else:
-                title = "Legal Case Document"
-            
-            result_data = {
-                "uuid": result['uuid'],
-                "title": title,
-                "summary": result['summary'],
-                "score": float(result['similarity_score']),
-                "metadata": result['metadata'] or {},
-            }
-            semantic_result_data.append(result_data)
+        semantic_result_data = format_semantic_results(results)
 
         if not semantic_result_data:
             return {"SemanticResultData": [{
@@ -271,6 +329,31 @@ async def search_endpoint(request: SearchRequestSEM):
             "metadata": {}
         }]}
 
+@app.post("/search/semantic/batch")
+async def search_batch_endpoint(request: BatchSearchRequestSEM):
+    """
+    Run several semantic searches in one call.
+    Queries are embedded together and scored against the corpus in one pass.
+    """
+    global vector_store
+    if not vector_store:
+        raise HTTPException(status_code=503, detail="Vector store not initialized")
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+
+    logger.info(f"Batched Semantic Search: {len(request.queries)} queries")
+    try:
+        results = await vector_store.similarity_search_many(
+            request.queries, k=request.k, min_similarity=0.1, filters=request.filters
+        )
+        return {"results": [
+            {"query": query, "SemanticResultData": format_semantic_results(query_results)}
+            for query, query_results in zip(request.queries, results)
+        ]}
+    except Exception as e:
+        logger.error("Batched semantic search failed: %s", str(e))
+        raise HTTPException(status_code=500, detail="Batched semantic search failed")
+
 @app.get("/recommend/embedding/{uuid}")
 async def recommend_cases_embedding(uuid: str):
     """
@@ -356,32 +439,146 @@ async def get_file(uuid: str):
         logger.error(f"Error serving file {uuid}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@app.post("/recommend/build-index")
-async def build_embedding_index():
+@app.post("/recommend/build-index", status_code=202)
+async def build_embedding_index(resume: bool = True):
     """
-    Build or rebuild the vector store index from CSV data
+    Start building or rebuilding the vector store index from CSV data in the background
+    
+    Returns a job id to poll at /jobs/{job_id}. An interrupted build resumes from its
+    checkpoint unless resume=false; documents whose content is unchanged are never
+    re-embedded. Only one build or reindex runs at a time.
     """
     global vector_store
     
     if not vector_store:
         raise HTTPException(status_code=503, detail="Vector store not initialized")
     
+    # Perform migration from CSV
+    csv_file_path = "./data/resources/ner_data.csv"
+    if not os.path.exists(csv_file_path):
+        raise HTTPException(status_code=404, detail=f"{csv_file_path} not found")
+    
+    async def build(job):
+        return await vector_store.bulk_migrate_from_csv(csv_file_path, resume=resume, job=job)
+    
     try:
-        # Perform migration from CSV
-        csv_file_path = "./data/resources/ner_data.csv"
-        if not os.path.exists(csv_file_path):
-            raise HTTPException(status_code=404, detail=f"{csv_file_path} not found")
-        
-        stats = await vector_store.bulk_migrate_from_csv(csv_file_path)
-        
-        return {
-            "message": "Index rebuilt successfully",
-            "stats": stats,
-            "method": "vector_store (Neon DB)"
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error rebuilding index: {str(e)}")
+        # Builds and model switches both rewrite the serving index, so they run one at a time
+        job = await get_job_manager().submit("build-index", "vector-store", build)
+    except JobConflictError as e:
+        raise _job_conflict(e)
+    
+    return {
+        "message": "Index build started",
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+        "method": "vector_store (Neon DB)"
+    }
+
+@app.post("/recommend/reindex", status_code=202)
+async def reindex_embeddings(model_name: str, force: bool = False, sample_size: Optional[int] = None):
+    """
+    Re-embed the corpus with another model in the background and switch to it
+    
+    The current model keeps serving while the new embeddings and index are built.
+    The switch happens only if recall on a sample of queries does not drop by more
+    than REINDEX_MAX_RECALL_DROP (or force=true); the job result holds the comparison.
+    """
+    global vector_store
+    
+    if not vector_store:
+        raise HTTPException(status_code=503, detail="Vector store not initialized")
+    if model_name == vector_store.model_name:
+        raise HTTPException(status_code=400, detail=f"{model_name} is already the serving model")
+    
+    async def reindex(job):
+        return await reindex_to_model(
+            vector_store, model_name, _install_vector_store, job=job, sample_size=sample_size, force=force
+        )
+    
+    try:
+        job = await get_job_manager().submit("reindex", "vector-store", reindex)
+    except JobConflictError as e:
+        raise _job_conflict(e)
+    
+    return {
+        "message": f"Reindex to {model_name} started",
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}"
+    }
+
+@app.post("/recommend/migrate-embeddings", status_code=202)
+async def migrate_embeddings(clear_json: bool = True):
+    """
+    Convert leftover JSON embeddings to binary storage in the background
+
+    Run once every replica reads binary embeddings: rows written by older replicas
+    during the rollout are converted, then the JSON copies are cleared (unless
+    clear_json=false).
+    """
+    global vector_store
+
+    if not vector_store:
+        raise HTTPException(status_code=503, detail="Vector store not initialized")
+
+    async def migrate(job):
+        return await vector_store.migrate_embeddings_to_binary(clear_json=clear_json, job=job)
+
+    try:
+        job = await get_job_manager().submit("migrate-embeddings", "vector-store", migrate)
+    except JobConflictError as e:
+        raise _job_conflict(e)
+
+    return {
+        "message": "Embedding migration started",
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}"
+    }
+
+def _job_conflict(e: JobConflictError) -> HTTPException:
+    detail = {"message": str(e), "job_id": e.job_id}
+    if e.job_id is not None:
+        detail["status_url"] = f"/jobs/{e.job_id}"
+    return HTTPException(status_code=409, detail=detail)
+
+async def _get_job_or_404(job_id: str) -> dict:
+    state = await get_job_manager().describe(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return state
+
+async def _control_job(job_id: str, action: str) -> dict:
+    state = await get_job_manager().control(job_id, action)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return state
+
+@app.get("/jobs")
+async def list_jobs():
+    """Recent background jobs of every worker, oldest first"""
+    return await get_job_manager().describe_all()
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status of a background job: rows done, throughput, ETA and errors"""
+    return await _get_job_or_404(job_id)
+
+@app.post("/jobs/{job_id}/pause")
+async def pause_job(job_id: str):
+    """Pause a running job after its in-flight chunks are written"""
+    return await _control_job(job_id, "pause")
+
+@app.post("/jobs/{job_id}/resume")
+async def resume_job(job_id: str):
+    return await _control_job(job_id, "resume")
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a job; a cancelled build continues from its checkpoint when resubmitted"""
+    state = await _get_job_or_404(job_id)
+    if state["status"] not in Job.ACTIVE_STATES:
+        raise HTTPException(status_code=409, detail=f"Job is already {state['status']}")
+    await _control_job(job_id, "cancel")
+    return {"message": "Cancellation requested", "job_id": job_id}
 
 # Example of a protected route using the auth service
 from app.services.auth_service import get_current_user
@@ -0,0 +1,23 @@
+-- AlterTable
+ALTER TABLE "DocumentEmbedding" ALTER COLUMN "embedding" DROP NOT NULL,
+ADD COLUMN "vector_data" BYTEA,
+ADD COLUMN "dtype" TEXT NOT NULL DEFAULT 'float32';
+
+-- Convert existing JSON vectors to raw little-endian float32 bytes.
+-- float4send() emits big-endian bytes, so each 4-byte group is reversed.
+-- The JSON copies stay for replicas that predate binary storage; they are cleared
+-- by the post-rollout backfill (POST /recommend/migrate-embeddings).
+UPDATE "DocumentEmbedding" AS e
+SET "vector_data" = (
+    SELECT string_agg(
+        substring(s.b FROM 4 FOR 1) || substring(s.b FROM 3 FOR 1) ||
+        substring(s.b FROM 2 FOR 1) || substring(s.b FROM 1 FOR 1),
+        ''::bytea ORDER BY t.ord
+    )
+    FROM jsonb_array_elements_text(
+        CASE WHEN jsonb_typeof(e."embedding") = 'array' THEN e."embedding" ELSE e."embedding"->'vector' END
+    ) WITH ORDINALITY AS t(v, ord)
+    CROSS JOIN LATERAL (SELECT float4send(t.v::real) AS b) AS s
+)
+WHERE e."vector_data" IS NULL
+  AND (jsonb_typeof(e."embedding") = 'array' OR e."embedding" ? 'vector');
@@ -0,0 +1,18 @@
+-- AlterTable
+ALTER TABLE "Document" ADD COLUMN "content_hash" TEXT;
+
+-- CreateTable
+CREATE TABLE "IngestCheckpoint" (
+    "id" SERIAL NOT NULL,
+    "source" TEXT NOT NULL,
+    "model_name" TEXT NOT NULL,
+    "file_hash" TEXT NOT NULL,
+    "rows_done" INTEGER NOT NULL DEFAULT 0,
+    "completed" BOOLEAN NOT NULL DEFAULT false,
+    "updated_at" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "IngestCheckpoint_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE UNIQUE INDEX "IngestCheckpoint_source_model_name_key" ON "IngestCheckpoint"("source", "model_name");
@@ -0,0 +1,9 @@
+-- CreateTable
+CREATE TABLE "ServingModel" (
+    "id" INTEGER NOT NULL DEFAULT 1,
+    "model_name" TEXT NOT NULL,
+    "dimension" INTEGER NOT NULL,
+    "updated_at" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "ServingModel_pkey" PRIMARY KEY ("id")
+);
@@ -0,0 +1,20 @@
+-- CreateTable
+CREATE TABLE "BackgroundJob" (
+    "id" TEXT NOT NULL,
+    "kind" TEXT NOT NULL,
+    "key" TEXT NOT NULL,
+    "status" TEXT NOT NULL,
+    "worker" TEXT NOT NULL,
+    "state" JSONB NOT NULL,
+    "command" TEXT,
+    "created_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updated_at" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "BackgroundJob_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE INDEX "BackgroundJob_key_status_idx" ON "BackgroundJob"("key", "status");
+
+-- CreateIndex
+CREATE INDEX "BackgroundJob_created_at_idx" ON "BackgroundJob"("created_at");
@@ -0,0 +1,46 @@
+"""
+Unit tests for the BM25 index's exact-name shortcut, using rows as the NER export stores them
+"""
+from app.services.lexical_index import BM25Index
+
+# First row of client/src/pages/ner_data.csv (uuid d9ba9971-90ac-4c52-8e61-6cde53f1f70c)
+METADATA = {
+    'COURT': "Supreme Court, Punjab and Haryana \nHigh Court, Constitution Bench, Punjab and Haryana High Court",
+    'JUDGE': "B.K. \nMukherjea, Gurbachan Sing, Vikram Nath, Prashant Kumar Mishra",
+    'LAWYER': "Ashwani Kumar Dubey, Manoj Swarup, Gagan Gupta",
+    'ORG': "State of Haryana",
+    'STATUTE': "Punjab Court Act, Code of Civil Procedure, Arbitration and Conciliation Act",
+}
+
+
+def sample_index() -> BM25Index:
+    index = BM25Index()
+    index.add(1, "Appeal over the succession of Lehna Singh's estate", "Pankajakshi, Lehna Singh",
+              "Gurnam Singh, Constitution bench", METADATA)
+    return index
+
+
+def test_whole_party_judge_and_lawyer_names_match():
+    index = sample_index()
+    for query in ("Lehna Singh", "vikram nath", "B.K. Mukherjea", "Prashant Kumar Mishra", "Manoj Swarup"):
+        assert index.is_name_match(query, 1), query
+
+
+def test_topical_and_partial_phrases_do_not_match():
+    index = sample_index()
+    for query in (
+        "high court",
+        "punjab and haryana high court",
+        "arbitration and conciliation act",
+        "state of haryana",
+        "gurbachan sing vikram nath",
+        "kumar mishra",
+        "Vikram",
+    ):
+        assert not index.is_name_match(query, 1), query
+
+
+def test_removed_document_has_no_names():
+    index = sample_index()
+    index.remove(1)
+    assert not index.is_name_match("Lehna Singh", 1)
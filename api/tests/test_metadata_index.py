@@ -0,0 +1,52 @@
+"""
+Unit tests for the metadata filter index, using rows as the NER export stores them
+"""
+from app.services.metadata_index import MetadataFilterIndex, split_values
+
+# First row of client/src/pages/ner_data.csv (uuid d9ba9971-90ac-4c52-8e61-6cde53f1f70c)
+PETITIONER = "Pankajakshi, Lehna Singh"
+RESPONDENT = "Gurnam Singh, Constitution bench"
+METADATA = {
+    'COURT': "Supreme Court, Punjab and Haryana \nHigh Court, Constitution Bench, Punjab and Haryana High Court",
+    'GPE': "Punjab, Haryana",
+    'JUDGE': "B.K. \nMukherjea, Gurbachan Sing, Vikram Nath, Prashant Kumar Mishra",
+    'ORG': "State of Haryana",
+}
+
+
+def sample_index() -> MetadataFilterIndex:
+    index = MetadataFilterIndex()
+    index.add(1, PETITIONER, RESPONDENT, METADATA)
+    index.add(2, "State of Punjab", "Union of India", {'JUDGE': "Sanjiv Khanna", 'GPE': "Punjab"})
+    return index
+
+
+def test_split_values_splits_comma_joined_names():
+    assert split_values(METADATA['JUDGE']) == [
+        "b.k. mukherjea, gurbachan sing, vikram nath, prashant kumar mishra",
+        "b.k. mukherjea",
+        "gurbachan sing",
+        "vikram nath",
+        "prashant kumar mishra",
+    ]
+
+
+def test_split_values_keeps_list_literals_and_single_names():
+    assert split_values("['Vikram Nath', 'Sanjiv Khanna']")[1:] == ["vikram nath", "sanjiv khanna"]
+    assert split_values("State of Haryana") == ["state of haryana"]
+
+
+def test_filter_matches_one_name_of_a_comma_joined_column():
+    index = sample_index()
+    assert index.match({'judge': "Vikram Nath"}) == {1}
+    assert index.match({'judge': "B.K. Mukherjea"}) == {1}
+    assert index.match({'court': "Punjab and Haryana High Court"}) == {1}
+    assert index.match({'petitioner': "Lehna Singh"}) == {1}
+
+
+def test_filter_values_or_within_a_field_and_across_fields():
+    index = sample_index()
+    assert index.match({'gpe': "Punjab"}) == {1, 2}
+    assert index.match({'judge': ["Vikram Nath", "Sanjiv Khanna"]}) == {1, 2}
+    assert index.match({'gpe': "Punjab", 'judge': "Sanjiv Khanna"}) == {2}
+    assert index.match({'judge': "Vikram"}) == set()